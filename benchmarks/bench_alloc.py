@@ -0,0 +1,125 @@
+"""
+Measure per-turn memory allocation of input preprocessing with tracemalloc.
+
+Compares the string pipeline eliza used before Turn objects (split, truncate,
+strip, join, find keywords, then substitute and reflect the whole text again
+for every keyword tried) with CompiledScript.prepare plus transform_input,
+which tokenize once and reuse the reflected text across keywords. For each
+corpus category it reports the mean and worst peak bytes allocated while
+preprocessing one input, and the time per input without tracing.
+
+    python benchmarks/bench_alloc.py --size 2000
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+# pylint: disable=wrong-import-position
+import eliza
+from corpus import CATEGORIES, generate_corpus
+
+
+def string_pipeline(script: eliza.CompiledScript) -> Callable[[str], list]:
+    """Preprocessing as done before Turn, built from the per-stage helpers."""
+
+    def preprocess(user_input: str) -> list:
+        words = user_input.strip().upper().split()
+        words = script.truncate_on_delimiters(words)
+        clean_words = [word.strip(eliza.PUNCTUATION) for word in words]
+        normalized_input = " ".join(clean_words)
+        keyword_matches = script.find_keywords(clean_words)
+        keyword_matches.sort(key=lambda x: x[1], reverse=True)
+        transformed = []
+        for keyword, _ in keyword_matches:
+            keyword_rule = script.keywords[keyword]
+            transformed.append(
+                script.reflect_pronouns(keyword_rule.transform(normalized_input))
+            )
+        return transformed
+
+    return preprocess
+
+
+def turn_pipeline(script: eliza.CompiledScript) -> Callable[[str], list]:
+    """Preprocessing with one Turn per input."""
+
+    def preprocess(user_input: str) -> list:
+        turn = script.prepare(user_input)
+        return [
+            script.transform_input(script.keywords[keyword], turn)
+            for keyword in turn.keywords
+        ]
+
+    return preprocess
+
+
+def peak_bytes(func: Callable[[str], list], texts: List[str]) -> List[int]:
+    """Peak traced allocation while running func on each text, one at a time."""
+    # Compile lazily built regexes first so they don't count against a turn
+    for text in texts:
+        func(text)
+    peaks = []
+    tracemalloc.start()
+    for text in texts:
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        func(text)
+        _, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - before)
+    tracemalloc.stop()
+    return peaks
+
+
+def micros_per_call(func: Callable[[str], list], texts: List[str], repeat: int):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in texts:
+            func(text)
+        best = min(best, time.perf_counter() - start)
+    return best / len(texts) * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", type=int, default=2000, help="corpus size")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    script = eliza.COMPILED
+    pipelines = {
+        "strings": string_pipeline(script),
+        "turn": turn_pipeline(script),
+    }
+    corpus = generate_corpus(args.size, args.seed)
+    by_category: Dict[str, List[str]] = {"all": [text for _, text in corpus]}
+    for category in CATEGORIES:
+        by_category[category] = [text for cat, text in corpus if cat == category]
+
+    print(
+        f"{'category':<12}{'pipeline':<10}{'mean peak B':>13}"
+        f"{'max peak B':>12}{'us/input':>10}"
+    )
+    for category, texts in by_category.items():
+        if not texts:
+            continue
+        for name, func in pipelines.items():
+            peaks = peak_bytes(func, texts)
+            micros = micros_per_call(func, texts, args.repeat)
+            print(
+                f"{category:<12}{name:<10}{statistics.mean(peaks):>13.0f}"
+                f"{max(peaks):>12}{micros:>10.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Turn latency on adversarial input, with and without hardened patterns.
+
+Each attack is a long input that contains every literal a superlinear
+pattern of the bundled script needs, in an order that never completes the
+match, so the plain regexes retry their wildcards from every position
+(see eliza_backtrack.py). Every attack is answered by a session on the
+plain script and one on the script compiled with harden=True, and the
+replies are checked to agree. Plain runs above --plain-max words are
+skipped, since they take minutes.
+
+The corpus row answers ordinary generated input with each script, to show
+what hardening costs when nobody is attacking.
+
+    python benchmarks/bench_backtrack.py --words 10000 20000
+"""
+
+import argparse
+import os
+import sys
+import time
+from typing import Callable, Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+# pylint: disable=wrong-import-position
+import eliza
+from corpus import generate_corpus
+
+# Attack name -> input of about that many words
+ATTACKS: Dict[str, Callable[[int], str]] = {
+    # YOU ARE.*?(/SAD).* and the rest of I's rules, against every YOU ARE
+    "I + YOU ARE...": lambda words: "I " + "YOU ARE " * (words // 2),
+    # (?:AM|IS|ARE|WAS).*?LIKE.* from every AM
+    "LIKE + AM...": lambda words: "LIKE " + "AM " * words,
+}
+
+
+def respond_seconds(script: eliza.CompiledScript, text: str) -> float:
+    session = eliza.ElizaSession(script)
+    start = time.perf_counter()
+    session.respond(text)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--words", type=int, nargs="+", default=[10000, 20000])
+    parser.add_argument("--plain-max", type=int, default=10000)
+    parser.add_argument("--corpus", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    plain = eliza.load_script(cache=False, harden=False)
+    hardened = eliza.load_script(cache=False, harden=True)
+
+    print(f"{'input':<18}{'words':>8}{'plain ms':>12}{'hardened ms':>14}")
+    for name, attack in ATTACKS.items():
+        for words in args.words:
+            text = attack(words)
+            replies = [
+                eliza.ElizaSession(script).respond(text)
+                for script in (plain, hardened)
+                if script is hardened or words <= args.plain_max
+            ]
+            assert len(set(replies)) == 1, name
+            times: List[str] = []
+            for script in (plain, hardened):
+                if script is plain and words > args.plain_max:
+                    times.append("-")
+                else:
+                    times.append(f"{respond_seconds(script, text) * 1000:.1f}")
+            print(f"{name:<18}{words:>8}{times[0]:>12}{times[1]:>14}")
+
+    texts = [text for _, text in generate_corpus(args.corpus, args.seed)]
+    elapsed = []
+    for script in (plain, hardened):
+        session = eliza.ElizaSession(script)
+        start = time.perf_counter()
+        for text in texts:
+            session.respond(text)
+        elapsed.append((time.perf_counter() - start) / len(texts) * 1e6)
+    print(
+        f"{'corpus (us/turn)':<18}{args.corpus:>8}{elapsed[0]:>12.1f}{elapsed[1]:>14.1f}"
+    )
+
+
+if __name__ == "__main__":
+    main()
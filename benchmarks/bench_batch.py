@@ -0,0 +1,87 @@
+"""
+Compare eliza_respond_batch against calling ElizaSession.respond in a loop.
+
+Both paths run the same (session, utterance) pairs through fresh sessions,
+and the benchmark checks that they produce identical responses.
+
+    python benchmarks/bench_batch.py --size 10000 --sessions 1000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import eliza  # pylint: disable=wrong-import-position
+from dialog import DIALOG  # pylint: disable=wrong-import-position
+
+UTTERANCES = DIALOG + [
+    "I remember my first computer.",
+    "Why can't you understand me?",
+    "I dreamt about a house by the sea.",
+    "What is the weather like today?",
+    "Nothing much happened today.",
+]
+
+
+FILLER = ["TODAY", "AGAIN", "REALLY", "AT HOME", "AT WORK", "LATELY", "A LOT"]
+
+
+def make_items(size: int, sessions: int, seed: int, unique: bool = False):
+    rng = random.Random(seed)
+    pool = [eliza.ElizaSession(eliza.COMPILED) for _ in range(sessions)]
+    items = []
+    for _ in range(size):
+        utterance = rng.choice(UTTERANCES)
+        if unique:
+            # Vary the text so few inputs repeat within a batch
+            utterance = utterance.rstrip(".?") + " " + " ".join(rng.sample(FILLER, 3))
+        items.append((rng.choice(pool), utterance))
+    return items
+
+
+def best_of(repeat: int, func) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", type=int, default=10000)
+    parser.add_argument("--sessions", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--unique", action="store_true", help="make nearly every utterance unique"
+    )
+    args = parser.parse_args()
+
+    def items(seed: int):
+        return make_items(args.size, args.sessions, seed, args.unique)
+
+    loop_results = [s.respond(t) for s, t in items(1)]
+    batch_results = eliza.eliza_respond_batch(items(1))
+    assert loop_results == batch_results, "batch output differs from the loop"
+
+    loop_time = best_of(args.repeat, lambda: [s.respond(t) for s, t in items(2)])
+    batch_time = best_of(args.repeat, lambda: eliza.eliza_respond_batch(items(2)))
+    setup_time = best_of(args.repeat, lambda: items(2))
+    loop_time -= setup_time
+    batch_time -= setup_time
+
+    print(f"batch of {args.size} inputs over {args.sessions} sessions")
+    print(f"per-call loop: {args.size / loop_time:10.0f} turns/s")
+    print(f"batch:         {args.size / batch_time:10.0f} turns/s")
+    print(f"speedup:       {loop_time / batch_time:10.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Lines/sec through the command line: the interactive loop vs --batch.
+
+Pipes the same generated input through ``python eliza.py`` (cmd.Cmd, one
+print per reply) and through ``--batch`` in its output formats, each in a
+fresh process, and checks that the replies agree. Process start-up is
+included, so use enough lines for it not to matter.
+
+    python benchmarks/bench_cli.py --lines 200000
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import List, Tuple
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_ROOT)
+
+# pylint: disable=wrong-import-position
+from corpus import generate_corpus
+
+MODES = {
+    "interactive": [],
+    "batch": ["--batch"],
+    "batch jsonl": ["--batch", "--format", "jsonl"],
+    "batch timings": ["--batch", "--timings"],
+}
+
+
+def run(flags: List[str], data: bytes) -> Tuple[float, List[str]]:
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, os.path.join(REPO_ROOT, "eliza.py")] + flags,
+        input=data,
+        capture_output=True,
+        check=True,
+    )
+    elapsed = time.perf_counter() - start
+    return elapsed, result.stdout.decode("utf-8").splitlines()
+
+
+def replies(mode: str, output: List[str]) -> List[str]:
+    """The replies alone, whatever the mode printed around them."""
+    if mode == "interactive":
+        # Greeting first, then "> " prompts, then GOODBYE at EOF
+        return [line.removeprefix("> ") for line in output[1:-1]]
+    if mode == "batch jsonl":
+        return [json.loads(line)["reply"] for line in output]
+    return [line.split("\t")[0] for line in output]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--lines", type=int, default=200000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    texts = [text for _, text in generate_corpus(args.lines, args.seed)]
+    data = "".join(text + "\n" for text in texts).encode("utf-8")
+
+    print(f"{'mode':<16}{'seconds':>10}{'lines/sec':>12}")
+    expected = None
+    for mode, flags in MODES.items():
+        elapsed, output = run(flags, data)
+        answered = replies(mode, output)
+        if expected is None:
+            expected = answered[: len(texts)]
+        assert answered[: len(texts)] == expected, mode
+        print(f"{mode:<16}{elapsed:>10.2f}{len(texts) / elapsed:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Compare ways of finding a keyword's first matching decomposition rule.
+
+For the keywords with the most decomposition rules, collects the
+transformed inputs that keyword sees in the corpus and times:
+
+- loop: rule.regex.search for each rule in order
+- combined: one regex per keyword, ``(?s:.*?)(?P<rN>pattern)`` alternatives
+  in rule order, tried with match(); the engine exhausts an alternative
+  before the next, so the first to match is the first rule search() would
+  find, with the same captures
+- prefilter: KeywordRule.match, which skips rules whose required literals
+  are missing before running their regex
+
+It checks that all three pick the same rule with the same captures.
+
+    python benchmarks/bench_combined.py --size 5000 --top 8
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+from typing import Callable, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+# pylint: disable=wrong-import-position
+import eliza
+from corpus import generate_corpus
+
+Matcher = Callable[[str], eliza.RuleMatch]
+
+
+def rule_by_rule(keyword_rule: eliza.KeywordRule) -> Matcher:
+    rules = keyword_rule.rules
+
+    def match(transformed_input: str):
+        for rule in rules:
+            found = rule.regex.search(transformed_input)
+            if found:
+                return rule, found
+        return None
+
+    return match
+
+
+def combined(keyword_rule: eliza.KeywordRule) -> Matcher:
+    rules = keyword_rule.rules
+    regex = re.compile(
+        "|".join(
+            f"(?s:.*?)(?P<r{position}>{rule.source})"
+            for position, rule in enumerate(rules)
+        ),
+        re.IGNORECASE,
+    )
+    # The rule's named group closes last, so lastindex identifies it
+    by_index = {regex.groupindex[f"r{n}"]: rule for n, rule in enumerate(rules)}
+
+    def match(transformed_input: str):
+        found = regex.match(transformed_input)
+        if found is None or found.lastindex is None:
+            return None
+        return by_index[found.lastindex], found
+
+    return match
+
+
+def captures(found: eliza.RuleMatch, matcher: str):
+    """The rule and its own captures, whichever way it was matched."""
+    if found is None:
+        return None
+    rule, match = found
+    if matcher != "combined":
+        return rule, match.groups()
+    index = match.lastindex
+    return rule, match.groups()[index : index + rule.regex.groups]
+
+
+def best_time(func: Matcher, inputs: List[str], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in inputs:
+            func(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", type=int, default=5000, help="corpus size")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--top", type=int, default=8, help="keywords to time")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    script = eliza.COMPILED
+    turns = [script.prepare(text) for _, text in generate_corpus(args.size, args.seed)]
+    keyword_rules = sorted(
+        (rule for rule in script.keywords.values() if len(rule.rules) > 1),
+        key=lambda rule: -len(rule.rules),
+    )[: args.top]
+
+    print(
+        f"{'keyword':<10}{'rules':>6}{'inputs':>8}"
+        f"{'loop us':>10}{'combined us':>13}{'prefilter us':>14}"
+    )
+    for keyword_rule in keyword_rules:
+        inputs = [
+            script.transform_input(keyword_rule, turn)
+            for turn in turns
+            if keyword_rule.keyword in turn.keywords
+        ]
+        if not inputs:
+            continue
+        matchers = {
+            "loop": rule_by_rule(keyword_rule),
+            "combined": combined(keyword_rule),
+            "prefilter": keyword_rule.match,
+        }
+        for text in inputs:
+            expected = captures(matchers["loop"](text), "loop")
+            for name, matcher in matchers.items():
+                assert captures(matcher(text), name) == expected, (name, text)
+
+        micros = [
+            best_time(matcher, inputs, args.repeat) / len(inputs) * 1e6
+            for matcher in matchers.values()
+        ]
+        print(
+            f"{keyword_rule.keyword:<10}{len(keyword_rule.rules):>6}{len(inputs):>8}"
+            f"{micros[0]:>10.2f}{micros[1]:>13.2f}{micros[2]:>14.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
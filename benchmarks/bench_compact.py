@@ -0,0 +1,159 @@
+"""
+Memory of a script as parsed JSON, as a CompiledScript and as a CompactScript.
+
+For the bundled script and a synthetic one with --keywords generated
+keywords (see synthetic_script.py), each representation is loaded in a
+fresh process from what a server starts from:
+
+- json: json.load of the script file, the nested dicts of SCRIPT
+- compiled: CompiledScript from load_script's cache, so patterns are
+  compiled as turns reach them
+- compact: CompactScript (eliza_compact.py), unpickled
+
+and reports:
+
+- RSS MiB: resident memory the loaded script holds
+- traced MiB: memory allocated for it, as tracemalloc counts it, which
+  is exact where RSS moves in whole pages (the bundled script)
+- load s: time to load it
+- us/turn: ElizaSession.respond over generated inputs, after one pass
+  that compiles (and for compact, decodes) what they reach; the compact
+  form keeps --decoded keywords decoded, and decodes others again
+- RSS after: resident memory after those turns, regexes and decoded
+  rules included
+
+    python benchmarks/bench_compact.py --keywords 100000
+"""
+
+import argparse
+import gc
+import json
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+# pylint: disable=wrong-import-position
+import eliza
+from bench_registry import rss_kib
+from corpus import generate_corpus
+from eliza_compact import DECODED_KEYWORDS, CompactScript
+from synthetic_script import generate_inputs, generate_script
+
+FORMS = ["json", "compiled", "compact"]
+COLUMNS = ["RSS MiB", "traced MiB", "load s", "us/turn", "RSS after"]
+
+
+def measure(form: str, directory: str) -> Dict[str, float]:
+    """Load one form of the script in directory; runs in the child process."""
+    with open(os.path.join(directory, "inputs.json"), "r", encoding="utf-8") as file:
+        inputs: List[str] = json.load(file)
+    path = os.path.join(directory, "script.json")
+    eliza.CACHE_DIR = directory
+
+    def load() -> Any:
+        if form == "json":
+            with open(path, "r", encoding="utf-8") as script_file:
+                return json.load(script_file)
+        if form == "compiled":
+            return eliza.load_script(path)
+        with open(os.path.join(directory, "compact.pickle"), "rb") as compact_file:
+            return pickle.load(compact_file)
+
+    gc.collect()
+    before = rss_kib()
+    start = time.perf_counter()
+    script = load()
+    results = {"load s": time.perf_counter() - start}
+    gc.collect()
+    results["RSS MiB"] = (rss_kib() - before) / 1024
+    tracemalloc.start()
+    traced = load()
+    results["traced MiB"] = tracemalloc.get_traced_memory()[0] / 2**20
+    tracemalloc.stop()
+    del traced
+    if form == "json":
+        return results
+
+    session = eliza.ElizaSession(script)
+    for text in inputs:
+        session.respond(text)
+    start = time.perf_counter()
+    for text in inputs:
+        session.respond(text)
+    results["us/turn"] = (time.perf_counter() - start) / len(inputs) * 1e6
+    gc.collect()
+    results["RSS after"] = (rss_kib() - before) / 1024
+    return results
+
+
+def prepare(directory: str, decoded: int) -> None:
+    """Fill the compiled script cache and pickle the compact form."""
+    path = os.path.join(directory, "script.json")
+    eliza.CACHE_DIR = directory
+    compact = CompactScript(eliza.load_script(path), decoded)
+    with open(os.path.join(directory, "compact.pickle"), "wb") as compact_file:
+        pickle.dump(compact, compact_file, pickle.HIGHEST_PROTOCOL)
+
+
+def run(*args: str) -> str:
+    return subprocess.run(
+        [sys.executable, __file__, *args], check=True, capture_output=True, text=True
+    ).stdout
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--keywords", type=int, default=100000)
+    parser.add_argument("--turns", type=int, default=5000)
+    parser.add_argument("--decoded", type=int, default=DECODED_KEYWORDS)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--prepare", help="internal")
+    parser.add_argument("--form", choices=FORMS, help="internal")
+    parser.add_argument("--directory", help="internal")
+    args = parser.parse_args()
+
+    if args.prepare:
+        prepare(args.prepare, args.decoded)
+        return
+    if args.form:
+        print(json.dumps(measure(args.form, args.directory)))
+        return
+
+    print(f"{'script':<16}{'form':<10}" + "".join(f"{c:>12}" for c in COLUMNS))
+    for name in ("bundled", f"{args.keywords} keywords"):
+        with tempfile.TemporaryDirectory() as directory:
+            if name == "bundled":
+                with open(eliza.SCRIPT_PATH, "r", encoding="utf-8") as script_file:
+                    script = json.load(script_file)
+                inputs = [text for _, text in generate_corpus(args.turns, args.seed)]
+            else:
+                script = generate_script(args.keywords, seed=args.seed)
+                inputs = generate_inputs(args.turns, args.keywords, 100, 10, args.seed)
+            for file_name, data in (("script.json", script), ("inputs.json", inputs)):
+                with open(
+                    os.path.join(directory, file_name), "w", encoding="utf-8"
+                ) as file:
+                    json.dump(data, file)
+            del script
+            run("--prepare", directory, "--decoded", str(args.decoded))
+            for form in FORMS:
+                results = json.loads(run("--form", form, "--directory", directory))
+                print(
+                    f"{name:<16}{form:<10}"
+                    + "".join(
+                        f"{results[c]:>12.3g}" if c in results else f"{'-':>12}"
+                        for c in COLUMNS
+                    )
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+"""
+ELIZA benchmark suite: end-to-end and per-stage timings on a corpus.
+
+Each stage is timed twice: in a tight loop for throughput (ops/sec) and call
+by call for latency percentiles. Results can be stored as a JSON baseline
+and compared against later runs to catch regressions across commits.
+
+    python benchmarks/bench_eliza.py                # print a report
+    python benchmarks/bench_eliza.py --save         # also write the baseline
+    python benchmarks/bench_eliza.py --compare      # compare with the baseline
+    python benchmarks/bench_eliza.py --corpus utterances.jsonl
+"""
+
+import argparse
+import functools
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List, Tuple
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_ROOT)
+os.chdir(REPO_ROOT)
+
+# pylint: disable=wrong-import-position
+import eliza
+from corpus import CATEGORIES, generate_corpus, load_corpus
+from eliza_trace import TraceCollector
+
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+CONVERSATION_LENGTH = 20
+
+# A stage setup returns the calls to time; it runs again before every repeat
+# so stateful stages (rotation, memory) start from the same state each time.
+Call = Tuple[Callable, tuple]
+StageSetup = Callable[[], List[Call]]
+
+
+def conversations(texts: List[str], tracer=None) -> List[Call]:
+    """Split texts into conversations, each with a fresh session."""
+    calls = []
+    session = eliza.ElizaSession(eliza.COMPILED, tracer)
+    for i, text in enumerate(texts):
+        if i % CONVERSATION_LENGTH == 0:
+            session = eliza.ElizaSession(eliza.COMPILED, tracer)
+        calls.append((session.respond, (text,)))
+    return calls
+
+
+def build_stages(corpus: List[Tuple[str, str]]) -> Dict[str, StageSetup]:
+    """Build the stage setups for a corpus."""
+    script = eliza.COMPILED
+    texts = [text for _, text in corpus]
+    raw_words = [text.strip().upper().split() for text in texts]
+    clean_words = [
+        [word.strip(".,!?;:") for word in script.truncate_on_delimiters(words)]
+        for words in raw_words
+    ]
+    prepared = [script.prepare(text) for text in texts]
+
+    stages: Dict[str, StageSetup] = {
+        "respond": lambda: conversations(texts),
+        # Tracing enabled; "respond" itself measures the disabled hooks
+        "respond[traced]": lambda: conversations(texts, TraceCollector()),
+    }
+    for category in CATEGORIES:
+        subset = [text for cat, text in corpus if cat == category]
+        if subset:
+            stages[f"respond[{category}]"] = functools.partial(conversations, subset)
+
+    stages["prepare"] = lambda: [(script.prepare, (text,)) for text in texts]
+    stages["truncate_on_delimiters"] = lambda: [
+        (script.truncate_on_delimiters, (words,)) for words in raw_words
+    ]
+    stages["find_keywords"] = lambda: [
+        (script.find_keywords, (words,)) for words in clean_words
+    ]
+
+    def try_keyword_calls() -> List[Call]:
+        session = eliza.ElizaSession(script)
+        # Fresh turns, so the reflection cached on each turn isn't reused
+        return [
+            (session.try_keyword, (turn.keywords[0] if turn.keywords else "NONE", turn))
+            for turn in (script.prepare(text) for text in texts)
+        ]
+
+    stages["try_keyword"] = try_keyword_calls
+
+    memory_inputs = [
+        (keyword, turn.normalized)
+        for turn in prepared
+        for keyword in turn.keywords
+        if keyword in script.memory_rules
+    ]
+    if memory_inputs:
+
+        def store_calls() -> List[Call]:
+            session = eliza.ElizaSession(script)
+            return [
+                (session.store_memory, (keyword, eliza.Turn.from_normalized(text)))
+                for keyword, text in memory_inputs
+            ]
+
+        def recall_calls() -> List[Call]:
+            session = eliza.ElizaSession(script)
+            for keyword, text in memory_inputs:
+                session.store_memory(keyword, eliza.Turn.from_normalized(text))
+            count = sum(len(templates) for templates in session.memory)
+            return [(session.recall_memory, ())] * count
+
+        stages["store_memory"] = store_calls
+        stages["recall_memory"] = recall_calls
+
+    generate_inputs = []
+    for turn in prepared:
+        keywords = turn.keywords
+        keyword_rule = script.resolve_keyword(keywords[0] if keywords else "NONE")
+        found = keyword_rule and script.match_keyword(keyword_rule, turn)
+        if found:
+            rule, match = found
+            for template in rule.responses:
+                if isinstance(template, eliza.ResponseTemplate):
+                    generate_inputs.append((template, match.groups()))
+                    break
+    stages["generate_response"] = lambda: [
+        (script.generate_response, args) for args in generate_inputs
+    ]
+    return stages
+
+
+def percentile(sorted_values: List[int], fraction: float) -> float:
+    """Nearest-rank percentile of pre-sorted values."""
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+def run_stage(setup: StageSetup, repeat: int) -> dict:
+    """Time one stage, keeping the best throughput and all latencies."""
+    best = float("inf")
+    latencies: List[int] = []
+    count = 0
+    clock = time.perf_counter_ns
+    for _ in range(repeat):
+        calls = setup()
+        count = len(calls)
+        start = time.perf_counter()
+        for func, args in calls:
+            func(*args)
+        best = min(best, time.perf_counter() - start)
+
+        for func, args in setup():
+            began = clock()
+            func(*args)
+            latencies.append(clock() - began)
+
+    latencies.sort()
+    return {
+        "calls": count,
+        "ops_per_sec": count / best if best else 0.0,
+        "p50_us": percentile(latencies, 0.50) / 1000,
+        "p90_us": percentile(latencies, 0.90) / 1000,
+        "p99_us": percentile(latencies, 0.99) / 1000,
+        "max_us": latencies[-1] / 1000,
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_report(stages: Dict[str, dict]) -> None:
+    print(
+        f"{'stage':<26}{'calls':>8}{'ops/sec':>12}"
+        f"{'p50 us':>10}{'p90 us':>10}{'p99 us':>10}{'max us':>10}"
+    )
+    for name, stats in stages.items():
+        print(
+            f"{name:<26}{stats['calls']:>8}{stats['ops_per_sec']:>12.0f}"
+            f"{stats['p50_us']:>10.1f}{stats['p90_us']:>10.1f}"
+            f"{stats['p99_us']:>10.1f}{stats['max_us']:>10.1f}"
+        )
+
+
+def compare(current: Dict[str, dict], baseline: Dict[str, dict], threshold: float):
+    """Print throughput against the baseline; return the regressed stages."""
+    regressions = []
+    print(f"\n{'stage':<26}{'baseline':>12}{'current':>12}{'change':>10}")
+    for name, stats in current.items():
+        if name not in baseline:
+            continue
+        before = baseline[name]["ops_per_sec"]
+        after = stats["ops_per_sec"]
+        change = after / before - 1 if before else 0.0
+        flag = ""
+        if change < -threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(f"{name:<26}{before:>12.0f}{after:>12.0f}{change:>+10.1%}{flag}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", type=int, default=2000, help="corpus size")
+    parser.add_argument("--seed", type=int, default=0, help="corpus seed")
+    parser.add_argument("--corpus", help="load utterances from a text/JSONL file")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--stage", action="append", help="only run these stages")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save", action="store_true", help="write the baseline")
+    parser.add_argument("--compare", action="store_true", help="compare to baseline")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.25,
+        help="throughput drop that counts as a regression (default 0.25)",
+    )
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    if args.corpus:
+        corpus = load_corpus(args.corpus)
+    else:
+        corpus = generate_corpus(args.size, args.seed)
+
+    results = {}
+    for name, setup in build_stages(corpus).items():
+        if args.stage and name not in args.stage:
+            continue
+        results[name] = run_stage(setup, args.repeat)
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "corpus": args.corpus or f"generated size={args.size} seed={args.seed}",
+            "repeat": args.repeat,
+        },
+        "stages": results,
+    }
+    print_report(results)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as out:
+            json.dump(report, out, indent=2)
+    if args.save:
+        with open(args.baseline, "w", encoding="utf-8") as out:
+            json.dump(report, out, indent=2)
+            out.write("\n")
+        print(f"\nbaseline written to {args.baseline}")
+    if args.compare:
+        with open(args.baseline, "r", encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)
+        print(f"baseline: commit {baseline['meta']['commit']}")
+        if compare(results, baseline["stages"], args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
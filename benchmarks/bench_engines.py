@@ -0,0 +1,101 @@
+"""
+Compare the pattern engines: regexes ("re") and word matching ("tokens").
+
+For each engine, reports:
+
+- us/turn: ElizaSession.respond over a generated corpus
+- search us: every decomposition pattern searched against every
+  transformed input, per search, without the literal prefilter
+- agree: inputs answered as the regex engine answers them, each by a
+  fresh session so one difference doesn't shift every later rotation
+- adversarial inputs from bench_backtrack.py, in ms; the regex engine is
+  skipped above --plain-max words, where it takes minutes
+
+    python benchmarks/bench_engines.py --words 10000 20000
+"""
+
+import argparse
+import os
+import sys
+import time
+from typing import Any, Dict, List, Tuple
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+# pylint: disable=wrong-import-position
+import eliza
+from bench_backtrack import ATTACKS
+from corpus import generate_corpus
+
+
+def search_microseconds(script: eliza.CompiledScript, texts: List[str]) -> float:
+    """Mean time of one pattern search over the transformed inputs."""
+    pairs: List[Tuple[Any, str]] = []
+    for text in texts:
+        turn = script.prepare(text)
+        for keyword in turn.keywords:
+            keyword_rule = script.dispatch.get(keyword)
+            if keyword_rule is not None:
+                transformed = script.transform_input(keyword_rule, turn)
+                pairs.extend((rule.regex, transformed) for rule in keyword_rule.rules)
+    start = time.perf_counter()
+    for pattern, transformed in pairs:
+        pattern.search(transformed)
+    return (time.perf_counter() - start) / len(pairs) * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--turns", type=int, default=20000)
+    parser.add_argument("--words", type=int, nargs="+", default=[10000, 20000])
+    parser.add_argument("--plain-max", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    texts = [text for _, text in generate_corpus(args.turns, args.seed)]
+    scripts = {
+        engine: eliza.load_script(cache=False, harden=False, engine=engine)
+        for engine in eliza.ENGINES
+    }
+    expected = [eliza.ElizaSession(scripts["re"]).respond(text) for text in texts]
+    token_rules = sum(
+        isinstance(rule.regex, eliza.TokenPattern) for rule in scripts["tokens"].rules
+    )
+    print(
+        f"tokens engine runs {token_rules} of {len(scripts['tokens'].rules)}"
+        " patterns word by word"
+    )
+
+    columns = ["us/turn", "search us", "agree %"] + [
+        f"{name} {words}" for name in ATTACKS for words in args.words
+    ]
+    print(f"{'engine':<8}" + "".join(f"{column:>22}" for column in columns))
+    for engine, script in scripts.items():
+        session = eliza.ElizaSession(script)
+        start = time.perf_counter()
+        for text in texts:
+            session.respond(text)
+        results: Dict[str, str] = {
+            "us/turn": f"{(time.perf_counter() - start) / len(texts) * 1e6:.1f}",
+            "search us": f"{search_microseconds(script, texts):.2f}",
+        }
+        agree = sum(
+            eliza.ElizaSession(script).respond(text) == reply
+            for text, reply in zip(texts, expected)
+        )
+        results["agree %"] = f"{agree / len(texts) * 100:.2f}"
+        for name, attack in ATTACKS.items():
+            for words in args.words:
+                column = f"{name} {words}"
+                if engine == "re" and words > args.plain_max:
+                    results[column] = "-"
+                    continue
+                start = time.perf_counter()
+                eliza.ElizaSession(script).respond(attack(words))
+                results[column] = f"{(time.perf_counter() - start) * 1000:.1f}"
+        print(f"{engine:<8}" + "".join(f"{results[column]:>22}" for column in columns))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Load test for WorkerPool: turns/sec as the number of workers grows.
+
+Drives many concurrent conversations through a pool from one event loop
+and reports throughput per worker count, next to the same conversations
+answered in-process. Scaling is bounded by the cores available: on a
+machine with C cores, expect close to linear gains up to about C - 1
+workers, since the dispatcher needs a core of its own.
+
+    python benchmarks/bench_pool.py --workers 1 --workers 2 --workers 4
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from typing import List, Tuple
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+# pylint: disable=wrong-import-position
+import eliza
+from corpus import generate_corpus
+from eliza_pool import WorkerPool
+
+
+def in_process(conversations: List[List[str]]) -> float:
+    start = time.perf_counter()
+    for texts in conversations:
+        session = eliza.ElizaSession(eliza.COMPILED)
+        for text in texts:
+            session.respond(text)
+    return time.perf_counter() - start
+
+
+async def pooled(workers: int, conversations: List[List[str]]) -> Tuple[float, int]:
+    pool = WorkerPool(workers)
+    await pool.start()
+    # Warm up: every worker loads its script before the clock starts
+    await asyncio.gather(*(pool.respond(f"warm{n}", "HELLO") for n in range(64)))
+
+    async def client(name: str, texts: List[str]) -> None:
+        for text in texts:
+            await pool.respond(name, text)
+
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(client(f"user{n}", texts) for n, texts in enumerate(conversations))
+    )
+    elapsed = time.perf_counter() - start
+    await pool.close()
+    return elapsed, pool.turns
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, action="append")
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=50, help="turns per client")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    corpus = generate_corpus(args.clients * args.turns, args.seed)
+    texts = [text for _, text in corpus]
+    conversations = [
+        texts[n * args.turns : (n + 1) * args.turns] for n in range(args.clients)
+    ]
+    total = args.clients * args.turns
+
+    print(f"cores: {os.cpu_count()}")
+    print(f"{'workers':<12}{'turns/sec':>12}{'speedup':>9}")
+    base = total / in_process(conversations)
+    print(f"{'in-process':<12}{base:>12.0f}{1.0:>9.2f}")
+    for workers in args.workers or [1, 2, 4]:
+        elapsed, _ = asyncio.run(pooled(workers, conversations))
+        rate = total / elapsed
+        print(f"{workers:<12}{rate:>12.0f}{rate / base:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
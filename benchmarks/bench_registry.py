@@ -0,0 +1,120 @@
+"""
+Memory cost of hosting many script variants in one process.
+
+Generates variants of the bundled script the way tenants customize it (a
+greeting of their own, a few reworded responses, a keyword of their own,
+some ranks changed) and loads them:
+
+- separate: one plain CompiledScript per variant
+- registry: the same variants in a ScriptRegistry
+
+Each mode runs in a fresh process and reports the growth in resident set
+size over loading the first variant, so the interpreter and the modules
+don't count. Every pattern is compiled in both modes.
+
+    python benchmarks/bench_registry.py --variants 100
+"""
+
+import argparse
+import copy
+import json
+import os
+import random
+import subprocess
+import sys
+from typing import List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+# pylint: disable=wrong-import-position
+import eliza
+from eliza_registry import ScriptRegistry
+
+
+def make_variants(count: int, seed: int) -> List[dict]:
+    """Customized copies of the bundled script."""
+    with open(eliza.SCRIPT_PATH, "r", encoding="utf-8") as script_file:
+        base = json.load(script_file)
+    rng = random.Random(seed)
+    variants = []
+    for number in range(count):
+        script = copy.deepcopy(base)
+        script["greeting"] = f"WELCOME TO SUPPORT DESK {number}. HOW CAN I HELP?"
+        keywords = script["keywords"]
+        for keyword in rng.sample(sorted(keywords), 5):
+            keywords[keyword]["rank"] = rng.randint(0, 10)
+            responses = keywords[keyword].get("responses", {})
+            for templates in responses.values():
+                if isinstance(templates[0], str):
+                    templates[0] = f"{templates[0]} (DESK {number})"
+        keywords[f"ACCOUNT{number}"] = {
+            "rank": 5,
+            "responses": {
+                "0 ACCOUNT 0": [
+                    "WHAT ABOUT YOUR ACCOUNT",
+                    f"ACCOUNT {number} QUESTIONS GO TO BILLING",
+                ]
+            },
+        }
+        variants.append(script)
+    return variants
+
+
+def rss_kib() -> int:
+    with open("/proc/self/status", "r", encoding="utf-8") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    raise RuntimeError("no VmRSS in /proc/self/status")
+
+
+def measure(mode: str, count: int, seed: int) -> None:
+    """Load the variants and print KiB used beyond the first one."""
+    variants = make_variants(count, seed)
+    registry = ScriptRegistry()
+    kept = []
+
+    def load(number: int, script: dict) -> None:
+        if mode == "registry":
+            registry.load(str(number), script=script)
+        else:
+            compiled = eliza.CompiledScript(script)
+            for rule in compiled.rules:
+                _ = rule.regex
+            kept.append(compiled)
+
+    load(0, variants[0])
+    start = rss_kib()
+    for number, script in enumerate(variants[1:], 1):
+        load(number, script)
+    print(rss_kib() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--variants", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--mode", choices=["separate", "registry"], help="internal")
+    args = parser.parse_args()
+
+    if args.mode:
+        measure(args.mode, args.variants, args.seed)
+        return
+
+    extra = args.variants - 1
+    print(f"{'mode':<10}{'RSS KiB':>10}{'KiB/variant':>13}")
+    for mode in ("separate", "registry"):
+        output = subprocess.run(
+            [sys.executable, __file__, "--mode", mode]
+            + ["--variants", str(args.variants), "--seed", str(args.seed)],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        kib = int(output)
+        print(f"{mode:<10}{kib:>10}{kib / extra:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
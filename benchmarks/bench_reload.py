@@ -0,0 +1,123 @@
+"""
+Measure script reloads: how long they take and how long they stall turns.
+
+Runs conversations through an ElizaServer on one event loop, as the
+server does, while the script file is edited and reloaded every
+--interval seconds. A ticker task measures event loop lag, which is the
+pause every connection sees. Three modes:
+
+- none: no reloads, for the baseline lag
+- async: reload_async, which compiles in a thread (what SIGHUP and
+  --reload-interval use)
+- blocking: reload() called on the event loop, for comparison
+
+Each edit changes a response, so no reload can use the compiled script cache.
+
+    python benchmarks/bench_reload.py --seconds 5 --interval 0.5
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+# pylint: disable=wrong-import-position
+import eliza
+from corpus import generate_corpus
+from eliza_reload import ScriptReloader
+from eliza_server import ElizaServer
+
+TICK = 0.001
+
+
+async def run(mode: str, args: argparse.Namespace, path: str) -> Dict[str, float]:
+    with open(eliza.SCRIPT_PATH, "r", encoding="utf-8") as script_file:
+        script = json.load(script_file)
+    with open(path, "w", encoding="utf-8") as script_file:
+        json.dump(script, script_file)
+    reloader = ScriptReloader(path)
+    server = ElizaServer(reloader=reloader)
+    lines = [
+        json.dumps({"text": text}).encode()
+        for _, text in generate_corpus(5000, args.seed)
+    ]
+    deadline = time.perf_counter() + args.seconds
+    lags: List[float] = []
+    compiles: List[float] = []
+    turns = 0
+
+    async def client(number: int) -> None:
+        nonlocal turns
+        session = eliza.ElizaSession(server.script)
+        position = number * 97
+        while time.perf_counter() < deadline:
+            server.handle_request(session, lines[position % len(lines)])
+            position += 1
+            turns += 1
+            await asyncio.sleep(0)
+
+    async def ticker() -> None:
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            await asyncio.sleep(TICK)
+            lags.append(time.perf_counter() - start - TICK)
+
+    async def editor() -> None:
+        edit = 0
+        while time.perf_counter() + args.interval < deadline:
+            await asyncio.sleep(args.interval)
+            edit += 1
+            script["keywords"]["SORRY"]["responses"][""][0] = f"{mode} EDIT {edit}"
+            with open(path, "w", encoding="utf-8") as script_file:
+                json.dump(script, script_file)
+            if mode == "async":
+                await reloader.reload_async()
+            else:
+                reloader.reload()
+            compiles.append(reloader.compile_seconds)
+
+    tasks = [client(number) for number in range(args.clients)] + [ticker()]
+    if mode != "none":
+        tasks.append(editor())
+    await asyncio.gather(*tasks)
+
+    lags.sort()
+    return {
+        "turns/sec": turns / args.seconds,
+        "reloads": len(compiles),
+        "compile ms": statistics.mean(compiles) * 1000 if compiles else 0.0,
+        "p99 lag ms": lags[int(len(lags) * 0.99)] * 1000,
+        "max lag ms": lags[-1] * 1000,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--interval", type=float, default=0.5)
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    columns = ["turns/sec", "reloads", "compile ms", "p99 lag ms", "max lag ms"]
+    print(f"{'mode':<10}" + "".join(f"{column:>12}" for column in columns))
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "script.json")
+        for mode in ("none", "async", "blocking"):
+            result = asyncio.run(run(mode, args, path))
+            print(
+                f"{mode:<10}"
+                + "".join(f"{result[column]:>12.1f}" for column in columns)
+            )
+
+
+if __name__ == "__main__":
+    main()
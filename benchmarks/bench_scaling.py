@@ -0,0 +1,203 @@
+"""
+How load time, memory and turn latency grow with the size of a script.
+
+Generates scripts with synthetic_script.py and grows one dimension at a time
+from a base size:
+
+- keywords: generated keywords (each with --rules rules)
+- rules: decomposition rules per keyword
+- list size: words in each word list, once for each engine (--engines)
+
+Every point is measured in a fresh process:
+
+- compile s: CompiledScript from the JSON, patterns compiled
+- cached s: load_script from a warm compiled script cache
+- RSS MiB: resident memory the compiled script holds
+- prepare us: ElizaSession's keyword scan (CompiledScript.prepare) per turn
+- turn us: ElizaSession.respond per turn
+
+Each metric's growth is the exponent of a power law through the last two
+points: 1 is linear, 0 flat. Anything growing faster than linear (above
+--flag, 1.2 by default) is flagged. --csv writes every point, for plotting.
+
+    python benchmarks/bench_scaling.py
+    python benchmarks/bench_scaling.py --keywords 1000 10000 100000
+    python benchmarks/bench_scaling.py --word-lists 10 --list-size 10 1000 100000
+"""
+
+import argparse
+import csv
+import gc
+import json
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Tuple
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+# pylint: disable=wrong-import-position
+import eliza
+from bench_registry import rss_kib
+from synthetic_script import generate_inputs, generate_script
+
+METRICS = ["compile s", "cached s", "RSS MiB", "prepare us", "turn us"]
+TURNS = 5000
+
+
+def measure(point: Dict[str, Any], seed: int) -> Dict[str, float]:
+    """Measure one script size; runs in the child process."""
+    script = generate_script(
+        point["keywords"],
+        point["rules"],
+        point["word_lists"],
+        point["list_size"],
+        seed=seed,
+    )
+    inputs = generate_inputs(
+        TURNS, point["keywords"], point["word_lists"], point["list_size"], seed
+    )
+    engine = point.get("engine", "re")
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "script.json")
+        with open(path, "w", encoding="utf-8") as script_file:
+            json.dump(script, script_file)
+        del script
+        gc.collect()
+        with open(path, "rb") as script_file:
+            data = script_file.read()
+
+        before = rss_kib()
+        start = time.perf_counter()
+        compiled = eliza.CompiledScript(json.loads(data), engine=engine)
+        results["compile s"] = time.perf_counter() - start
+        gc.collect()
+        results["RSS MiB"] = (rss_kib() - before) / 1024
+
+        eliza.CACHE_DIR = directory
+        eliza.load_script(path, engine=engine)
+        start = time.perf_counter()
+        eliza.load_script(path, engine=engine)
+        results["cached s"] = time.perf_counter() - start
+
+    session = eliza.ElizaSession(compiled)
+    # Compile each pattern a turn reaches before timing turns
+    for text in inputs:
+        session.respond(text)
+    start = time.perf_counter()
+    for text in inputs:
+        compiled.prepare(text)
+    results["prepare us"] = (time.perf_counter() - start) / len(inputs) * 1e6
+    start = time.perf_counter()
+    for text in inputs:
+        session.respond(text)
+    results["turn us"] = (time.perf_counter() - start) / len(inputs) * 1e6
+    return results
+
+
+def growth(points: List[Tuple[int, Dict[str, float]]], metric: str) -> float:
+    """The power law exponent of a metric between the last two points."""
+    (size_a, results_a), (size_b, results_b) = points[-2:]
+    low, high = results_a[metric], results_b[metric]
+    if low <= 0 or high <= 0:
+        return 0.0
+    return math.log(high / low) / math.log(size_b / size_a)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--keywords", type=int, nargs="+", default=[1000, 4000, 16000])
+    parser.add_argument("--rules", type=int, nargs="+", default=[2, 8, 32])
+    parser.add_argument("--list-size", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--base-keywords", type=int, default=1000)
+    parser.add_argument("--base-rules", type=int, default=4)
+    parser.add_argument("--base-list-size", type=int, default=10)
+    parser.add_argument("--word-lists", type=int, default=100)
+    parser.add_argument(
+        "--engines",
+        nargs="+",
+        choices=eliza.ENGINES,
+        default=list(eliza.ENGINES),
+        help="engines to sweep the list size with",
+    )
+    parser.add_argument("--flag", type=float, default=1.2)
+    parser.add_argument("--csv", help="write every point to this CSV file")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--point", help="internal")
+    args = parser.parse_args()
+
+    if args.point:
+        print(json.dumps(measure(json.loads(args.point), args.seed)))
+        return
+
+    base = {
+        "keywords": args.base_keywords,
+        "rules": args.base_rules,
+        "word_lists": args.word_lists,
+        "list_size": args.base_list_size,
+    }
+    # (dimension, sizes, engine); word lists are matched differently by
+    # each engine, so their size is swept with every one
+    sweeps = [("keywords", args.keywords, "re"), ("rules", args.rules, "re")]
+    sweeps.extend(("list_size", args.list_size, engine) for engine in args.engines)
+    rows = []
+    flagged: List[str] = []
+    print(
+        f"{'dimension':<11}{'engine':<8}{'size':>8}"
+        + "".join(f"{m:>12}" for m in METRICS)
+    )
+    for dimension, sizes, engine in sweeps:
+        points: List[Tuple[int, Dict[str, float]]] = []
+        for size in sizes:
+            point: Dict[str, Any] = dict(base, engine=engine, **{dimension: size})
+            output = subprocess.run(
+                [sys.executable, __file__, "--point", json.dumps(point)]
+                + ["--seed", str(args.seed)],
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout
+            results = json.loads(output)
+            points.append((size, results))
+            rows.append(dict(point, dimension=dimension, **results))
+            print(
+                f"{dimension:<11}{engine:<8}{size:>8}"
+                + "".join(f"{results[m]:>12.3g}" for m in METRICS)
+            )
+        if len(points) < 2:
+            continue
+        exponents = {metric: growth(points, metric) for metric in METRICS}
+        print(
+            f"{'  growth':<27}"
+            + "".join(
+                f"{exponents[m]:>11.2f}{'!' if exponents[m] > args.flag else ' '}"
+                for m in METRICS
+            )
+        )
+        flagged.extend(
+            f"{metric} grows as {dimension}^{exponent:.2f} ({engine})"
+            for metric, exponent in exponents.items()
+            if exponent > args.flag
+        )
+
+    if args.csv:
+        with open(args.csv, "w", newline="", encoding="utf-8") as csv_file:
+            writer = csv.DictWriter(csv_file, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+    print()
+    if flagged:
+        print("worse than linear:")
+        for line in flagged:
+            print(f"  {line}")
+    else:
+        print(f"no stage grows faster than size^{args.flag}")
+
+
+if __name__ == "__main__":
+    main()
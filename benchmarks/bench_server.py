@@ -0,0 +1,113 @@
+"""
+Load test for the asyncio server using local clients only.
+
+Starts ``python eliza.py --serve`` in a subprocess, opens a number of idle
+connections, then drives conversations from a set of active clients and
+reports turns per second and the server's resident memory.
+
+    python benchmarks/bench_server.py --idle 5000 --clients 50 --turns 200
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from dialog import DIALOG  # pylint: disable=wrong-import-position
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def rss_kib(pid: int) -> int:
+    """Resident set size of a process in KiB (Linux only)."""
+    with open(f"/proc/{pid}/status", encoding="utf-8") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+async def wait_for_port(port: int) -> None:
+    for _ in range(100):
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.05)
+    raise RuntimeError("server did not start")
+
+
+async def idle_client(port: int):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    await reader.readline()
+    return writer
+
+
+async def active_client(port: int, turns: int) -> None:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    await reader.readline()
+    for i in range(turns):
+        writer.write(json.dumps({"text": DIALOG[i % len(DIALOG)]}).encode() + b"\n")
+        await writer.drain()
+        reply = json.loads(await reader.readline())
+        assert "reply" in reply, reply
+    writer.close()
+
+
+async def run(args: argparse.Namespace) -> None:
+    port = free_port()
+    server = subprocess.Popen(  # pylint: disable=consider-using-with
+        [sys.executable, "eliza.py", "--serve", "--port", str(port)],
+        cwd=REPO_ROOT,
+        stdout=subprocess.DEVNULL,
+    )
+    try:
+        await wait_for_port(port)
+        base_rss = rss_kib(server.pid)
+
+        idle = []
+        for _ in range(args.idle):
+            idle.append(await idle_client(port))
+        idle_rss = rss_kib(server.pid)
+        print(f"idle connections: {len(idle)}")
+        if idle:
+            per_conn = (idle_rss - base_rss) / len(idle)
+            print(f"server RSS: {idle_rss} KiB ({per_conn:.1f} KiB per connection)")
+
+        start = time.perf_counter()
+        await asyncio.gather(
+            *(active_client(port, args.turns) for _ in range(args.clients))
+        )
+        elapsed = time.perf_counter() - start
+        total = args.clients * args.turns
+        print(f"turns: {total} in {elapsed:.2f}s = {total / elapsed:.0f} turns/s")
+
+        for writer in idle:
+            writer.close()
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--idle", type=int, default=1000)
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--turns", type=int, default=200)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Measure ELIZA startup: import time and time to the first response.
+
+Each measurement runs in a fresh interpreter, with the compiled-script cache
+in a temporary directory:
+
+- import: ``import eliza`` alone, which no longer reads the script
+- uncached: import, load the script without the cache, answer one input
+- cold: the same through load_script with an empty cache (writes it)
+- warm: the same with the cache written by the cold run
+
+    python benchmarks/bench_startup.py --runs 20
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in the child; prints in-process timings as JSON
+PROBE = """
+import json, time
+start = time.perf_counter()
+import eliza
+imported = time.perf_counter()
+if {load}:
+    script = eliza.load_script(cache={cache})
+    eliza.ElizaSession(script).respond("I remember my mother")
+loaded = time.perf_counter()
+print(json.dumps({{"import": imported - start, "total": loaded - start}}))
+"""
+
+
+def probe(load: bool, cache: bool, cache_dir: str) -> Dict[str, float]:
+    """Run one fresh interpreter and return its timings in seconds."""
+    env = dict(os.environ, ELIZA_CACHE_DIR=cache_dir, PYTHONPATH=REPO_ROOT)
+    # Measure with bytecode caching, as an installed module would run
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    began = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE.format(load=load, cache=cache)],
+        cwd=tempfile.gettempdir(),
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    timings = json.loads(result.stdout)
+    timings["process"] = time.perf_counter() - began
+    return timings
+
+
+def measure(mode: str, runs: int) -> List[Dict[str, float]]:
+    results = []
+    for _ in range(runs):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            if mode == "import":
+                results.append(probe(False, True, cache_dir))
+            elif mode == "uncached":
+                results.append(probe(True, False, cache_dir))
+            elif mode == "cold":
+                results.append(probe(True, True, cache_dir))
+            else:
+                probe(True, True, cache_dir)
+                results.append(probe(True, True, cache_dir))
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    # Warm the OS file cache and the bytecode cache first
+    measure("warm", 1)
+
+    print(f"{'mode':<10}{'import ms':>12}{'first reply ms':>16}{'process ms':>12}")
+    for mode in ("import", "uncached", "cold", "warm"):
+        results = measure(mode, args.runs)
+        print(
+            f"{mode:<10}"
+            f"{statistics.median(r['import'] for r in results) * 1000:>12.2f}"
+            f"{statistics.median(r['total'] for r in results) * 1000:>16.2f}"
+            f"{statistics.median(r['process'] for r in results) * 1000:>12.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
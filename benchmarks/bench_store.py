@@ -0,0 +1,100 @@
+"""
+Measure turns/sec with session persistence off and on.
+
+Runs the same interleaved conversations through:
+
+- off: plain ElizaSessions in a dict, nothing saved
+- memory: SessionManager with MemorySessionStore
+- sqlite: SessionManager with SQLiteSessionStore (write-behind, group commit)
+- sqlite-sync: the same, but flushing after every turn, as a store that
+  commits inline would
+
+The sqlite timings include the final close(), so every state is on disk.
+
+    python benchmarks/bench_store.py --sessions 200 --turns 20
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Tuple
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+# pylint: disable=wrong-import-position
+import eliza
+from corpus import generate_corpus
+from eliza_store import MemorySessionStore, SessionManager, SQLiteSessionStore
+
+Turns = List[Tuple[str, str]]
+
+
+def run_off(turns: Turns, _: str) -> dict:
+    sessions: Dict[str, eliza.ElizaSession] = {}
+    for session_id, text in turns:
+        session = sessions.get(session_id)
+        if session is None:
+            session = sessions[session_id] = eliza.ElizaSession(eliza.COMPILED)
+        session.respond(text)
+    return {}
+
+
+def run_manager(store, turns: Turns, flush_each: bool = False) -> dict:
+    manager = SessionManager(eliza.COMPILED, store)
+    for session_id, text in turns:
+        manager.respond(session_id, text)
+        if flush_each:
+            store.flush()
+    manager.close()
+    return {
+        "commits": getattr(store, "commits", 0),
+        "rows": getattr(store, "rows_written", 0),
+    }
+
+
+MODES: List[Tuple[str, Callable[[Turns, str], dict]]] = [
+    ("off", run_off),
+    ("memory", lambda turns, _: run_manager(MemorySessionStore(), turns)),
+    ("sqlite", lambda turns, path: run_manager(SQLiteSessionStore(path), turns)),
+    (
+        "sqlite-sync",
+        lambda turns, path: run_manager(SQLiteSessionStore(path), turns, True),
+    ),
+]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=20, help="turns per session")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    corpus = generate_corpus(args.sessions * args.turns, args.seed)
+    # Round-robin over sessions, as concurrent users would interleave
+    turns = [
+        (f"user{index % args.sessions}", text) for index, (_, text) in enumerate(corpus)
+    ]
+
+    print(f"{'mode':<13}{'turns/sec':>12}{'us/turn':>10}{'commits':>9}{'rows':>8}")
+    for name, run in MODES:
+        best = float("inf")
+        counts: dict = {}
+        for _ in range(args.repeat):
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, "sessions.db")
+                start = time.perf_counter()
+                counts = run(turns, path)
+                best = min(best, time.perf_counter() - start)
+        print(
+            f"{name:<13}{len(turns) / best:>12.0f}{best / len(turns) * 1e6:>10.1f}"
+            f"{counts.get('commits', ''):>9}{counts.get('rows', ''):>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
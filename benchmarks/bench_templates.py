@@ -0,0 +1,96 @@
+"""
+Compare response generation from parsed templates with per-capture re.sub.
+
+Collects the (template, captures) pairs a corpus produces, then times
+CompiledScript.generate_response on the parsed templates against the
+previous implementation, which built a \\b<n>\\b regex and ran re.sub for
+every capture of every response.
+
+    python benchmarks/bench_templates.py --size 5000
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+from typing import List, Tuple
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+# pylint: disable=wrong-import-position
+import eliza
+from corpus import generate_corpus
+
+
+def substitute_per_capture(
+    script: eliza.CompiledScript, template: str, captures: tuple
+) -> str:
+    """generate_response as it was before templates were parsed."""
+    response = template
+    for i, capture in enumerate(captures, 1):
+        reflected_capture = script.reflect_pronouns(capture.strip())
+        response = re.sub(r"\b" + str(i) + r"\b", reflected_capture, response)
+    return response.strip()
+
+
+def collect_inputs(
+    script: eliza.CompiledScript, texts: List[str]
+) -> List[Tuple[eliza.ResponseTemplate, tuple]]:
+    """Every string template of the first matching rule, with its captures."""
+    inputs = []
+    for text in texts:
+        turn = script.prepare(text)
+        keyword_rule = script.resolve_keyword(
+            turn.keywords[0] if turn.keywords else "NONE"
+        )
+        found = keyword_rule and script.match_keyword(keyword_rule, turn)
+        if found:
+            rule, match = found
+            for template in rule.responses:
+                if isinstance(template, eliza.ResponseTemplate):
+                    inputs.append((template, match.groups()))
+    return inputs
+
+
+def best_of(repeat: int, func) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", type=int, default=5000, help="corpus size")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    script = eliza.COMPILED
+    inputs = collect_inputs(
+        script, [text for _, text in generate_corpus(args.size, args.seed)]
+    )
+    with_slots = sum(1 for template, _ in inputs if template.slots)
+
+    def parsed() -> None:
+        for template, captures in inputs:
+            script.generate_response(template, captures)
+
+    def per_capture() -> None:
+        for template, captures in inputs:
+            substitute_per_capture(script, template.text, captures)
+
+    before = best_of(args.repeat, per_capture)
+    after = best_of(args.repeat, parsed)
+    print(f"{len(inputs)} responses, {with_slots} with capture slots")
+    print(f"re.sub per capture: {before / len(inputs) * 1e9:8.0f} ns/response")
+    print(f"parsed template:    {after / len(inputs) * 1e9:8.0f} ns/response")
+    print(f"speedup:            {before / after:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Time to_json on a large synthetic LISP script.
+
+Writes a script in the style of the 1966 appendix with generated keywords,
+then times the reader alone and the full conversion to JSON, reporting
+MB/s and peak memory. Throughput should stay flat as the size grows.
+
+    python benchmarks/bench_to_json.py --size-mb 50
+    python benchmarks/bench_to_json.py --size-mb 5 --size-mb 50
+"""
+
+import argparse
+import functools
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pylint: disable=wrong-import-position
+from to_json import build_script, read_expressions
+
+WORDS = (
+    "MOTHER FATHER DREAM COMPUTER HOUSE SEA WORK MONEY FRIEND TIME "
+    "ALWAYS NEVER HAPPY SAD ANGRY AFRAID TIRED HOME SCHOOL CAR"
+).split()
+
+
+def keyword_expression(rng: random.Random, index: int) -> str:
+    """One keyword definition with a few decomposition rules."""
+    keyword = f"KW{index}"
+    rules = []
+    for _ in range(rng.randint(2, 5)):
+        word = rng.choice(WORDS)
+        responses = [
+            f"(WHY DO YOU SAY {word} 4)",
+            f"(TELL ME MORE ABOUT {word})",
+            f"(DOES {word} REMIND YOU OF 4)",
+            f"(=KW{rng.randrange(max(index, 1))})",
+        ]
+        rng.shuffle(responses)
+        rules.append(f"((0 {keyword} 0 {word} 0) {' '.join(responses)})")
+    rules.append("((0) (NEWKEY))")
+    return f"({keyword} {rng.randint(0, 10)} {' '.join(rules)})\n"
+
+
+def write_script(path: str, size: int, seed: int = 0) -> int:
+    """Write a synthetic script of about size bytes; return its keyword count."""
+    rng = random.Random(seed)
+    written = 0
+    index = 0
+    with open(path, "w", encoding="utf-8") as script_file:
+        script_file.write("(HOW DO YOU DO. PLEASE TELL ME YOUR PROBLEM)\nSTART\n")
+        script_file.write("(MEMORY KW0 (0 KW0 0 = DOES THAT HAVE TO DO WITH 3))\n")
+        while written < size:
+            if index % 50 == 0:
+                line = f"(WORD{index} = KW{index})\n"
+            else:
+                line = keyword_expression(rng, index)
+            script_file.write(line)
+            written += len(line)
+            index += 1
+    return index
+
+
+def timed(func) -> float:
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def count_expressions(path: str) -> int:
+    with open(path, "r", encoding="utf-8") as script_file:
+        return sum(1 for _ in read_expressions(script_file))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--size-mb", type=float, action="append", help="script size (default 50)"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(
+        f"{'size MB':>8}{'keywords':>10}{'read s':>9}{'read MB/s':>11}"
+        f"{'convert s':>11}{'convert MB/s':>14}{'peak RSS MB':>13}"
+    )
+    for size_mb in args.size_mb or [50.0]:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "script.txt")
+            keywords = write_script(path, int(size_mb * 1024 * 1024), args.seed)
+            megabytes = os.path.getsize(path) / (1024 * 1024)
+
+            read_time = timed(functools.partial(count_expressions, path))
+            convert_time = timed(functools.partial(build_script, path))
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+            print(
+                f"{megabytes:>8.1f}{keywords:>10}{read_time:>9.2f}"
+                f"{megabytes / read_time:>11.1f}{convert_time:>11.2f}"
+                f"{megabytes / convert_time:>14.1f}{peak:>13.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Utterance corpus for the ELIZA benchmarks.
+
+The generated corpus mixes four kinds of input, each tagged with a category:
+
+- keyword: short sentences built around script keywords
+- long: a few hundred words of filler with keywords scattered through it
+- delimiters: many comma and period separated clauses
+- no_keyword: filler only, which falls through to memory recall or NONE
+
+A corpus can also be loaded from a file with one utterance per line, either
+plain text or JSON objects with "text" and an optional "category".
+"""
+
+import json
+import random
+from typing import List, Tuple
+
+CATEGORIES = ("keyword", "long", "delimiters", "no_keyword")
+
+KEYWORD_TEMPLATES = [
+    "I am {feeling}",
+    "I am {feeling} about {thing}",
+    "My {family} {verb} me",
+    "My {family} is {feeling}",
+    "You are {feeling}",
+    "You {verb} me",
+    "I {belief} you {verb} me",
+    "I need {thing}",
+    "I want {thing}",
+    "I remember {thing}",
+    "Do you remember {thing}",
+    "Why can't you {verb} me",
+    "Why don't you {verb} me",
+    "I dreamt about {thing}",
+    "I dreamed about {thing}",
+    "Can you {verb} me",
+    "Can I {verb} you",
+    "Perhaps {thing} is the problem",
+    "Everybody {verb} me",
+    "Nobody {verb} me",
+    "It is always {thing}",
+    "Because {thing}",
+    "If {thing} happened",
+    "How do computers work",
+    "Are you a machine",
+    "Was I {feeling}",
+    "You're {feeling}",
+    "I'm {feeling}",
+    "Sorry about {thing}",
+    "Hello",
+    "My name is not important",
+    "You are like my {family}",
+    "Yes",
+    "No",
+]
+
+FEELINGS = ["sad", "unhappy", "depressed", "sick", "happy", "glad", "angry", "tired"]
+FAMILY = ["mother", "father", "sister", "brother", "wife", "children", "mom", "dad"]
+VERBS = ["hate", "love", "ignore", "understand", "help", "bother", "trust"]
+BELIEFS = ["feel", "think", "believe", "wish"]
+THINGS = [
+    "the house by the sea",
+    "some help",
+    "a new job",
+    "the old car",
+    "my first computer",
+    "the weather",
+    "the meeting",
+]
+FILLER = (
+    "the a an of to in on at it this that then there so very much "
+    "today tomorrow yesterday weather house garden street work money "
+    "something nothing anything time year week morning evening"
+).split()
+
+
+def keyword_sentence(rng: random.Random) -> str:
+    """A short sentence built around script keywords."""
+    return rng.choice(KEYWORD_TEMPLATES).format(
+        feeling=rng.choice(FEELINGS),
+        family=rng.choice(FAMILY),
+        verb=rng.choice(VERBS),
+        belief=rng.choice(BELIEFS),
+        thing=rng.choice(THINGS),
+    )
+
+
+def filler(rng: random.Random, count: int) -> str:
+    """Words that match no keyword."""
+    return " ".join(rng.choice(FILLER) for _ in range(count))
+
+
+def make_utterance(category: str, rng: random.Random) -> str:
+    """Generate one utterance of the given category."""
+    if category == "keyword":
+        return keyword_sentence(rng) + rng.choice([".", "?", "!", ""])
+    if category == "long":
+        parts = [filler(rng, rng.randint(20, 60)) for _ in range(rng.randint(4, 8))]
+        for _ in range(rng.randint(1, 3)):
+            parts.insert(rng.randrange(len(parts) + 1), keyword_sentence(rng))
+        return " ".join(parts)
+    if category == "delimiters":
+        clauses = [filler(rng, rng.randint(1, 4)) for _ in range(rng.randint(5, 20))]
+        clauses.insert(rng.randrange(len(clauses) + 1), keyword_sentence(rng))
+        return "".join(c + rng.choice([", ", ". "]) for c in clauses).strip()
+    if category == "no_keyword":
+        return filler(rng, rng.randint(3, 15)).capitalize() + "."
+    raise ValueError(f"unknown category: {category}")
+
+
+def generate_corpus(
+    size: int, seed: int = 0, weights: Tuple[int, ...] = (6, 1, 2, 2)
+) -> List[Tuple[str, str]]:
+    """
+    Generate a reproducible corpus.
+
+    Args:
+        size: Number of utterances
+        seed: Random seed
+        weights: Relative frequency of each entry in CATEGORIES
+
+    Returns:
+        (category, utterance) pairs
+    """
+    rng = random.Random(seed)
+    categories = rng.choices(CATEGORIES, weights=weights, k=size)
+    return [(category, make_utterance(category, rng)) for category in categories]
+
+
+def load_corpus(path: str) -> List[Tuple[str, str]]:
+    """Load (category, utterance) pairs from a text or JSONL file."""
+    corpus = []
+    with open(path, "r", encoding="utf-8") as corpus_file:
+        for line in corpus_file:
+            line = line.rstrip("\n")
+            if not line.strip():
+                continue
+            if line.lstrip().startswith("{"):
+                record = json.loads(line)
+                corpus.append((record.get("category", "file"), record["text"]))
+            else:
+                corpus.append(("file", line))
+    return corpus
+
+
+def write_corpus(path: str, corpus: List[Tuple[str, str]]) -> None:
+    """Write a corpus as JSONL so it can be reloaded with load_corpus."""
+    with open(path, "w", encoding="utf-8") as corpus_file:
+        for category, text in corpus:
+            corpus_file.write(json.dumps({"category": category, "text": text}) + "\n")
@@ -0,0 +1,168 @@
+"""
+Synthetic ELIZA scripts of any size, for the scaling benchmarks.
+
+Generated scripts look like the production ones: the bundled script plus
+many generated keywords, each with a few decomposition rules that refer to
+shared word lists, and MEMORY rules on some of them. Inputs to go with a
+script mention its keywords and list words, so turns reach the generated
+rules rather than falling through to NONE.
+
+    python benchmarks/synthetic_script.py --keywords 100000 -o big_script.json
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+from typing import Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+# pylint: disable=wrong-import-position
+import eliza
+from corpus import filler
+
+LETTERS = "BCDFGHJKLMNPQRSTVWXZ"
+
+
+def make_word(number: int, prefix: str) -> str:
+    """A made-up word, unique for each number, that is no English word."""
+    letters = []
+    while True:
+        number, digit = divmod(number, len(LETTERS))
+        letters.append(LETTERS[digit])
+        if not number:
+            break
+    return prefix + "".join(reversed(letters))
+
+
+def keyword_name(number: int) -> str:
+    return make_word(number, "KW")
+
+
+def list_word(word_list: int, number: int) -> str:
+    return make_word(word_list, "L") + "Y" + make_word(number, "")
+
+
+def rule_patterns(
+    keyword: str, count: int, word_lists: int, rng: random.Random
+) -> Dict[str, List[str]]:
+    """count decomposition rules for a keyword, the last one its catch-all."""
+    rules: Dict[str, List[str]] = {}
+    while len(rules) < count - 1:
+        word_list = f"/SYN{make_word(rng.randrange(word_lists), '')}"
+        shape = len(rules) % 3
+        if shape == 0:
+            pattern = f"{keyword} ({word_list})(.*)"
+            responses = ["WHY 1 2", "TELL ME MORE ABOUT 2"]
+        elif shape == 1:
+            pattern = f"({word_list}).*?{keyword}(.*)"
+            responses = ["DOES 1 MATTER", "WHAT ABOUT 2"]
+        else:
+            pattern = f"{keyword}(.*?){word_list}(.*)"
+            responses = ["YOU SAY 1 BEFORE", "AND 2"]
+        # Patterns repeat when there are fewer word lists than rules
+        if pattern in rules:
+            pattern = f"{pattern[:-4]} {make_word(len(rules), 'X')}(.*)"
+        rules[pattern] = responses
+    rules[f"{keyword}(.*)"] = [f"GO ON ABOUT {keyword} 1", "I SEE"]
+    return rules
+
+
+def generate_script(
+    keywords: int = 1000,
+    rules_per_keyword: int = 4,
+    word_lists: int = 100,
+    word_list_size: int = 10,
+    memory_every: int = 10,
+    seed: int = 0,
+) -> dict:
+    """
+    The bundled script with generated keywords added.
+
+    Args:
+        keywords: Generated keywords
+        rules_per_keyword: Decomposition rules of each generated keyword
+        word_lists: Word lists the generated rules pick from
+        word_list_size: Words in each word list
+        memory_every: Give every this many keywords MEMORY rules
+        seed: Random seed
+
+    Returns:
+        The script, in the JSON format of eliza_script.json
+    """
+    rng = random.Random(seed)
+    with open(eliza.SCRIPT_PATH, "r", encoding="utf-8") as script_file:
+        script = json.load(script_file)
+    for number in range(word_lists):
+        script["word_lists"][f"SYN{make_word(number, '')}"] = [
+            list_word(number, word) for word in range(word_list_size)
+        ]
+    for number in range(keywords):
+        keyword = keyword_name(number)
+        script["keywords"][keyword] = {
+            "rank": rng.randint(0, 10),
+            "responses": rule_patterns(keyword, rules_per_keyword, word_lists, rng),
+        }
+        if memory_every and number % memory_every == 0:
+            script["memory_rules"][keyword] = [
+                {
+                    "pattern": f"{keyword}(.*)",
+                    "template": f"EARLIER YOU MENTIONED {keyword} 1",
+                },
+                {"pattern": f"{keyword}(.*)", "template": "BUT 1"},
+            ]
+    return script
+
+
+def generate_inputs(
+    count: int,
+    keywords: int,
+    word_lists: int,
+    word_list_size: int,
+    seed: int = 0,
+) -> List[str]:
+    """Inputs for a generated script, most of them naming its keywords."""
+    rng = random.Random(seed)
+    inputs = []
+    for _ in range(count):
+        words = filler(rng, rng.randint(2, 12)).split()
+        if rng.random() < 0.8:
+            words.insert(
+                rng.randrange(len(words) + 1), keyword_name(rng.randrange(keywords))
+            )
+        for _ in range(rng.randint(0, 2)):
+            word = list_word(rng.randrange(word_lists), rng.randrange(word_list_size))
+            words.insert(rng.randrange(len(words) + 1), word)
+        inputs.append(" ".join(words))
+    return inputs
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--keywords", type=int, default=1000)
+    parser.add_argument("--rules-per-keyword", type=int, default=4)
+    parser.add_argument("--word-lists", type=int, default=100)
+    parser.add_argument("--word-list-size", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", help="write the script here (default stdout)")
+    args = parser.parse_args()
+
+    script = generate_script(
+        args.keywords,
+        args.rules_per_keyword,
+        args.word_lists,
+        args.word_list_size,
+        seed=args.seed,
+    )
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump(script, output)
+    else:
+        json.dump(script, sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+"""
+Sample conversations shared by the tests and benchmarks.
+
+DIALOG is the user's side of the conversation printed in Weizenbaum's 1966
+paper. ASIDES reach what it does not: a REMEMBER rule, memory recall after
+input with no keyword, and the SORRY and COMPUTER keywords.
+"""
+
+DIALOG = [
+    "Men are all alike.",
+    "They're always bugging us about something or other.",
+    "Well, my boyfriend made me come here.",
+    "He says I'm depressed much of the time.",
+    "It's true.  I am unhappy.",
+    "I need some help, that much seems certain.",
+    "Perhaps I could learn to get along with my mother.",
+    "My mother takes care of me.",
+    "My father.",
+    "You are like my father in some ways.",
+    "You are not very aggressive but I think you don't want me to notice that.",
+    "You don't argue with me.",
+    "You are afraid of me.",
+    "My father is afraid of everybody.",
+    "Bullies.",
+]
+
+ASIDES = [
+    "I remember my dog",
+    "nothing",
+    "nothing",
+    "I am sorry, computers are not like you",
+]
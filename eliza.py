@@ -5,358 +5,2822 @@ This is a simplified version inspired by Joseph Weizenbaum's 1966 ELIZA program.
 """
 
 import cmd
+import collections
+import functools
+import hashlib
+import itertools
 import json
+import math
+import os
+import pickle
 import re
-from typing import List, Tuple, Optional
+import sys
+import threading
+import time
+import weakref
+from array import array
+from typing import (
+    IO,
+    TYPE_CHECKING,
+    Any,
+    Deque,
+    Dict,
+    FrozenSet,
+    Iterable,
+    List,
+    Mapping,
+    Match,
+    MutableMapping,
+    NamedTuple,
+    Optional,
+    Pattern,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
+
+try:
+    from re import _constants as _regex_constants  # type: ignore[attr-defined]
+    from re import _parser as _regex_parser  # type: ignore[attr-defined]
+except ImportError:  # Python < 3.11
+    # pylint: disable=deprecated-module
+    import sre_constants as _regex_constants
+    import sre_parse as _regex_parser
+
+# Opcodes of parsed patterns, for required_literals and harden_pattern. re
+# defines them at import time, out of pylint's sight, so they are read once
+# here
+# pylint: disable=no-member
+_ANY = _regex_constants.ANY
+_ASSERT = _regex_constants.ASSERT
+_ASSERT_NOT = _regex_constants.ASSERT_NOT
+_AT = _regex_constants.AT
+_AT_BEGINNING_STRING = _regex_constants.AT_BEGINNING_STRING
+_BRANCH = _regex_constants.BRANCH
+_IN = _regex_constants.IN
+_LITERAL = _regex_constants.LITERAL
+_MAXREPEAT = _regex_constants.MAXREPEAT
+_MIN_REPEAT = _regex_constants.MIN_REPEAT
+_RANGE = _regex_constants.RANGE
+_SUBPATTERN = _regex_constants.SUBPATTERN
+_REPEATS = (_regex_constants.MAX_REPEAT, _MIN_REPEAT)
+# pylint: enable=no-member
+# Atomic groups and possessive repeats are new in Python 3.11
+_ATOMIC_GROUP = getattr(_regex_constants, "ATOMIC_GROUP", None)
+_POSSESSIVE_REPEAT = getattr(_regex_constants, "POSSESSIVE_REPEAT", None)
+
+DEFAULT_GREETING = "HOW DO YOU DO. PLEASE TELL ME YOUR PROBLEM"
+
+# Safe keyword substitutions applied during reflection (avoid pronoun recursion)
+SAFE_SUBSTITUTIONS = {
+    "AM": "ARE",
+}
+
+# Stripped from both ends of each input word
+PUNCTUATION = ".,!?;:"
+
+# A number standing alone in a response template, like the 2 in "WHY 2"
+TEMPLATE_NUMBER_REGEX = re.compile(r"\b[0-9]+\b")
+
+
+# How many PRE rewrites one keyword attempt may chain before giving up
+MAX_PRE_DEPTH = 16
+
+
+class ScriptError(ValueError):
+    """
+    A script that can't be compiled: redirects or gotos that loop, or any
+    validation problem when compiled with strict=True.
+    """
 
-with open("eliza_script.json", "r", encoding="utf-8") as f:
-    SCRIPT = json.load(f)
 
-# Global memory storage for recalled memories
-MEMORY = []
+# The script loaded on first use of COMPILED or the module-level functions;
+# set ELIZA_SCRIPT to use another one
+SCRIPT_PATH = os.environ.get(
+    "ELIZA_SCRIPT",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "eliza_script.json"),
+)
 
+# Compiled scripts are cached here, keyed on a hash of the script and of this
+# module; defaults to __pycache__ next to the script
+CACHE_DIR = os.environ.get("ELIZA_CACHE_DIR")
 
-def store_memory(keyword: str, normalized_input: str) -> None:
+# Set ELIZA_HARDEN=1 to have load_script harden every pattern (see
+# harden_pattern) against input that makes it backtrack
+HARDEN = os.environ.get("ELIZA_HARDEN", "") not in ("", "0")
+
+# How patterns are matched: "re" runs them as regexes, "tokens" with
+# TokenPattern where it can; set ELIZA_ENGINE to choose load_script's default
+ENGINES = ("re", "tokens")
+ENGINE = os.environ.get("ELIZA_ENGINE", "re")
+
+# Set ELIZA_COMPACT=1 to run the default session on an array-backed
+# eliza_compact.CompactScript instead of the compiled script's objects
+COMPACT = os.environ.get("ELIZA_COMPACT", "") not in ("", "0")
+
+
+# Word lists with at least this many words are matched by looking words up in
+# their WordSet (see WordListRegex) instead of trying each word as a regex
+# alternative
+WORD_SET_MIN_SIZE = 64
+
+# Brackets the name of a word list that expand_word_lists left for
+# WordListRegex to fill in
+_WORD_LIST_MARK = "\0"
+
+
+def expand_word_lists(
+    pattern: str,
+    word_lists: Optional[Dict[str, List[str]]] = None,
+    word_sets: Optional[Dict[str, FrozenSet[str]]] = None,
+) -> str:
     """
-    Check if keyword has memory rules and store matching inputs for later recall.
+    Expand word list references like (/FAMILY) in regex patterns.
 
     Args:
-        keyword: The keyword that matched
-        normalized_input: The normalized user input
-    """
-    memory_rules = SCRIPT.get("memory_rules", {})
-    if keyword not in memory_rules:
-        return
-
-    # Apply keyword substitution if it exists
-    keyword_data = SCRIPT["keywords"].get(keyword, {})
-    if "substitution" in keyword_data and keyword_data["substitution"]:
-        substitute = keyword_data["substitution"]
-        transformed_input = re.sub(
-            r"\b" + re.escape(keyword) + r"\b",
-            substitute,
-            normalized_input,
-            flags=re.IGNORECASE,
+        pattern: The pattern
+        word_lists: The word lists, by default the default session's
+        word_sets: The lists' WordSets; lists that are searchable (see
+            WordSet) are then left as placeholders for WordListRegex
+    """
+    if word_lists is None:
+        word_lists = get_default_session().script.word_lists
+    result = pattern
+
+    for wordlist_name, words in word_lists.items():
+        ref = "/" + wordlist_name
+        if ref not in result:
+            continue
+        word_set = word_sets.get(wordlist_name) if word_sets else None
+        if isinstance(word_set, WordSet) and word_set.searchable:
+            alternatives = _WORD_LIST_MARK + wordlist_name + _WORD_LIST_MARK
+        else:
+            alternatives = "|".join(re.escape(w) for w in words)
+        # Look for captured (/WORDLIST) or uncaptured /WORDLIST
+        captured_ref = "(" + ref + ")"
+        if captured_ref in result:
+            # Captured word list - create capturing group with alternation
+            result = result.replace(captured_ref, "((?:" + alternatives + "))")
+        else:
+            # Uncaptured word list - create non-capturing group
+            result = result.replace(ref, "(?:" + alternatives + ")")
+
+    return result
+
+
+class WordSet(FrozenSet[str]):
+    """
+    The uppercased words of a word list, with what it takes to match them
+    the way their regex alternation would.
+
+    Attributes:
+        searchable: Whether WordListRegex may match the list: it is long
+            enough to be worth it (WORD_SET_MIN_SIZE) and all printable
+            ASCII, so that IGNORECASE is plain case folding
+        lengths: The lengths of the words, shortest first
+        gaps: Matches runs of characters that no word holds, which split a
+            text into the only pieces a word can occur in
+        ranks: Order in the list of each word that is a prefix of another
+            list word or has one as a prefix. An alternation tries its
+            words in order, and only such words can match at the same
+            place, so only their order can change a match
+    """
+
+    searchable: bool
+    lengths: Tuple[int, ...]
+    gaps: Pattern[str]
+    ranks: Dict[str, int]
+
+    @classmethod
+    def from_words(cls, words: Iterable[str]) -> "WordSet":
+        """A word list's WordSet, from its words in list order."""
+        upper = [sys.intern(word.upper()) for word in words]
+        word_set = cls(upper)
+        word_set.searchable = len(word_set) >= WORD_SET_MIN_SIZE and all(
+            word.isascii() and word.isprintable() for word in word_set
+        )
+        word_set.lengths = tuple(sorted({len(word) for word in word_set}))
+        alphabet = "".join(sorted(set("".join(word_set))))
+        word_set.gaps = re.compile(
+            f"[^{re.escape(alphabet)}]+" if alphabet else "(?s:.)+"
         )
-    else:
-        transformed_input = normalized_input
-
-    # Apply pronoun reflection
-    transformed_input = reflect_pronouns(transformed_input)
-
-    # Try to match against memory patterns
-    for memory_rule in memory_rules[keyword]:
-        pattern = memory_rule["pattern"]
-
-        # Expand word list references
-        expanded_pattern = expand_word_lists(pattern)
-        match = re.search(expanded_pattern, transformed_input, re.IGNORECASE)
-        if match:
-            # Store all templates for this match as a single memory entry
-            templates = []
-            for rule in memory_rules[keyword]:
-                if re.search(
-                    expand_word_lists(rule["pattern"]), transformed_input, re.IGNORECASE
-                ):
-                    memory_text = generate_response(rule["template"], match.groups())
-                    templates.append(memory_text)
 
-            # Store as a list of templates for this memory
-            MEMORY.append(templates)
-            break  # Only store one memory entry per input
+        # In sorted order, the words starting with a word come right after
+        # it; stack holds the words that the current word starts with
+        ordered = sorted(word_set)
+        related = set()
+        stack: List[str] = []
+        for position, word in enumerate(ordered):
+            while stack and not word.startswith(stack[-1]):
+                stack.pop()
+            is_prefix = position + 1 < len(ordered) and ordered[
+                position + 1
+            ].startswith(word)
+            if stack or is_prefix:
+                related.add(word)
+            if is_prefix:
+                stack.append(word)
+        word_set.ranks = {
+            word: rank
+            for rank, word in enumerate(
+                dict.fromkeys(word for word in upper if word in related)
+            )
+        }
+        return word_set
+
+    def in_order(self, words: Iterable[str]) -> Tuple[str, ...]:
+        """Words of the list in an order its alternation would try them."""
+        ranks = self.ranks
+        return tuple(sorted(words, key=lambda word: ranks.get(word, 0)))
+
+
+@functools.lru_cache(maxsize=None)
+def _ascii_fold(char: str) -> str:
+    """The ASCII letter that IGNORECASE matches a character to, if any."""
+    for letter in map(chr, range(ord("A"), ord("Z") + 1)):
+        if re.fullmatch(letter, char, re.IGNORECASE):
+            return letter
+    return char
+
+
+@functools.lru_cache(maxsize=1024)
+def _substrings(size: int, lengths: Tuple[int, ...]) -> Tuple[slice, ...]:
+    """Slices for every substring of a text of that size with those lengths."""
+    return tuple(
+        slice(start, start + length)
+        for length in lengths
+        for start in range(size - length + 1)
+    )
+
+
+@functools.lru_cache(maxsize=1024)
+def _words_in(words: WordSet, text: str) -> FrozenSet[str]:
+    """
+    The words of a searchable WordSet that occur anywhere in text, ignoring
+    case. They don't depend on the list's order, which equal sets may not
+    share; see WordSet.in_order.
+    """
+    if not text.isascii():
+        text = "".join(char if char.isascii() else _ascii_fold(char) for char in text)
+    found: Set[str] = set()
+    lengths = words.lengths
+    contains = words.__contains__
+    for piece in words.gaps.split(text.upper()):
+        if len(piece) >= lengths[0]:
+            found.update(
+                filter(
+                    contains, map(piece.__getitem__, _substrings(len(piece), lengths))
+                )
+            )
+    return frozenset(found)
+
+
+@functools.lru_cache(maxsize=1024)
+def _fill_word_lists(
+    parts: Tuple[str, ...], found: Tuple[Tuple[str, ...], ...]
+) -> Pattern[str]:
+    """Compile a WordListRegex's source with the given words in its lists."""
+    pieces = list(parts)
+    for position, words in zip(range(1, len(parts), 2), found):
+        # A list with none of its words in the input can't match
+        pieces[position] = "|".join(map(re.escape, words)) if words else "(?!)"
+    return re.compile("".join(pieces), re.IGNORECASE)
+
+
+@functools.lru_cache(maxsize=1024)
+def _look_up_word_lists(
+    parts: Tuple[str, ...], counts: Tuple[int, ...]
+) -> Pattern[str]:
+    """
+    Compile a WordListRegex's source to match against the words found,
+    followed by the input (see WordListRegex.search).
+
+    The subject starts with each word found and \\x01, then \\x02. Groups
+    1 to sum(counts) capture those words, each list's placeholder is an
+    alternation of backreferences to its words, and the source itself is
+    the next group, reached by skipping input as search would.
+    """
+    pieces = list(parts)
+    group = 0
+    for position, count in zip(range(1, len(parts), 2), counts):
+        references = [f"(?:\\{group + number})" for number in range(1, count + 1)]
+        group += count
+        pieces[position] = "|".join(references) if references else "(?!)"
+    return re.compile(
+        r"\A" + r"([^\x01]*)\x01" * group + r"\x02(?s:.*?)(" + "".join(pieces) + ")",
+        re.IGNORECASE,
+    )
 
 
-def recall_memory() -> Optional[str]:
+# What _look_up_word_lists can't move behind the words found: anchors and
+# lookbehinds that would see them, and references to group numbers
+_POSITIONAL_REGEX = re.compile(r"(?<!\[)\^|\\[AB0-9]|\(\?(?:<[=!]|\()")
+
+# Most words found that _look_up_word_lists refers back to; \100 would be octal
+_MAX_LOOKUPS = 99
+
+
+class WordListMatch:
+    """
+    A match of a WordListRegex against the words found and the input,
+    numbered like the groups of the pattern itself.
+    """
+
+    __slots__ = ("_match", "_offset")
+
+    def __init__(self, match: Match[str], offset: int) -> None:
+        self._match = match
+        self._offset = offset
+
+    def groups(self) -> Tuple[Any, ...]:
+        return self._match.groups()[self._offset :]
+
+    def group(self, number: int = 0) -> Any:
+        if number < 0:
+            raise IndexError("no such group")
+        return self._match.group(self._offset + number)
+
+
+class WordListRegex:
+    """
+    A regex whose word list alternations hold only the words in the input.
+
+    expand_word_lists leaves searchable lists (see WordSet) as placeholders.
+    Each search looks the input's substrings up in the lists' WordSets to
+    find the words that occur in it, in the order the full alternation
+    would try them. Words that don't occur can't match, so the result is
+    what the fully expanded regex gives, while the cost of a search grows
+    with the input rather than with the lists.
+
+    Compiling the pattern for each set of words found would cost more than
+    the turn, so ASCII input is matched with one regex per number of words
+    found (see _look_up_word_lists): it runs on the words followed by the
+    input, and the placeholders refer back to the words. Other input, and
+    patterns that use anchors or group references, compile the words in.
+
+    Attributes:
+        groups: Number of capture groups, as for a regex
+    """
+
+    __slots__ = ("parts", "word_sets", "groups", "empty", "look_up")
+
+    def __init__(self, source: str, word_sets: Dict[str, FrozenSet[str]]) -> None:
+        # Regex text at even positions, list names at odd ones
+        self.parts = tuple(source.split(_WORD_LIST_MARK))
+        self.word_sets: Tuple[WordSet, ...] = ()
+        for name in self.parts[1::2]:
+            words = word_sets[name]
+            # expand_word_lists only leaves WordSets' lists as placeholders
+            assert isinstance(words, WordSet)
+            self.word_sets += (words,)
+        # Compiling with no words finds errors in the pattern early
+        self.empty = _fill_word_lists(self.parts, ((),) * len(self.word_sets))
+        self.groups = self.empty.groups
+        self.look_up = not _POSITIONAL_REGEX.search(source)
+        if self.look_up:
+            try:
+                _look_up_word_lists(self.parts, (1,) * len(self.word_sets))
+            except re.error:
+                # Such as global flags, which must start the pattern
+                self.look_up = False
+
+    def search(self, text: str) -> Union[Match[str], WordListMatch, None]:
+        found = tuple(
+            words.in_order(_words_in(words, text)) for words in self.word_sets
+        )
+        if not any(found):
+            return self.empty.search(text)
+        # IGNORECASE backreferences and literals agree on ASCII text only
+        if self.look_up and text.isascii():
+            counts = tuple(map(len, found))
+            lookups = sum(counts)
+            if lookups <= _MAX_LOOKUPS:
+                words = "".join(word + "\x01" for words in found for word in words)
+                match = _look_up_word_lists(self.parts, counts).match(
+                    words + "\x02" + text
+                )
+                return match and WordListMatch(match, lookups + 1)
+        return _fill_word_lists(self.parts, found).search(text)
+
+
+class LazyPattern:
+    """
+    A script pattern whose regex is compiled the first time it is used.
+
+    ``source`` is the pattern with word lists expanded. Reading ``regex``
+    compiles it and stores it in the slot, so later reads are plain attribute
+    lookups. Pickling keeps only the source, which lets a cached script load
+    without compiling patterns that a conversation never reaches.
+
+    ``engine`` is "re" unless set; with "tokens", ``regex`` is a
+    TokenPattern where the pattern allows (see compile_source). A pattern
+    that refers to word lists may keep the references in ``source`` and
+    look the words up in ``word_sets``, shared by all the script's patterns.
+    """
+
+    __slots__ = ("pattern", "source", "regex", "engine", "word_sets")
+
+    pattern: str
+    source: str
+    regex: Any
+    engine: str
+    word_sets: Optional[Dict[str, FrozenSet[str]]]
+
+    def __getattr__(self, name: str) -> Any:
+        # Only called while the slot is still empty
+        if name == "engine":
+            return "re"
+        if name == "word_sets":
+            return None
+        if name != "regex":
+            raise AttributeError(name)
+        self.regex = compile_source(self.source, self.engine, self.word_sets)
+        return self.regex
+
+    def __getstate__(self) -> Dict[str, Any]:
+        return {
+            slot: getattr(self, slot)
+            for cls in type(self).__mro__
+            for slot in getattr(cls, "__slots__", ())
+            if slot != "regex"
+        }
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        for slot, value in state.items():
+            setattr(self, slot, value)
+
+
+def required_literals(source: str) -> Tuple[str, ...]:
+    """
+    Uppercased runs of literal text that every match of a pattern contains.
+
+    Only literals at the top level of the pattern count; anything inside a
+    group, alternation or repeat ends a run. Non-ASCII literals are left out,
+    since IGNORECASE can match them to other characters.
+    """
+    runs = []
+    run: List[str] = []
+    for op, value in _regex_parser.parse(source, re.IGNORECASE):
+        if op is _LITERAL and value < 128:
+            run.append(chr(value))
+        elif run:
+            runs.append("".join(run).upper())
+            run = []
+    if run:
+        runs.append("".join(run).upper())
+    return tuple(runs)
+
+
+# Worst-case re.search steps a hardened pattern may take; patterns that stay
+# superlinear after rewriting get an input length cap within this budget
+HARDEN_STEP_BUDGET = 10**7
+# Most strings a run of fixed pattern items may match for harden_pattern to
+# analyze it
+_MAX_RUN_STRINGS = 256
+
+
+def backtracking_degree(source: str) -> float:
+    """
+    Estimate the worst-case time of re.search with a pattern.
+
+    The result is the power of the input length: 1 is linear, 2 quadratic,
+    and math.inf exponential (nested unbounded repeats). Each start
+    position search tries, and each unbounded repeat that something after
+    it can make backtrack, multiplies the work by the input length. Items
+    after which nothing can fail, such as a trailing ``(.*)``, run once.
+    Atomic groups, possessive repeats and lookarounds are never re-entered
+    from outside.
+    """
+    items = list(_regex_parser.parse(source, re.IGNORECASE))
+    anchored = bool(items) and items[0] == (_AT, _AT_BEGINNING_STRING)
+    degree, _ = _sequence_degree(items, 0 if anchored else 1, True)
+    return degree
+
+
+def _sequence_degree(items: list, before: float, tail: bool) -> Tuple[float, float]:
+    """
+    (Worst degree within items, repeats that can backtrack after them).
+
+    ``before`` counts the start positions and backtracking repeats that
+    can retry the first item; ``tail`` says nothing after items can fail.
+    """
+    # settled[i]: nothing from item i on can fail, so item i runs once
+    settled = [tail] * (len(items) + 1)
+    for position in range(len(items) - 1, -1, -1):
+        settled[position] = settled[position + 1] and not _can_fail(items[position])
+
+    worst = before
+    for position, (op, value) in enumerate(items):
+        rest_settled = settled[position + 1]
+        retries = 0 if settled[position] else before
+        if op is _SUBPATTERN:
+            degree, before = _sequence_degree(list(value[-1]), retries, rest_settled)
+            if settled[position]:
+                before = 0
+        elif op is _BRANCH:
+            results = [
+                _sequence_degree(list(branch), retries, rest_settled)
+                for branch in value[1]
+            ]
+            degree = max(result[0] for result in results)
+            before = max(result[1] for result in results)
+        elif op in (_ATOMIC_GROUP, _ASSERT, _ASSERT_NOT):
+            body = value if op is _ATOMIC_GROUP else value[1]
+            degree, _ = _sequence_degree(list(body), retries, False)
+        elif op in _REPEATS or op is _POSSESSIVE_REPEAT:
+            _, high, body = value
+            unbounded = high == _MAXREPEAT
+            if unbounded and _has_repeat(body):
+                return math.inf, math.inf
+            scan = 1 if unbounded else 0
+            degree, _ = _sequence_degree(list(body), retries + scan, False)
+            if op is not _POSSESSIVE_REPEAT and not rest_settled:
+                before += scan
+        else:
+            degree = retries
+        worst = max(worst, degree)
+    return worst, before
+
+
+def _can_fail(item: tuple) -> bool:
+    op, value = item
+    if op in _REPEATS or op is _POSSESSIVE_REPEAT:
+        return value[0] > 0 and any(map(_can_fail, value[2]))
+    if op is _SUBPATTERN:
+        return any(map(_can_fail, value[-1]))
+    if op is _ATOMIC_GROUP:
+        return any(map(_can_fail, value))
+    if op is _BRANCH:
+        return all(any(map(_can_fail, branch)) for branch in value[1])
+    return True
+
+
+def _has_repeat(items: Iterable[tuple]) -> bool:
+    """Whether items contain a repeat that can match more than once."""
+    for op, value in items:
+        if op in _REPEATS or op is _POSSESSIVE_REPEAT:
+            if value[1] > 1 or _has_repeat(value[2]):
+                return True
+        elif op is _SUBPATTERN:
+            if _has_repeat(value[-1]):
+                return True
+        elif op is _ATOMIC_GROUP:
+            if _has_repeat(value):
+                return True
+        elif op in (_ASSERT, _ASSERT_NOT):
+            if _has_repeat(value[1]):
+                return True
+        elif op is _BRANCH:
+            if any(_has_repeat(branch) for branch in value[1]):
+                return True
+    return False
+
+
+def harden_pattern(source: str, max_input: Optional[int] = None) -> str:
     """
-    Recall a stored memory using rotation like keyword responses.
+    Rewrite a pattern so re.search can't backtrack superlinearly.
+
+    The pattern is split at its top-level wildcards (``.*``, ``.*?``,
+    ``(.*)``, ``(.*?)``) into runs of fixed text, literals and alternations.
+    When a lazy wildcard is followed by a run that no other match of the run
+    can end inside, the first place the run matches is the only one worth
+    trying, since everything after it starts with a wildcard and matches
+    wherever a later start would. That choice is made final with an atomic
+    group, and the implicit search for the first run becomes ``\\A(?>.*?RUN)``,
+    so a failed match is never retried from later start positions. The
+    rewritten pattern matches the same inputs with the same groups, for
+    input without line breaks (which the engine never produces); only
+    match.start() and group(0) differ.
+
+    Patterns that are still superlinear (or any pattern, before Python
+    3.11) are instead capped: they don't match input longer than
+    max_input characters, by default the longest input that keeps within
+    HARDEN_STEP_BUDGET steps.
 
     Returns:
-        A memory response, or None if no memories are stored
+        The hardened pattern, or source itself if it is already linear
+        (see backtracking_degree)
     """
-    if not MEMORY:
+    if backtracking_degree(source) <= 1:
+        return source
+    hardened = _rewrite_atomic(source) if _ATOMIC_GROUP is not None else None
+    degree = backtracking_degree(hardened or source)
+    if degree <= 1:
+        return hardened or source
+    if max_input is None:
+        if degree == math.inf:
+            max_input = int(math.log2(HARDEN_STEP_BUDGET))
+        else:
+            max_input = int(HARDEN_STEP_BUDGET ** (1 / degree))
+    return rf"\A(?=(?s:.){{0,{max_input}}}\Z)(?s:.*?)(?:{source})"
+
+
+def _rewrite_atomic(source: str) -> Optional[str]:
+    """harden_pattern's atomic group rewrite, or None if it doesn't apply."""
+    tokens = _top_level_tokens(source)
+    if tokens is None:
+        return None
+    pieces = [(_classify_token(token), token) for token in tokens]
+
+    # runs: [(wildcard before it, its text, the strings it matches)]
+    runs: List[Tuple[Optional[Tuple[str, str]], str, List[str]]] = []
+    wildcard: Optional[Tuple[str, str]] = None
+    for (kind, strings), token in pieces:
+        if kind == "fixed":
+            if runs and wildcard is None:
+                before, text, run_strings = runs[-1]
+                joined = [a + b for a in run_strings for b in strings]
+                if len(joined) > _MAX_RUN_STRINGS:
+                    return None
+                runs[-1] = (before, text + token, joined)
+            else:
+                runs.append((wildcard, token, strings))
+                wildcard = None
+        elif kind in ("lazy", "greedy"):
+            if wildcard is not None or not runs:
+                return None
+            wildcard = (kind, token)
+        else:
+            return None
+    if not runs:
         return None
 
-    # Get the first memory entry
-    memory_templates = MEMORY[0]
+    parts = []
+    changed = False
+    for before, text, strings in runs:
+        safe = all(other not in string[:-1] for string in strings for other in strings)
+        if before is None:
+            if safe:
+                parts.append(f"\\A(?>(?s:.*?){text})")
+                changed = True
+            else:
+                parts.append(text)
+        elif before[0] == "lazy" and safe:
+            parts.append(f"(?>{before[1]}{text})")
+            changed = True
+        else:
+            parts.append(before[1] + text)
+    if wildcard is not None:
+        parts.append(wildcard[1])
+    return "".join(parts) if changed else None
 
-    # Use the last template and remove it
-    response = memory_templates.pop()
 
-    # If no templates left, remove this memory entry
-    if not memory_templates:
-        MEMORY.pop(0)
+def _top_level_tokens(source: str) -> Optional[List[str]]:
+    """
+    Split a pattern into top-level atoms with their quantifiers.
 
-    return response
+    Returns None for syntax harden_pattern doesn't rewrite: anchors,
+    top-level alternation, and escapes other than single characters.
+    """
+    tokens: List[str] = []
+    position = 0
+    length = len(source)
+    while position < length:
+        start = position
+        char = source[position]
+        if char in "|^$)":
+            return None
+        if char == "(":
+            depth = 0
+            while position < length:
+                char = source[position]
+                if char == "\\":
+                    position += 1
+                elif char == "[":
+                    position = _class_end(source, position)
+                    continue
+                elif char == "(":
+                    depth += 1
+                elif char == ")":
+                    depth -= 1
+                    if depth == 0:
+                        break
+                position += 1
+            if depth:
+                return None
+            position += 1
+        elif char == "[":
+            position = _class_end(source, position)
+        elif char == "\\":
+            if position + 1 >= length or source[position + 1].isalnum():
+                return None
+            position += 2
+        else:
+            position += 1
+        # The quantifier, lazy or possessive suffix included
+        match = _QUANTIFIER_REGEX.match(source, position)
+        assert match is not None  # Every part of it is optional
+        if match.end() > position and source[start] not in ".(":
+            return None
+        position = match.end()
+        tokens.append(source[start:position])
+    return tokens
+
+
+_QUANTIFIER_REGEX = re.compile(r"(?:[*+?]|\{\d*,?\d*\})?[?+]?")
+
+
+def _class_end(source: str, position: int) -> int:
+    """The position just after the character class starting at position."""
+    position += 1
+    if position < len(source) and source[position] == "^":
+        position += 1
+    if position < len(source) and source[position] == "]":
+        position += 1
+    while position < len(source) and source[position] != "]":
+        if source[position] == "\\":
+            position += 1
+        position += 1
+    return position + 1
+
+
+@functools.lru_cache(maxsize=4096)
+def _classify_token(token: str) -> Tuple[str, List[str]]:
+    """
+    ("lazy" or "greedy", []) for a wildcard, ("fixed", strings) for fixed
+    text, or ("other", []).
 
+    Cached, since patterns repeat the same few wildcards; the result must
+    not be modified.
+    """
+    try:
+        items = list(_regex_parser.parse(token, re.IGNORECASE))
+    except re.error:
+        return "other", []
+    if len(items) == 1 and items[0][0] is _SUBPATTERN:
+        _, add_flags, del_flags, body = items[0][1]
+        if add_flags or del_flags:
+            return "other", []
+        body = list(body)
+    else:
+        body = items
+    if len(body) == 1 and body[0][0] in _REPEATS:
+        low, high, repeated = body[0][1]
+        if low == 0 and high == _MAXREPEAT and list(repeated) == [(_ANY, None)]:
+            return ("lazy" if body[0][0] is _MIN_REPEAT else "greedy"), []
+    strings = _fixed_strings(items)
+    if strings is None:
+        return "other", []
+    return "fixed", strings
+
+
+def _fixed_strings(items: Iterable[tuple]) -> Optional[List[str]]:
+    """
+    The uppercased ASCII strings a sequence of fixed-width items can match,
+    or None if it has repeats, other syntax or too many strings.
+    """
+    strings = [""]
+    for op, value in items:
+        if op is _LITERAL:
+            options = [chr(value).upper()] if value < 128 else None
+        elif op is _IN:
+            options = []
+            for set_op, set_value in value:
+                if set_op is _LITERAL and set_value < 128:
+                    options.append(chr(set_value).upper())
+                elif set_op is _RANGE and set_value[1] < 128:
+                    low, high = set_value
+                    options.extend(chr(code).upper() for code in range(low, high + 1))
+                else:
+                    options = None
+                    break
+            if options is not None:
+                options = sorted(set(options))
+        elif op is _SUBPATTERN:
+            _, add_flags, del_flags, body = value
+            options = None if add_flags or del_flags else _fixed_strings(body)
+        elif op is _BRANCH:
+            options = []
+            for branch in value[1]:
+                branch_strings = _fixed_strings(branch)
+                if branch_strings is None:
+                    options = None
+                    break
+                options.extend(branch_strings)
+        else:
+            options = None
+        if options is None:
+            return None
+        strings = [string + option for string in strings for option in options]
+        if len(strings) > _MAX_RUN_STRINGS:
+            return None
+    return strings
 
-def eliza_response(
-    user_input: str, _history: Optional[List[Tuple[str, str]]] = None
-) -> str:
+
+class TokenMatch:
+    """The groups of a TokenPattern match, like those of a re.Match."""
+
+    __slots__ = ("_groups",)
+
+    def __init__(self, groups: Tuple[str, ...]) -> None:
+        self._groups = groups
+
+    def groups(self) -> Tuple[str, ...]:
+        return self._groups
+
+    def group(self, number: int) -> str:
+        if not 1 <= number <= len(self._groups):
+            raise IndexError("no such group")
+        return self._groups[number - 1]
+
+
+# A wildcard: ("lazy" or "greedy", its group number or 0 if uncaptured)
+_Wildcard = Tuple[str, int]
+# The search's implicit leading wildcard
+_SEARCH: _Wildcard = ("lazy", 0)
+
+_ALTERNATION_REGEX = re.compile(r"(\()?\(\?:((?:[^()\\]|\\.)*)\)(\))?")
+_UNESCAPE_REGEX = re.compile(r"\\(.)")
+
+
+class TokenPattern:
     """
-    Generate an ELIZA-style response to user input.
+    A decomposition pattern matched word by word instead of as a regex.
+
+    This is ELIZA's own reading of a pattern: words, alternations of words
+    and word lists, and wildcards standing for any number of whole words,
+    in place of the regex's characters. The pattern is a series of
+    segments, each a run of fixed words after a wildcard. search() places
+    them from left to right, each after a lazy wildcard at the first place
+    it fits and each after a greedy one at the latest place that leaves
+    room for the rest, found in one pass from the right. That takes time
+    linear in the number of words, without backtracking, and makes the
+    choices re.search makes on the regex.
+
+    It gives the regex's groups, as whole words joined by single spaces,
+    wherever the regex matches on word boundaries. Where the regex matches
+    inside a word (``YOU(.*?)I`` matches "YOU THINK", the I of THINK) the
+    token pattern doesn't.
+
+    Word list references (``/FAMILY``, or ``(/FAMILY)`` to capture) can be
+    read without expanding them: the word is looked up in the list's
+    frozenset, so a turn costs the same however long the list is.
+
+    Attributes:
+        source: The regex the pattern was read from
+        segments: (wildcard before it, word sets, group of each word) for
+            each run of fixed words, the first preceded by the search's
+            implicit wildcard unless the pattern starts with one
+        tail: The wildcard after the last segment, or None
+        groups: Number of capture groups, the same as the regex's
+        word_lists: Names of the word lists it refers to unexpanded
+    """
+
+    __slots__ = ("source", "segments", "tail", "groups", "word_lists")
+
+    def __init__(
+        self,
+        source: str,
+        segments: List[Tuple[_Wildcard, Tuple[FrozenSet[str], ...], Tuple[int, ...]]],
+        tail: Optional[_Wildcard],
+        groups: int,
+        word_lists: Tuple[str, ...] = (),
+    ) -> None:
+        self.source = source
+        self.segments = segments
+        self.tail = tail
+        self.groups = groups
+        self.word_lists = word_lists
+
+    @classmethod
+    def parse(
+        cls, source: str, word_sets: Optional[Dict[str, FrozenSet[str]]] = None
+    ) -> Optional["TokenPattern"]:
+        """
+        Read a pattern as written by to_json.py: literal words, wildcards
+        (``.*``, ``.*?``, ``(.*)``, ``(.*?)``) and alternations of single
+        words (``(?:A|B)``, ``((?:A|B))``), each standing as whole words.
+
+        Args:
+            source: The pattern
+            word_sets: Uppercased words of each word list, for reading
+                references to them; without it, lists must be expanded
+
+        Returns:
+            The token pattern, or None if source uses anything else
+        """
+        tokens = _top_level_tokens(source)
+        if tokens is None:
+            return None
+        segments = []
+        wildcard: _Wildcard = _SEARCH
+        words: List[FrozenSet[str]] = []
+        word_groups: List[int] = []
+        word: List[str] = []
+        word_lists: List[str] = []
+        groups = 0
+        # Whether the last item was an alternation, which must end a word
+        alternation = False
+
+        def end_word() -> bool:
+            if word:
+                text = "".join(word)
+                if text.startswith("/") and word_sets is not None:
+                    if text[1:] not in word_sets:
+                        return False
+                    words.append(word_sets[text[1:]])
+                    word_lists.append(text[1:])
+                else:
+                    words.append(frozenset([text.upper()]))
+                word_groups.append(0)
+                word.clear()
+            return True
+
+        for token in tokens:
+            if (
+                word_sets is not None
+                and token.startswith("(/")
+                and token.endswith(")")
+                and token[2:-1] in word_sets
+            ):
+                if word:
+                    return None
+                groups += 1
+                words.append(word_sets[token[2:-1]])
+                word_lists.append(token[2:-1])
+                word_groups.append(groups)
+                alternation = True
+                continue
+
+            # Every wildcard has a star; parsing each letter as a regex to
+            # find out would dominate the time taken
+            kind = _classify_token(token)[0] if "*" in token else "other"
+            if kind in ("lazy", "greedy"):
+                if not end_word():
+                    return None
+                group = 0
+                if token.startswith("("):
+                    groups += 1
+                    group = groups
+                if words:
+                    segments.append((wildcard, tuple(words), tuple(word_groups)))
+                    words, word_groups = [], []
+                elif segments or wildcard is not _SEARCH:
+                    # Two wildcards in a row
+                    return None
+                wildcard = (kind, group)
+                alternation = False
+                continue
+
+            match = _ALTERNATION_REGEX.fullmatch(token)
+            if match:
+                if word or (match.group(1) is None) != (match.group(3) is None):
+                    return None
+                options = [
+                    _UNESCAPE_REGEX.sub(r"\1", option)
+                    for option in match.group(2).split("|")
+                ]
+                if "\\|" in match.group(2) or any(
+                    not option or " " in option for option in options
+                ):
+                    return None
+                group = 0
+                if match.group(1) is not None:
+                    groups += 1
+                    group = groups
+                words.append(frozenset(option.upper() for option in options))
+                word_groups.append(group)
+                alternation = True
+                continue
+
+            char = token[1:] if token.startswith("\\") else token
+            if len(char) != 1 or (token == char and char in "*+?{}[]().\\"):
+                return None
+            if char == " ":
+                if not end_word():
+                    return None
+                alternation = False
+            elif alternation:
+                return None
+            else:
+                word.append(char)
+
+        if not end_word():
+            return None
+        if words:
+            segments.append((wildcard, tuple(words), tuple(word_groups)))
+            tail = None
+        else:
+            tail = wildcard
+        return cls(source, segments, tail, groups, tuple(word_lists))
+
+    def literals(self) -> Tuple[str, ...]:
+        """The words every match contains, like required_literals."""
+        return tuple(
+            word
+            for _, run, _ in self.segments
+            for options in run
+            if len(options) == 1
+            for word in options
+        )
+
+    def search(self, text: str) -> Optional[TokenMatch]:
+        """Match the pattern against the words of text, like re.search."""
+        words = text.split()
+        folded = words if text.isupper() else text.upper().split()
+        segments = self.segments
+        captures = [""] * self.groups
+        latest: Optional[List[int]] = None
+        position = 0
+        for index, ((kind, group), run, run_groups) in enumerate(segments):
+            if kind == "greedy":
+                if latest is None:
+                    # The latest start of each segment from here on that
+                    # leaves room for the ones after it
+                    latest = [0] * len(segments)
+                    limit = len(folded)
+                    for later in range(len(segments) - 1, index - 1, -1):
+                        limit = _find_last_run(segments[later][1], folded, limit)
+                        if limit < position:
+                            return None
+                        latest[later] = limit
+                start = latest[index]
+            else:
+                # Lazy: the first place the segment fits leaves the most
+                # room for the rest
+                start = _find_run(run, folded, position)
+                if start < 0:
+                    return None
+            if group:
+                captures[group - 1] = " ".join(words[position:start])
+            for offset, run_group in enumerate(run_groups):
+                if run_group:
+                    captures[run_group - 1] = words[start + offset]
+            position = start + len(run)
+        tail = self.tail
+        if tail is not None and tail[1] and tail[0] == "greedy":
+            captures[tail[1] - 1] = " ".join(words[position:])
+        return TokenMatch(tuple(captures))
+
+
+def _run_matches(run: Tuple[FrozenSet[str], ...], words: List[str], start: int) -> bool:
+    for offset, options in enumerate(run):
+        if words[start + offset] not in options:
+            return False
+    return True
+
+
+def _find_run(run: Tuple[FrozenSet[str], ...], words: List[str], start: int) -> int:
+    """The first place from start where run matches, or -1."""
+    last = len(words) - len(run)
+    if last < start:
+        return -1
+    first = run[0]
+    if len(first) == 1:
+        # Let list.index find the first word
+        (word,) = first
+        try:
+            while True:
+                start = words.index(word, start, last + 1)
+                if _run_matches(run, words, start):
+                    return start
+                start += 1
+        except ValueError:
+            return -1
+    while start <= last:
+        if words[start] in first and _run_matches(run, words, start):
+            return start
+        start += 1
+    return -1
+
+
+def _find_last_run(run: Tuple[FrozenSet[str], ...], words: List[str], end: int) -> int:
+    """The last place where run matches and ends by end, or -1."""
+    start = end - len(run)
+    first = run[0]
+    while start >= 0:
+        if words[start] in first and _run_matches(run, words, start):
+            return start
+        start -= 1
+    return -1
+
+
+def compile_source(
+    source: str,
+    engine: str = "re",
+    word_sets: Optional[Dict[str, FrozenSet[str]]] = None,
+) -> Any:
+    """
+    Compile a pattern for an engine (see ENGINES).
 
     Args:
-        user_input: The user's input text
-        history: Optional list of (user_input, eliza_response) tuples representing
-                conversation history. Used for context-aware responses.
+        source: The pattern, with word lists expanded unless word_sets
+            is given
+        engine: "re" or "tokens"
+        word_sets: The script's word lists, for a source that refers to
+            them: placeholders left by expand_word_lists, or under the
+            "tokens" engine, references as written
 
     Returns:
-        ELIZA's response as an uppercase string
+        A WordListRegex for a source with placeholders; a TokenPattern for
+        the "tokens" engine if the pattern can be read as one; otherwise
+        the regex. Each has search() and groups
     """
-    # Normalize: trim, uppercase, split
-    words = user_input.strip().upper().split()
-
-    # Apply delimiter truncation (before stripping punctuation, so we can detect delimiters)
-    words = truncate_on_delimiters(words)
+    if word_sets is not None and _WORD_LIST_MARK in source:
+        return WordListRegex(source, word_sets)
+    if engine == "tokens":
+        pattern = TokenPattern.parse(source, word_sets)
+        if pattern is not None:
+            return pattern
+    elif engine != "re":
+        raise ValueError(f"unknown engine {engine!r}, expected one of {ENGINES}")
+    return re.compile(source, re.IGNORECASE)
+
+
+class DecompositionRule(LazyPattern):
+    """A decomposition pattern compiled to a regex, with its reassembly rules."""
+
+    __slots__ = ("rule_id", "responses", "literals")
+
+    def __init__(
+        self,
+        rule_id: int,
+        pattern: str,
+        source: str,
+        responses: Tuple[Union["ResponseTemplate", "Directive"], ...],
+    ) -> None:
+        # Index of this rule in CompiledScript.rules, used for rotation cursors
+        self.rule_id = rule_id
+        self.pattern = pattern
+        self.source = source
+        self.responses = responses
+        # Text the input must contain for the pattern to match
+        self.literals = required_literals(source)
+
+
+class KeywordRule:
+    """A script keyword with its rank, substitution and decomposition rules."""
+
+    __slots__ = ("keyword", "rank", "substitution", "substitution_regex", "rules")
+
+    # None for a keyword without a substitution, else compiled on first use
+    substitution_regex: Optional[Pattern[str]]
+
+    def __init__(
+        self,
+        keyword: str,
+        rank: int,
+        substitution: Optional[str],
+        rules: List[DecompositionRule],
+    ) -> None:
+        self.keyword = keyword
+        self.rank = rank
+        self.substitution = substitution
+        if not substitution:
+            self.substitution_regex = None
+        self.rules = rules
+
+    def __getattr__(self, name: str) -> Any:
+        # Matches the keyword itself, for rewriting it to its substitution;
+        # compiled on first use like LazyPattern.regex
+        if name != "substitution_regex":
+            raise AttributeError(name)
+        self.substitution_regex = re.compile(
+            r"\b" + re.escape(self.keyword) + r"\b", re.IGNORECASE
+        )
+        return self.substitution_regex
+
+    def __getstate__(self) -> Dict[str, Any]:
+        return {
+            slot: getattr(self, slot)
+            for slot in self.__slots__
+            if slot != "substitution_regex" or not self.substitution
+        }
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        for slot, value in state.items():
+            setattr(self, slot, value)
+
+    def match(self, transformed_input: str) -> "RuleMatch":
+        """
+        Find the first decomposition rule that matches the transformed input.
+
+        Each rule is first checked for its required literals with substring
+        tests, which rule out most rules far faster than a regex scan. That
+        is exact only for ASCII input, where IGNORECASE is plain case
+        folding; other input goes straight to the regexes.
+
+        Returns:
+            (rule, match), or None if no rule matches
+        """
+        if transformed_input.isascii():
+            folded = transformed_input.upper()
+            for rule in self.rules:
+                for literal in rule.literals:
+                    if literal not in folded:
+                        break
+                else:
+                    match = rule.regex.search(transformed_input)
+                    if match:
+                        return rule, match
+            return None
+
+        for rule in self.rules:
+            match = rule.regex.search(transformed_input)
+            if match:
+                return rule, match
+        return None
 
-    # Strip punctuation from each word
-    clean_words = [word.strip(".,!?;:") for word in words]
-    normalized_input = " ".join(clean_words)
+    def transform(self, normalized_input: str) -> str:
+        """Replace this keyword in the input with its substitution, if any."""
+        regex = self.substitution_regex
+        if regex is None or self.substitution is None:
+            return normalized_input
+        return regex.sub(self.substitution, normalized_input)
 
-    keyword_matches = find_keywords(clean_words)
-    keyword_matches.sort(key=lambda x: x[1], reverse=True)
 
-    for keyword, _ in keyword_matches:
-        response = try_keyword(keyword, normalized_input)
-        if response:
-            # Check if this keyword has memory rules and store matches
-            store_memory(keyword, normalized_input)
-            return response
+class MemoryRule(LazyPattern):
+    """A MEMORY decomposition pattern with the template it stores."""
 
-    # Before falling back to NONE, check if we have stored memories
-    memory_response = recall_memory() if MEMORY else None
-    if memory_response:
-        return memory_response
+    __slots__ = ("template", "response")
 
-    if "NONE" in SCRIPT["keywords"]:
-        response = try_keyword("NONE", normalized_input)
-        if response:
-            return response
+    def __init__(self, pattern: str, source: str, template: str) -> None:
+        self.pattern = pattern
+        self.source = source
+        self.template = template
+        # The parsed template, set by CompiledScript once the regex is compiled
+        self.response: Optional[ResponseTemplate] = None
 
-    return "PLEASE GO ON"
 
+class ResponseTemplate:
+    """
+    A reassembly template split into literal text and capture group slots.
+
+    A number standing alone in the template, such as the 4 in "DO YOU OFTEN
+    THINK OF 4", is a slot for that capture group if the pattern has that
+    many groups; otherwise it is kept as literal text. The template is
+    stored as a format string over just the groups it uses, so a response
+    is built with one call instead of a regex substitution per group.
+    Captured text is inserted as is, never searched for further numbers.
+
+    Attributes:
+        text: The template as written in the script
+        groups: The number of capture groups the template was parsed for
+        slots: The group numbers used, in format-argument order
+        format_string: The template with each slot replaced by {n}
+        literal: The finished response if the template has no slots
+    """
 
-def apply_pre_substitutions(words: List[str]) -> List[str]:
-    """Apply pre-substitutions to words."""
-    substitutions = SCRIPT["pre_substitutions"]
-    return [substitutions.get(word, word) for word in words]
+    __slots__ = ("text", "groups", "slots", "format_string", "literal")
+
+    def __init__(self, text: str, groups: int) -> None:
+        self.text = text
+        self.groups = groups
+        slots: List[int] = []
+        parts = []
+        for segment in self.split(text, groups):
+            if isinstance(segment, int):
+                if segment not in slots:
+                    slots.append(segment)
+                parts.append("{" + str(slots.index(segment)) + "}")
+            else:
+                parts.append(self._escape(segment))
+        self.slots = tuple(slots)
+        self.format_string = "".join(parts)
+        self.literal = None if slots else text.strip()
+
+    @staticmethod
+    def split(text: str, groups: int) -> List[Union[str, int]]:
+        """
+        A template's literal text and its slots, in order.
+
+        Returns:
+            Literal strings alternating with group numbers, starting and
+            ending with a literal (which may be empty)
+        """
+        segments: List[Union[str, int]] = []
+        position = 0
+        for number in TEMPLATE_NUMBER_REGEX.finditer(text):
+            group = int(number.group())
+            if not 1 <= group <= groups or number.group() != str(group):
+                continue
+            segments.append(text[position : number.start()])
+            segments.append(group)
+            position = number.end()
+        segments.append(text[position:])
+        return segments
+
+    @staticmethod
+    def _escape(literal: str) -> str:
+        return literal.replace("{", "{{").replace("}", "}}")
+
+    def unknown_groups(self) -> List[int]:
+        """Numbers in the template that look like slots for missing groups."""
+        return [
+            int(number.group())
+            for number in TEMPLATE_NUMBER_REGEX.finditer(self.text)
+            if int(number.group()) > self.groups
+        ]
+
+
+class Directive:
+    """
+    A goto, newkey or PRE response, with its target resolved at load time.
+
+    Attributes:
+        kind: "goto", "newkey" or "pre" (anything else is used as text)
+        spec: The directive as written in the JSON script
+        keyword: The keyword a goto or PRE hands over to, as written
+        target: The rule that keyword resolves to after static redirects,
+            or None if it isn't a keyword; set once every keyword is known
+        transformation: The PRE rewrite, with literal words as strings and
+            capture groups as ints; references to missing groups are
+            dropped, as they always have been
+    """
 
+    __slots__ = ("kind", "spec", "keyword", "target", "transformation")
+
+    def __init__(self, spec: dict, groups: int) -> None:
+        self.kind = spec.get("type")
+        self.spec = spec
+        self.keyword: Optional[str] = None
+        self.target: Optional[KeywordRule] = None
+        self.transformation: Tuple[Union[str, int], ...] = ()
+        if self.kind == "goto":
+            self.keyword = spec["keyword"]
+        elif self.kind == "pre":
+            target = spec.get("target", [])
+            if target:
+                keyword = target[0]
+                self.keyword = keyword[1:] if keyword.startswith("=") else keyword
+            self.transformation = tuple(
+                (int(item) if item.isdigit() else item)
+                for item in spec.get("transformation", [])
+                if not item.isdigit() or int(item) <= groups
+            )
+
+
+class Turn:
+    """
+    One user input, tokenized once and shared by every stage of a turn.
+
+    CompiledScript.prepare builds it in a single pass over the words that
+    applies the delimiter rule and finds keywords as it goes, stopping at the
+    delimiter that ends the kept span. Later stages read the tokens and the
+    cached reflection instead of splitting the normalized text again.
+
+    Attributes:
+        tokens: The kept words, uppercased with punctuation stripped
+        delimiters: Indices of the input words that end in "," or ".", up
+            to the end of the kept span
+        start: Index of the first input word kept by the delimiter rule
+        end: Index just past the last input word kept
+        normalized: The tokens joined with single spaces
+        keywords: Script keywords among the tokens, highest rank first
+        reflections: The tokens with pronouns reflected, or None until
+            CompiledScript.transform_input first needs them
+        reflected: The non-empty reflections joined with single spaces
+    """
 
-def truncate_on_delimiters(words: List[str]) -> List[str]:
+    __slots__ = (
+        "tokens",
+        "delimiters",
+        "start",
+        "end",
+        "normalized",
+        "keywords",
+        "reflections",
+        "reflected",
+    )
+
+    def __init__(
+        self,
+        tokens: List[str],
+        delimiters: List[int],
+        start: int,
+        end: int,
+        keywords: List[str],
+    ) -> None:
+        self.tokens = tokens
+        self.delimiters = delimiters
+        self.start = start
+        self.end = end
+        self.normalized = " ".join(tokens)
+        self.keywords = keywords
+        self.reflections: Optional[List[str]] = None
+        self.reflected = ""
+
+    @classmethod
+    def from_normalized(cls, normalized_input: str) -> "Turn":
+        """Wrap text that is already normalized, such as a PRE rewrite."""
+        tokens = normalized_input.split()
+        return cls(tokens, [], 0, len(tokens), [])
+
+
+# The rule that matched an input and its match object, or None
+RuleMatch = Optional[Tuple[DecompositionRule, Match[str]]]
+
+# Rule matches keyed by (keyword, normalized input), shareable across sessions
+MatchCache = Dict[Tuple[str, str], RuleMatch]
+
+
+class TraceEvent(NamedTuple):
     """
-    Apply ELIZA's delimiter rule from Weizenbaum 1966:
-    - Before finding a keyword: delete text up to and including comma/period
-    - After finding a keyword: delete text from comma/period onward
+    One step of a traced turn, passed to a tracer's ``emit`` method.
+
+    kind is one of:
+        "turn": a whole turn; detail is (user_input, response)
+        "keyword": a keyword tried; detail is its response or None
+        "pattern": a decomposition pattern tested; detail is whether it matched
+        "directive": a goto, newkey or pre directive followed; detail is the
+            directive
+        "memory_store": a memory stored; detail is its templates
+        "memory_recall": a memory recalled; detail is the response
+        "memory_evict": a memory dropped by the store's policy; detail is
+            its remaining templates
+        "fallback": no keyword, memory or NONE rule answered; detail is the
+            response
+
+    elapsed is in seconds for "turn", "keyword" and "pattern" events, else 0.
+    """
+
+    kind: str
+    keyword: Optional[str]
+    pattern: Optional[str]
+    detail: Any
+    elapsed: float
 
-    Note: Words still have punctuation at this point for delimiter detection.
+
+class CompiledScript:
     """
-    keywords = SCRIPT["keywords"]
-    keyword_found = False
-    result: List[str] = []
+    An ELIZA script with every pattern expanded and compiled up front.
+
+    Word list references are expanded once and each decomposition and memory
+    pattern is compiled to a ``re.Pattern``, so a conversation turn only runs
+    the regexes instead of rebuilding them. Rules keep their script order.
 
-    for word in words:
-        # Check if this word ends with a delimiter
-        has_delimiter = word.endswith(",") or word.endswith(".")
+    Compiled scripts pickle without their regexes; load_script caches them
+    that way and recompiles each pattern the first time it is used.
 
-        # Strip punctuation to check if it's a keyword
-        clean_word = word.strip(".,!?;:")
+    A compiled script is never modified after construction, so any number of
+    sessions can share it. Conversation state lives in ElizaSession.
+
+    With harden=True every pattern goes through harden_pattern, so no input
+    can make a turn backtrack superlinearly. With engine="tokens" patterns
+    are matched word by word with TokenPattern, which is linear anyway;
+    patterns it can't read stay regexes, hardened if asked.
+    """
 
-        if not keyword_found:
-            # Before finding keyword: skip everything up to delimiter
-            if has_delimiter:
-                # Delete this word and everything before it
-                result = []
+    def __init__(
+        self,
+        script: dict,
+        strict: bool = False,
+        harden: bool = False,
+        engine: str = "re",
+    ) -> None:
+        if engine not in ENGINES:
+            raise ValueError(f"unknown engine {engine!r}, expected one of {ENGINES}")
+        self.harden = harden
+        self.engine = engine
+        self.greeting: str = script.get("greeting", DEFAULT_GREETING)
+        self.word_lists: Dict[str, List[str]] = script.get("word_lists", {})
+        # Word list name -> its uppercased words, which patterns look words
+        # up in instead of trying each word as a regex alternative
+        self.word_sets: Dict[str, FrozenSet[str]] = {
+            name: WordSet.from_words(words) for name, words in self.word_lists.items()
+        }
+        self.pre_substitutions: Dict[str, str] = script.get("pre_substitutions", {})
+        # Word -> its reflection: pre-substitution, then safe substitution
+        self.reflections: Dict[str, str] = {
+            word: SAFE_SUBSTITUTIONS.get(word, word) for word in SAFE_SUBSTITUTIONS
+        }
+        for word, substitute in self.pre_substitutions.items():
+            self.reflections[word] = SAFE_SUBSTITUTIONS.get(substitute, substitute)
+
+        # Every decomposition rule in script order, indexed by rule_id. These
+        # tables are read-only once built, which lets a subclass such as
+        # CompactScript serve them from other storage
+        all_rules: List[DecompositionRule] = []
+        keywords: Dict[str, KeywordRule] = {}
+        for keyword, keyword_data in script["keywords"].items():
+            rules = []
+            for pattern, responses in keyword_data.get("responses", {}).items():
+                source, token_pattern = self.pattern_source(pattern)
+                rule = DecompositionRule(len(all_rules), pattern, source, ())
+                # literals stay those of the pattern as written
+                self._prepare(rule, token_pattern)
+                # Compiling here also makes a bad pattern fail at load time
+                groups = rule.regex.groups
+                rule.responses = tuple(
+                    (
+                        ResponseTemplate(response, groups)
+                        if isinstance(response, str)
+                        else Directive(response, groups)
+                    )
+                    for response in responses
+                )
+                all_rules.append(rule)
+                rules.append(rule)
+            keywords[keyword] = KeywordRule(
+                keyword,
+                keyword_data.get("rank", 0),
+                keyword_data.get("substitution"),
+                rules,
+            )
+
+        self.rules: Sequence[DecompositionRule] = all_rules
+        self.keywords: Mapping[str, KeywordRule] = keywords
+
+        memory_table: Dict[str, List[MemoryRule]] = {}
+        for keyword, memory_rules in script.get("memory_rules", {}).items():
+            memory_table[keyword] = []
+            for rule in memory_rules:
+                source, token_pattern = self.pattern_source(rule["pattern"])
+                memory_rule = MemoryRule(rule["pattern"], source, rule["template"])
+                self._prepare(memory_rule, token_pattern)
+                memory_table[keyword].append(memory_rule)
+        self.memory_rules: Mapping[str, Sequence[MemoryRule]] = memory_table
+
+        for memory_rules in memory_table.values():
+            for memory_rule in memory_rules:
+                memory_rule.response = ResponseTemplate(
+                    memory_rule.template, memory_rule.regex.groups
+                )
+
+        # Keyword -> the rule that answers for it, after static redirects
+        self.dispatch: Mapping[str, KeywordRule] = self.link_keywords()
+
+        # Problems found in the script; fatal only when strict
+        self.problems: List[str] = self.validate()
+        if strict and self.problems:
+            raise ScriptError("\n".join(self.problems))
+
+    def pattern_source(self, pattern: str) -> Tuple[str, Optional[TokenPattern]]:
+        """
+        What to compile a script pattern from.
+
+        With the "tokens" engine, a pattern that refers to word lists is
+        kept as written and looks each word up in the lists' WordSets.
+        Otherwise word lists are expanded as regex alternatives (see
+        expand_word_lists), so the "re" engine keeps matching characters:
+        (/FAMILY) matches the SISTER of SISTERS. Long lists are left as
+        placeholders that WordListRegex fills in with the words each input
+        holds, unless patterns are hardened, which needs them spelled out.
+
+        Returns:
+            (source, the TokenPattern if it refers to word lists)
+        """
+        if self.engine == "tokens" and self.word_sets and "/" in pattern:
+            token_pattern = TokenPattern.parse(pattern, self.word_sets)
+            if token_pattern is not None and token_pattern.word_lists:
+                return pattern, token_pattern
+        if self.harden:
+            return self.expand_pattern(pattern), None
+        return expand_word_lists(pattern, self.word_lists, self.word_sets), None
+
+    def _prepare(
+        self, rule: LazyPattern, token_pattern: Optional[TokenPattern] = None
+    ) -> None:
+        """Set a new rule's engine and harden its pattern, as configured."""
+        if token_pattern is not None:
+            rule.engine = "tokens"
+            rule.word_sets = self.word_sets
+            rule.regex = token_pattern
+            if isinstance(rule, DecompositionRule):
+                rule.literals = token_pattern.literals()
+            return
+        if _WORD_LIST_MARK in rule.source:
+            rule.word_sets = self.word_sets
+            return
+        if self.engine != "re":
+            rule.engine = self.engine
+            if TokenPattern.parse(rule.source) is not None:
+                return
+        if self.harden:
+            rule.source = harden_pattern(rule.source)
+
+    def link_keywords(self) -> Dict[str, KeywordRule]:
+        """
+        Resolve redirects and directive targets, rejecting loops.
+
+        A keyword with a substitution and no decomposition rules redirects
+        to its substitution, and a goto hands the same input to another
+        keyword, so a cycle through either would never finish. PRE
+        directives rewrite the input, so they are bounded at run time by
+        MAX_PRE_DEPTH instead.
+
+        Returns:
+            The dispatch table from each keyword to the rule that answers
+            for it; keywords that redirect to unknown keywords are left out
+
+        Raises:
+            ScriptError: If redirects and gotos form a cycle
+        """
+        keywords = self.keywords
+        edges: Dict[str, List[str]] = {}
+        for keyword, keyword_rule in keywords.items():
+            if keyword_rule.substitution and not keyword_rule.rules:
+                edges[keyword] = [keyword_rule.substitution]
+            else:
+                edges[keyword] = [
+                    directive.keyword
+                    for rule in keyword_rule.rules
+                    for directive in rule.responses
+                    if isinstance(directive, Directive)
+                    and directive.kind == "goto"
+                    and directive.keyword is not None
+                ]
+
+        # Depth-first search with an explicit stack, so long chains in large
+        # generated scripts don't hit the recursion limit
+        done: Set[str] = set()
+        for root in keywords:
+            if root in done:
                 continue
-            result.append(word)
-            # Check if this is a keyword
-            if clean_word in keywords:
-                keyword_found = True
-        else:
-            # After finding keyword: include this word, then stop at delimiter
-            result.append(word)
-            if has_delimiter:
-                # Delimiter found - stop here, delete subsequent text
+            path = [root]
+            on_path = {root}
+            stack = [iter(edges[root])]
+            while stack:
+                target = next(stack[-1], None)
+                if target is None:
+                    stack.pop()
+                    done.add(path[-1])
+                    on_path.discard(path.pop())
+                elif target in on_path:
+                    cycle = path[path.index(target) :] + [target]
+                    raise ScriptError("redirect/goto cycle: " + " -> ".join(cycle))
+                elif target in keywords and target not in done:
+                    path.append(target)
+                    on_path.add(target)
+                    stack.append(iter(edges[target]))
+
+        dispatch: Dict[str, KeywordRule] = {}
+        for keyword, keyword_rule in keywords.items():
+            resolved: Optional[KeywordRule] = keyword_rule
+            while resolved is not None and resolved.substitution and not resolved.rules:
+                resolved = keywords.get(resolved.substitution)
+            if resolved is not None:
+                dispatch[keyword] = resolved
+
+        for keyword_rule in keywords.values():
+            for rule in keyword_rule.rules:
+                for directive in rule.responses:
+                    if isinstance(directive, Directive) and directive.keyword:
+                        directive.target = dispatch.get(directive.keyword)
+        return dispatch
+
+    def validate(self) -> List[str]:
+        """
+        Check templates and directives against the patterns and keywords.
+
+        Finds templates that refer to capture groups their pattern doesn't
+        have (such numbers are kept as literal text), PRE rewrites that do
+        the same, and goto or PRE targets that aren't keywords.
+
+        Returns:
+            One message per problem, in script order
+        """
+        problems = []
+        for keyword_rule in self.keywords.values():
+            for rule in keyword_rule.rules:
+                where = f"{keyword_rule.keyword} {rule.pattern!r}"
+                groups = rule.regex.groups
+                for response in rule.responses:
+                    if isinstance(response, ResponseTemplate):
+                        for group in response.unknown_groups():
+                            problems.append(
+                                f"{where}: {response.text!r} refers to group"
+                                f" {group}, but the pattern has {groups}"
+                            )
+                    elif response.kind not in ("goto", "newkey", "pre"):
+                        problems.append(f"{where}: unknown directive {response.spec!r}")
+                    else:
+                        if response.keyword and response.target is None:
+                            problems.append(
+                                f"{where}: {response.kind} to unknown keyword"
+                                f" {response.keyword!r}"
+                            )
+                        for item in response.spec.get("transformation", []):
+                            if item.isdigit() and int(item) > groups:
+                                problems.append(
+                                    f"{where}: PRE refers to group {item},"
+                                    f" but the pattern has {groups}"
+                                )
+        for keyword, memory_rules in self.memory_rules.items():
+            for memory_rule in memory_rules:
+                assert memory_rule.response is not None
+                for group in memory_rule.response.unknown_groups():
+                    problems.append(
+                        f"MEMORY {keyword} {memory_rule.pattern!r}:"
+                        f" {memory_rule.template!r} refers to group {group},"
+                        f" but the pattern has {memory_rule.regex.groups}"
+                    )
+        return problems
+
+    @classmethod
+    def from_file(cls, path: str) -> "CompiledScript":
+        """Load and compile a script from a JSON file."""
+        with open(path, "r", encoding="utf-8") as script_file:
+            return cls(json.load(script_file))
+
+    def expand_pattern(self, pattern: str) -> str:
+        """Expand word list references in a pattern."""
+        return expand_word_lists(pattern, self.word_lists)
+
+    def compile_pattern(self, pattern: str) -> Pattern[str]:
+        """Expand word list references in a pattern and compile it."""
+        return re.compile(self.expand_pattern(pattern), re.IGNORECASE)
+
+    def prepare(self, user_input: str) -> Turn:
+        """
+        Normalize user input and find the keywords to try, best rank first.
+
+        This is the part of a turn that doesn't depend on conversation state.
+        It makes one pass over the words, applying the delimiter rule (see
+        truncate_on_delimiters) and finding keywords (see find_keywords).
+
+        Args:
+            user_input: The user's input text
+
+        Returns:
+            The tokenized turn
+        """
+        keywords = self.keywords
+        tokens: List[str] = []
+        delimiters: List[int] = []
+        found: List[str] = []
+
+        # Normalize: uppercase, split, strip punctuation from each word
+        words = user_input.upper().split()
+        start = 0
+        end = len(words)
+        for index, word in enumerate(words):
+            token = word.strip(PUNCTUATION)
+            if word[-1] in ",.":
+                delimiters.append(index)
+                if not found:
+                    # Before finding a keyword: drop everything up to here
+                    tokens.clear()
+                    start = index + 1
+                    continue
+                # After finding a keyword: keep this word, drop the rest
+                end = index + 1
+                tokens.append(token)
+                if token in keywords:
+                    found.append(token)
                 break
+            tokens.append(token)
+            if token in keywords:
+                found.append(token)
+
+        if len(found) > 1:
+            found.sort(key=self.rank, reverse=True)
+        return Turn(tokens, delimiters, start, end, found)
+
+    def rank(self, keyword: str) -> int:
+        """The rank of a keyword of the script."""
+        return self.keywords[keyword].rank
+
+    def resolve_keyword(self, keyword: str) -> Optional[KeywordRule]:
+        """
+        Follow keywords that only redirect to their substitution.
+
+        Returns:
+            The keyword rule whose decomposition rules apply, or None if the
+            keyword is unknown or redirects to an unknown keyword
+        """
+        return self.dispatch.get(keyword)
+
+    def transform_input(self, keyword_rule: KeywordRule, turn: Turn) -> str:
+        """Prepare a turn's input for matching against a keyword's patterns."""
+        # Apply pronoun reflection to the input before pattern matching
+        # This allows patterns like "I(.*)YOU" to match when user says "you...me"
+        # It's the same for every keyword, so it is done once and kept on the turn
+        reflections = turn.reflections
+        if reflections is None:
+            table = self.reflections
+            reflections = turn.reflections = [
+                table.get(token, token) for token in turn.tokens
+            ]
+            turn.reflected = " ".join(
+                reflections if all(turn.tokens) else filter(None, reflections)
+            )
+
+        substitution_regex = keyword_rule.substitution_regex
+        if substitution_regex is None:
+            return turn.reflected
+
+        # Transform the input for pattern matching with this keyword's patterns
+        # For example, "I = YOU" means when user types "I", transform it to "YOU" to match patterns
+        # After YOU->I transformation: "I...ME", then ME->YOU gives "I...YOU"
+        # Keywords are single words, so only the tokens containing a match change
+        normalized = turn.normalized
+        match = substitution_regex.search(normalized)
+        if match is None:
+            return turn.reflected
+        words = list(reflections)
+        index = position = 0
+        while match is not None:
+            index += normalized.count(" ", position, match.start())
+            position = match.start()
+            words[index] = self.reflect_pronouns(
+                keyword_rule.transform(turn.tokens[index])
+            )
+            match = substitution_regex.search(normalized, match.end())
+        return " ".join(filter(None, words))
+
+    def match_keyword(
+        self, keyword_rule: KeywordRule, turn: Turn, tracer: Any = None
+    ) -> RuleMatch:
+        """
+        Find the first decomposition rule of a keyword that matches the input.
+
+        If a tracer is given, every pattern is searched, without the literal
+        prefilter, and a "pattern" event is emitted for every pattern tested.
+        """
+        transformed_input = self.transform_input(keyword_rule, turn)
+        if tracer is not None:
+            return self._traced_match(keyword_rule, transformed_input, tracer)
+        return keyword_rule.match(transformed_input)
+
+    @staticmethod
+    def _traced_match(
+        keyword_rule: KeywordRule, transformed_input: str, tracer: Any
+    ) -> RuleMatch:
+        for rule in keyword_rule.rules:
+            start = time.perf_counter()
+            match = rule.regex.search(transformed_input)
+            tracer.emit(
+                TraceEvent(
+                    "pattern",
+                    keyword_rule.keyword,
+                    rule.pattern,
+                    match is not None,
+                    time.perf_counter() - start,
+                )
+            )
+            if match:
+                return rule, match
 
-    return result
-
+        return None
 
-def find_keywords(words: List[str]) -> List[Tuple[str, int]]:
-    """Find all keywords present in the input words, return with their ranks."""
-    keywords = SCRIPT["keywords"]
-    found = []
+    def apply_pre_substitutions(self, words: List[str]) -> List[str]:
+        """Apply pre-substitutions to words."""
+        substitutions = self.pre_substitutions
+        return [substitutions.get(word, word) for word in words]
+
+    def truncate_on_delimiters(self, words: List[str]) -> List[str]:
+        """
+        Apply ELIZA's delimiter rule from Weizenbaum 1966:
+        - Before finding a keyword: delete text up to and including comma/period
+        - After finding a keyword: delete text from comma/period onward
+
+        Note: Words still have punctuation at this point for delimiter detection.
+        """
+        keywords = self.keywords
+        keyword_found = False
+        result: List[str] = []
+
+        for word in words:
+            # Check if this word ends with a delimiter
+            has_delimiter = word.endswith(",") or word.endswith(".")
+
+            # Strip punctuation to check if it's a keyword
+            clean_word = word.strip(PUNCTUATION)
+
+            if not keyword_found:
+                # Before finding keyword: skip everything up to delimiter
+                if has_delimiter:
+                    # Delete this word and everything before it
+                    result = []
+                    continue
+                result.append(word)
+                # Check if this is a keyword
+                if clean_word in keywords:
+                    keyword_found = True
+            else:
+                # After finding keyword: include this word, then stop at delimiter
+                result.append(word)
+                if has_delimiter:
+                    # Delimiter found - stop here, delete subsequent text
+                    break
+
+        return result
+
+    def find_keywords(self, words: List[str]) -> List[Tuple[str, int]]:
+        """Find all keywords present in the input words, return with their ranks."""
+        keywords = self.keywords
+        found = []
+
+        for word in words:
+            # Words are already clean (punctuation stripped and substitutions applied)
+            if word in keywords:
+                found.append((word, keywords[word].rank))
+
+        return found
+
+    def reflect_pronouns(self, text: str) -> str:
+        """
+        Apply pronoun reflection and safe keyword substitutions to text.
+        This handles pre_substitutions (ME -> YOU) and safe keyword substitutions like AM -> ARE.
+        We avoid recursive pronoun substitutions (I/YOU/MY/YOUR).
+        """
+        reflections = self.reflections
+        return " ".join([reflections.get(word, word) for word in text.split()])
+
+    def generate_response(
+        self, template: Union[str, ResponseTemplate, Directive], captures: tuple
+    ) -> str:
+        """Generate response from template by substituting numbered references with captures."""
+        if isinstance(template, str):
+            template = ResponseTemplate(template, len(captures))
+        elif isinstance(template, Directive):
+            return str(template.spec)
+        elif not isinstance(template, ResponseTemplate):
+            return str(template)
+        elif template.groups != len(captures):
+            # Captures from another pattern, as with MEMORY rules
+            template = ResponseTemplate(template.text, len(captures))
+
+        if template.literal is not None:
+            return template.literal
+
+        slots = template.slots
 
-    for word in words:
-        # Words are already clean (punctuation stripped and substitutions applied)
-        if word in keywords:
-            rank = keywords[word].get("rank", 0)
-            found.append((word, rank))
+        # Apply pronoun reflection to the captured text
+        reflect = self.reflect_pronouns
+        if len(slots) == 1:
+            reflected = reflect(captures[slots[0] - 1] or "")
+            return template.format_string.format(reflected).strip()
+        return template.format_string.format(
+            *[reflect(captures[group - 1] or "") for group in slots]
+        ).strip()
 
-    return found
 
+# array typecode of ElizaSession's rotation cursors (unsigned int)
+CURSOR_TYPECODE = "I"
 
-def expand_word_lists(pattern: str) -> str:
-    """Expand word list references like (/FAMILY) in regex patterns."""
-    word_lists = SCRIPT.get("word_lists", {})
-    result = pattern
+# Memories a session keeps before its MemoryStore starts evicting
+DEFAULT_MEMORY_CAPACITY = 64
 
-    for wordlist_name, words in word_lists.items():
-        ref = "/" + wordlist_name
-        # Look for captured (/WORDLIST) or uncaptured /WORDLIST
-        captured_ref = "(" + ref + ")"
-        if captured_ref in result:
-            # Captured word list - create capturing group with alternation
-            expanded = "((?:" + "|".join(re.escape(w) for w in words) + "))"
-            result = result.replace(captured_ref, expanded)
-        elif ref in result:
-            # Uncaptured word list - create non-capturing group
-            expanded = "(?:" + "|".join(re.escape(w) for w in words) + ")"
-            result = result.replace(ref, expanded)
+MEMORY_POLICIES = ("drop_oldest", "drop_newest", "ttl")
 
-    return result
 
+class MemoryStore:
+    """
+    A bounded FIFO queue of stored memories.
+
+    Each memory is the list of templates stored for one input, used
+    last-first; a memory leaves the queue when its last template is
+    recalled. Storing and recalling are O(1).
+
+    When the queue is full, the policy decides what goes:
+
+        "drop_oldest": evict the memory at the head of the queue (default)
+        "drop_newest": discard the memory being stored
+        "ttl": like drop_oldest, and also expire memories stored more than
+            ttl turns ago
+
+    Attributes:
+        capacity: Most memories held at once
+        policy: One of MEMORY_POLICIES
+        ttl: Turns a memory lives under the "ttl" policy
+        turn: Turns counted by advance()
+        stored: Memories stored, including those later evicted
+        recalled: Templates recalled
+        evictions: Memories dropped for lack of room
+        expirations: Memories dropped by the ttl policy
+        last_evicted: Templates of the memories dropped by the latest
+            store() or advance() call, for tracing
+    """
 
-def try_keyword(keyword: str, normalized_input: str) -> Optional[str]:
-    """Try to match patterns for a keyword and generate a response."""
-    keyword_data = SCRIPT["keywords"].get(keyword)
-    if not keyword_data:
-        return None
+    __slots__ = (
+        "capacity",
+        "policy",
+        "ttl",
+        "turn",
+        "stored",
+        "recalled",
+        "evictions",
+        "expirations",
+        "last_evicted",
+        "_entries",
+    )
+
+    def __init__(
+        self,
+        capacity: int = DEFAULT_MEMORY_CAPACITY,
+        policy: str = "drop_oldest",
+        ttl: Optional[int] = None,
+    ) -> None:
+        if capacity < 1:
+            raise ValueError(f"memory capacity must be positive, got {capacity}")
+        if policy not in MEMORY_POLICIES:
+            raise ValueError(
+                f"unknown memory policy {policy!r};"
+                f" expected one of {', '.join(MEMORY_POLICIES)}"
+            )
+        if policy == "ttl" and (ttl is None or ttl < 1):
+            raise ValueError("the ttl memory policy needs a positive ttl")
+        self.capacity = capacity
+        self.policy = policy
+        self.ttl = ttl
+        self.turn = 0
+        self.stored = 0
+        self.recalled = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.last_evicted: List[List[str]] = []
+        # (turn stored, templates), oldest first
+        self._entries: Deque[Tuple[int, List[str]]] = collections.deque()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __iter__(self):
+        return (templates for _, templates in self._entries)
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, MemoryStore):
+            return list(self) == list(other)
+        if isinstance(other, list):
+            return list(self) == other
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"MemoryStore({list(self)!r}, capacity={self.capacity})"
+
+    def advance(self) -> None:
+        """Count a turn, expiring memories that outlived the ttl."""
+        self.turn += 1
+        if self.last_evicted:
+            self.last_evicted = []
+        # __init__ requires a ttl with the "ttl" policy
+        if self.policy != "ttl" or self.ttl is None:
+            return
+        entries = self._entries
+        oldest = self.turn - self.ttl
+        while entries and entries[0][0] < oldest:
+            self.last_evicted.append(entries.popleft()[1])
+            self.expirations += 1
+
+    def store(self, templates: List[str]) -> bool:
+        """
+        Queue a memory, evicting per the policy if the queue is full.
+
+        Returns:
+            True if the memory was stored, False if drop_newest discarded it
+        """
+        entries = self._entries
+        if self.last_evicted:
+            self.last_evicted = []
+        if len(entries) >= self.capacity:
+            self.evictions += 1
+            if self.policy == "drop_newest":
+                self.last_evicted.append(templates)
+                return False
+            self.last_evicted.append(entries.popleft()[1])
+        entries.append((self.turn, templates))
+        self.stored += 1
+        return True
 
-    # If keyword has a substitution but no responses, try the substituted keyword
-    if "substitution" in keyword_data and keyword_data["substitution"]:
-        substitute = keyword_data["substitution"]
-        if not keyword_data.get("responses"):
-            # This is a simple redirect, try the substituted keyword
-            return try_keyword(substitute, normalized_input)
-        # Otherwise, transform the input for pattern matching with this keyword's patterns
-        # For example, "I = YOU" means when user types "I", transform it to "YOU" to match patterns
-        transformed_input = re.sub(
-            r"\b" + re.escape(keyword) + r"\b",
-            substitute,
-            normalized_input,
-            flags=re.IGNORECASE,
+    def recall(self) -> Optional[str]:
+        """
+        Use the next template of the memory at the head of the queue.
+
+        Returns:
+            The template, or None if no memories are stored
+        """
+        entries = self._entries
+        if not entries:
+            return None
+        templates = entries[0][1]
+        response = templates.pop()
+        if not templates:
+            entries.popleft()
+        self.recalled += 1
+        return response
+
+    def clear(self) -> None:
+        """Forget every memory; the counters are kept."""
+        self._entries.clear()
+
+    def get_state(self) -> Dict[str, Any]:
+        """A JSON-ready copy of the store, for from_state."""
+        state = self.stats()
+        del state["size"]
+        state["turn"] = self.turn
+        state["entries"] = [
+            [turn, list(templates)] for turn, templates in self._entries
+        ]
+        return state
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any]) -> "MemoryStore":
+        """Rebuild a store saved with get_state."""
+        store = cls(state["capacity"], state["policy"], state["ttl"])
+        store.turn = state["turn"]
+        store.stored = state["stored"]
+        store.recalled = state["recalled"]
+        store.evictions = state["evictions"]
+        store.expirations = state["expirations"]
+        store._entries.extend(
+            (turn, list(templates)) for turn, templates in state["entries"]
         )
-    else:
-        transformed_input = normalized_input
+        return store
+
+    def stats(self) -> Dict[str, Any]:
+        """Size, limits and counters, for logs and monitoring."""
+        return {
+            "size": len(self._entries),
+            "capacity": self.capacity,
+            "policy": self.policy,
+            "ttl": self.ttl,
+            "stored": self.stored,
+            "recalled": self.recalled,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class ElizaSession:
+    """
+    The state of a single ELIZA conversation.
 
-    # Apply pronoun reflection to transformed input before pattern matching
-    # This allows patterns like "I(.*)YOU" to match when user says "you...me"
-    # After YOU->I transformation: "I...ME", then ME->YOU gives "I...YOU"
-    transformed_input = reflect_pronouns(transformed_input)
+    A session holds only what changes from turn to turn: an array of rotation
+    cursors indexed by rule_id and its MemoryStore of stored memories. The
+    compiled script is shared read-only, so many sessions can run side by side
+    in one process, and snapshot_cursors copies the rotation state at once.
 
-    responses = keyword_data.get("responses", {})
-    if not responses:
-        return None
+    Setting ``tracer`` to an object with an ``emit(event)`` method (see
+    eliza_trace) reports every step of each turn as a TraceEvent. With no
+    tracer, the only cost is a None check at each hook.
+    """
 
-    for pattern, response_list in responses.items():
-        # Expand word list references in the pattern
-        expanded_pattern = expand_word_lists(pattern)
-        match = re.search(expanded_pattern, transformed_input, re.IGNORECASE)
-        if match:
-            # Use first response from the list
-            response_template = response_list[0]
-
-            # Handle special directives
-            if isinstance(response_template, dict):
-                if response_template.get("type") == "goto":
-                    target_keyword = response_template["keyword"]
-                    # Don't rotate for goto directives
-                    return try_keyword(target_keyword, normalized_input)
-                if response_template.get("type") == "newkey":
-                    # Don't rotate for newkey directives
-                    return None
-                if response_template.get("type") == "pre":
-                    # PRE directive: transform input, then goto target keyword
-                    transformation = response_template.get("transformation", [])
-                    target = response_template.get("target", [])
-
-                    # Build new input from transformation
-                    # transformation like ['YOU', 'ARE', '3'] means "YOU ARE <capture_group_3>"
-                    new_words = []
-                    for item in transformation:
-                        if item.isdigit():
-                            # Position reference - use captured group
-                            pos = int(item)
-                            if pos <= len(match.groups()):
-                                new_words.append(match.group(pos))
-                        else:
-                            # Literal word
-                            new_words.append(item)
-
-                    new_input = " ".join(new_words)
-
-                    # Extract target keyword (format: ['=KEYWORD'])
-                    if target and len(target) > 0:
-                        target_kw = target[0]
-                        if target_kw.startswith("="):
-                            target_kw = target_kw[1:]
-                        # Don't rotate for PRE directives
-                        return try_keyword(target_kw, new_input)
+    __slots__ = ("script", "cursors", "memory", "tracer")
+
+    def __init__(
+        self,
+        script: CompiledScript,
+        tracer: Any = None,
+        memory: Optional[MemoryStore] = None,
+    ) -> None:
+        self.script = script
+        # Index of the next response to use, by rule_id; grown to the
+        # highest rule rotated so far, rules past the end are at 0
+        self.cursors = array(CURSOR_TYPECODE)
+        self.memory = MemoryStore() if memory is None else memory
+        self.tracer = tracer
+
+    def _set_cursor(self, rule_id: int, cursor: int) -> None:
+        cursors = self.cursors
+        if rule_id >= len(cursors):
+            cursors.frombytes(bytes((rule_id + 1 - len(cursors)) * cursors.itemsize))
+        cursors[rule_id] = cursor
+
+    def snapshot_cursors(self) -> array:
+        """
+        A copy of the rotation cursors, for restore_cursors.
+
+        It is one flat array, however many rules the session has used, so
+        taking one before every turn (to undo or replay it) is cheap.
+        """
+        return self.cursors[:]
+
+    def restore_cursors(self, snapshot: array) -> None:
+        """Put back rotation cursors taken with snapshot_cursors."""
+        self.cursors = snapshot[:]
+
+    def get_state(self) -> Dict[str, Any]:
+        """
+        A JSON-ready snapshot of the conversation: rotation cursors and
+        memories. It shares nothing with the session, so it can be saved
+        while the conversation goes on.
+        """
+        return {
+            "cursors": [
+                [rule_id, cursor]
+                for rule_id, cursor in enumerate(self.cursors)
+                if cursor
+            ],
+            "memory": self.memory.get_state(),
+        }
+
+    @classmethod
+    def from_state(
+        cls, script: CompiledScript, state: Dict[str, Any], tracer: Any = None
+    ) -> "ElizaSession":
+        """
+        Resume a conversation saved with get_state.
+
+        Rotation cursors refer to rules by rule_id, so the state should come
+        from a session of the same script. Under another version of it
+        (after a reload), cursors for rules it doesn't have are dropped and
+        the rest wrap around their rule's responses.
+        """
+        session = cls(script, tracer, MemoryStore.from_state(state["memory"]))
+        rules = script.rules
+        for rule_id, cursor in state["cursors"]:
+            if rule_id < len(rules) and rules[rule_id].responses:
+                session._set_cursor(rule_id, cursor % len(rules[rule_id].responses))
+        return session
+
+    def rebind(self, script: CompiledScript) -> None:
+        """
+        Continue the conversation with another version of its script.
+
+        Memories carry over as they are. Each rotation cursor moves to the
+        rule with the same keyword and decomposition pattern in the new
+        script, wrapping if that rule now has fewer responses, and is
+        dropped if there is no such rule.
+        """
+        if script is self.script:
+            return
+        moved = rule_id_map(self.script, script)
+        cursors = self.cursors
+        self.cursors = array(CURSOR_TYPECODE)
+        for rule_id, cursor in enumerate(cursors):
+            rule = moved.get(rule_id)
+            if cursor and rule is not None and rule.responses:
+                self._set_cursor(rule.rule_id, cursor % len(rule.responses))
+        self.script = script
+
+    def respond(self, user_input: str) -> str:
+        """
+        Generate an ELIZA-style response to user input.
+
+        Args:
+            user_input: The user's input text
+
+        Returns:
+            ELIZA's response as an uppercase string
+        """
+        if self.tracer is not None:
+            return self.traced_respond(user_input)
+
+        return self.respond_prepared(self.script.prepare(user_input))
+
+    def traced_respond(
+        self,
+        user_input: str,
+        turn: Optional[Turn] = None,
+        matches: Optional[MatchCache] = None,
+    ) -> str:
+        """Respond to user input and emit a "turn" event to the tracer."""
+        start = time.perf_counter()
+        if turn is None:
+            turn = self.script.prepare(user_input)
+        response = self.respond_prepared(turn, matches)
+        self.tracer.emit(
+            TraceEvent(
+                "turn",
+                None,
+                None,
+                (user_input, response),
+                time.perf_counter() - start,
+            )
+        )
+        return response
+
+    def respond_prepared(self, turn: Turn, matches: Optional[MatchCache] = None) -> str:
+        """
+        Generate a response to input already tokenized by CompiledScript.prepare.
+
+        Args:
+            turn: The tokenized user input
+            matches: Optional cache of rule matches shared across turns
+
+        Returns:
+            ELIZA's response as an uppercase string
+        """
+        memory = self.memory
+        memory.advance()
+        if memory.last_evicted and self.tracer is not None:
+            self._trace_evictions()
+
+        for keyword in turn.keywords:
+            response = self.try_keyword(keyword, turn, matches)
+            if response:
+                # Check if this keyword has memory rules and store matches
+                self.store_memory(keyword, turn)
+                return response
+
+        # Before falling back to NONE, check if we have stored memories
+        memory_response = self.recall_memory() if self.memory else None
+        if memory_response:
+            return memory_response
+
+        if "NONE" in self.script.keywords:
+            response = self.try_keyword("NONE", turn, matches)
+            if response:
+                return response
+
+        if self.tracer is not None:
+            self.tracer.emit(TraceEvent("fallback", None, None, "PLEASE GO ON", 0.0))
+        return "PLEASE GO ON"
+
+    def try_keyword(
+        self,
+        keyword: str,
+        turn: Turn,
+        matches: Optional[MatchCache] = None,
+    ) -> Optional[str]:
+        """
+        Try to match patterns for a keyword and generate a response.
+
+        Args:
+            keyword: The keyword to try
+            turn: The tokenized user input
+            matches: Optional cache of rule matches, keyed by keyword and input
+
+        Returns:
+            The response, or None if the keyword produced none
+        """
+        return self._try_rule(
+            keyword, self.script.dispatch.get(keyword), turn, matches, 0
+        )
 
+    def _try_rule(
+        self,
+        keyword: str,
+        keyword_rule: Optional[KeywordRule],
+        turn: Turn,
+        matches: Optional[MatchCache],
+        depth: int,
+    ) -> Optional[str]:
+        tracer = self.tracer
+        if tracer is None:
+            return self._apply_rule(keyword_rule, turn, matches, depth)
+
+        start = time.perf_counter()
+        response = self._apply_rule(keyword_rule, turn, matches, depth)
+        tracer.emit(
+            TraceEvent("keyword", keyword, None, response, time.perf_counter() - start)
+        )
+        return response
+
+    def _apply_rule(
+        self,
+        keyword_rule: Optional[KeywordRule],
+        turn: Turn,
+        matches: Optional[MatchCache],
+        depth: int,
+    ) -> Optional[str]:
+        # Static redirects were resolved when the script was compiled
+        if keyword_rule is None:
+            return None
+
+        script = self.script
+        if matches is None:
+            found = script.match_keyword(keyword_rule, turn, self.tracer)
+        else:
+            key = (keyword_rule.keyword, turn.normalized)
+            if key in matches:
+                found = matches[key]
+            else:
+                found = matches[key] = script.match_keyword(
+                    keyword_rule, turn, self.tracer
+                )
+
+        if found is None:
+            return None
+
+        rule, match = found
+        # Use the response at this rule's rotation cursor
+        response_list = rule.responses
+        rule_id = rule.rule_id
+        cursors = self.cursors
+        cursor = cursors[rule_id] if rule_id < len(cursors) else 0
+        response_template = response_list[cursor]
+
+        # Handle special directives; none of them rotate
+        if isinstance(response_template, Directive):
+            directive = response_template
+            if self.tracer is not None:
+                self.tracer.emit(
+                    TraceEvent(
+                        "directive",
+                        keyword_rule.keyword,
+                        rule.pattern,
+                        directive.spec,
+                        0.0,
+                    )
+                )
+            kind = directive.kind
+            if kind == "goto":
+                # Goto chains can't loop; link_keywords rejects cycles
+                assert directive.keyword is not None
+                return self._try_rule(
+                    directive.keyword, directive.target, turn, matches, depth
+                )
+            if kind == "newkey":
+                return None
+            if kind == "pre":
+                # PRE directive: transform input, then goto target keyword
+                # transformation like ('YOU', 'ARE', 3) means "YOU ARE <capture_group_3>"
+                if directive.keyword is None or depth >= MAX_PRE_DEPTH:
                     return None
+                new_input = " ".join(
+                    [
+                        match.group(item) if isinstance(item, int) else item
+                        for item in directive.transformation
+                    ]
+                )
+                return self._try_rule(
+                    directive.keyword,
+                    directive.target,
+                    Turn.from_normalized(new_input),
+                    matches,
+                    depth + 1,
+                )
+            # Unknown directive types are used as text
+
+        # Generate the response
+        response = script.generate_response(response_template, match.groups())
+
+        # Rotate: advance the cursor (only if more than one response); the
+        # script itself is never written
+        if len(response_list) > 1:
+            if rule_id < len(cursors):
+                cursors[rule_id] = (cursor + 1) % len(response_list)
+            else:
+                self._set_cursor(rule_id, 1)
+
+        return response
+
+    def store_memory(self, keyword: str, turn: Turn) -> None:
+        """
+        Check if keyword has memory rules and store matching inputs for later recall.
+
+        Args:
+            keyword: The keyword that matched
+            turn: The tokenized user input
+        """
+        script = self.script
+        memory_rules = script.memory_rules.get(keyword)
+        if not memory_rules:
+            return
+
+        # Apply keyword substitution if it exists, then pronoun reflection
+        keyword_rule = script.keywords.get(keyword)
+        if keyword_rule is not None:
+            transformed_input = script.transform_input(keyword_rule, turn)
+        else:
+            transformed_input = script.reflect_pronouns(turn.normalized)
+
+        # Try to match against memory patterns
+        for memory_rule in memory_rules:
+            match = memory_rule.regex.search(transformed_input)
+            if match:
+                # Store all templates for this match as a single memory entry
+                templates = []
+                for rule in memory_rules:
+                    if rule.regex.search(transformed_input):
+                        assert rule.response is not None
+                        memory_text = script.generate_response(
+                            rule.response, match.groups()
+                        )
+                        templates.append(memory_text)
+
+                # Store as a list of templates for this memory
+                stored = self.memory.store(templates)
+                if self.tracer is not None:
+                    if stored:
+                        self.tracer.emit(
+                            TraceEvent(
+                                "memory_store",
+                                keyword,
+                                memory_rule.pattern,
+                                templates,
+                                0.0,
+                            )
+                        )
+                    self._trace_evictions()
+                break  # Only store one memory entry per input
+
+    def recall_memory(self) -> Optional[str]:
+        """
+        Recall a stored memory using rotation like keyword responses.
+
+        Returns:
+            A memory response, or None if no memories are stored
+        """
+        # The last template of the oldest memory; the memory leaves the
+        # queue with its last template
+        response = self.memory.recall()
+        if response is not None and self.tracer is not None:
+            self.tracer.emit(TraceEvent("memory_recall", None, None, response, 0.0))
+        return response
+
+    def _trace_evictions(self) -> None:
+        for templates in self.memory.last_evicted:
+            self.tracer.emit(TraceEvent("memory_evict", None, None, templates, 0.0))
+
+
+RuleIdMap = Dict[int, DecompositionRule]
+_RuleIdMaps = MutableMapping[CompiledScript, RuleIdMap]
+
+# Old script -> new script -> rule_id_map(old, new). A map holds rules of
+# its new script, which may keep that script alive, but nothing here keeps
+# an old script alive: once no session uses it, its maps go with it
+_RULE_ID_MAPS: MutableMapping[CompiledScript, _RuleIdMaps]
+_RULE_ID_MAPS = weakref.WeakKeyDictionary()
+
+
+def rule_id_map(old: CompiledScript, new: CompiledScript) -> RuleIdMap:
+    """
+    Match the rules of two versions of a script by keyword and pattern.
+
+    Cached while the old script lives, since every session rebound after a
+    reload asks for the same map; the result must not be modified.
+
+    Returns:
+        rule_id in old -> the corresponding rule in new
+    """
+    maps = _RULE_ID_MAPS.get(old)
+    if maps is None:
+        maps = _RULE_ID_MAPS[old] = weakref.WeakKeyDictionary()
+    moved = maps.get(new)
+    if moved is not None:
+        return moved
+    new_rules = {
+        (keyword, rule.pattern): rule
+        for keyword, keyword_rule in new.keywords.items()
+        for rule in keyword_rule.rules
+    }
+    moved = maps[new] = {}
+    for keyword, keyword_rule in old.keywords.items():
+        for rule in keyword_rule.rules:
+            new_rule = new_rules.get((keyword, rule.pattern))
+            if new_rule is not None:
+                moved[rule.rule_id] = new_rule
+    return moved
 
-            # Generate the response
-            response = generate_response(response_template, match.groups())
 
-            # Rotate: move used response to end of list (only if more than one response)
-            if len(response_list) > 1:
-                response_list.append(response_list.pop(0))
+# Bump when the pickled form of CompiledScript changes
+CACHE_FORMAT = 7
 
-            return response
 
-    return None
+def script_cache_path(
+    path: str, data: bytes, harden: bool = False, engine: str = "re"
+) -> str:
+    """
+    Where the compiled form of a script is cached.
 
+    The file name carries a SHA-256 of the script's bytes, this module's
+    source, the cache format, whether patterns are hardened and the engine,
+    so editing either file selects a new entry.
+    """
+    digest = hashlib.sha256(data)
+    try:
+        with open(__file__, "rb") as module_file:
+            digest.update(module_file.read())
+    except OSError:
+        pass
+    digest.update(f"{__name__}:{CACHE_FORMAT}:{harden:d}:{engine}".encode())
+
+    directory = CACHE_DIR or os.path.join(
+        os.path.dirname(os.path.abspath(path)), "__pycache__"
+    )
+    name = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(directory, f"{name}.{digest.hexdigest()[:16]}.pickle")
+
+
+def load_script(
+    path: Optional[str] = None,
+    cache: bool = True,
+    harden: Optional[bool] = None,
+    engine: Optional[str] = None,
+) -> CompiledScript:
+    """
+    Load and compile a script, reusing the cached compiled form if present.
 
-def reflect_pronouns(text: str) -> str:
+    A cache hit skips JSON parsing and pattern expansion, and the regexes are
+    compiled as conversations first use them. On a miss the script is
+    compiled and the cache written; a cache that can't be read or written
+    (corrupt file, read-only directory) is ignored.
+
+    Args:
+        path: The JSON script to load (defaults to SCRIPT_PATH)
+        cache: Whether to read and write the cache
+        harden: Whether to harden every pattern (defaults to HARDEN)
+        engine: How to match patterns, one of ENGINES (defaults to ENGINE)
+
+    Returns:
+        The compiled script
     """
-    Apply pronoun reflection and safe keyword substitutions to text.
-    This handles pre_substitutions (ME -> YOU) and safe keyword substitutions like AM -> ARE.
-    We avoid recursive pronoun substitutions (I/YOU/MY/YOUR).
+    path = path or SCRIPT_PATH
+    if harden is None:
+        harden = HARDEN
+    if engine is None:
+        engine = ENGINE
+    with open(path, "rb") as script_file:
+        data = script_file.read()
+    if not cache:
+        return CompiledScript(json.loads(data), harden=harden, engine=engine)
+
+    cache_path = script_cache_path(path, data, harden, engine)
+    try:
+        with open(cache_path, "rb") as cache_file:
+            compiled = pickle.load(cache_file)
+        if isinstance(compiled, CompiledScript):
+            return compiled
+    except Exception:  # pylint: disable=broad-except
+        # Missing, stale or corrupt; rebuild it below
+        pass
+
+    compiled = CompiledScript(json.loads(data), harden=harden, engine=engine)
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        # Write then rename, so concurrent starts never read a partial file
+        temp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as cache_file:
+            pickle.dump(compiled, cache_file, pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, cache_path)
+    except OSError:
+        pass
+    return compiled
+
+
+_default_session: Optional[ElizaSession] = None
+_default_lock = threading.Lock()
+
+
+def get_default_session() -> ElizaSession:
+    """The session behind the module-level functions, loaded on first use."""
+    global _default_session  # pylint: disable=global-statement
+    if _default_session is None:
+        with _default_lock:
+            if _default_session is None:
+                script = load_script()
+                if COMPACT:
+                    # pylint: disable=import-outside-toplevel
+                    from eliza_compact import CompactScript
+
+                    script = CompactScript(script)
+                _default_session = ElizaSession(script)
+    return _default_session
+
+
+if TYPE_CHECKING:
+    # Provided by __getattr__ below; declared for static analysis
+    COMPILED: CompiledScript
+    DEFAULT_SESSION: ElizaSession
+    MEMORY: MemoryStore
+    SCRIPT: dict
+
+
+@functools.lru_cache(maxsize=None)
+def _read_script(path: str) -> dict:
+    """The parsed JSON of a script file, read once per path."""
+    with open(path, "r", encoding="utf-8") as script_file:
+        return json.load(script_file)
+
+
+def __getattr__(name: str) -> Any:
     """
-    words = text.split()
-    # First apply pre_substitutions
-    reflected_words = apply_pre_substitutions(words)
+    Load the default script when COMPILED, DEFAULT_SESSION, MEMORY or SCRIPT
+    is first read, so importing this module doesn't touch the script file.
 
-    # Then apply safe keyword substitutions (avoid pronoun recursion)
-    # Safe substitutions are those that don't involve pronouns
-    safe_substitutions = {
-        "AM": "ARE",
-    }
+    COMPILED is the default compiled script, DEFAULT_SESSION the session
+    behind the module-level functions, MEMORY its queue of stored memories
+    and SCRIPT the parsed JSON of SCRIPT_PATH. SCRIPT is read once and
+    shared, so copy it before changing it.
+    """
+    if name == "COMPILED":
+        return get_default_session().script
+    if name == "DEFAULT_SESSION":
+        return get_default_session()
+    if name == "MEMORY":
+        return get_default_session().memory
+    if name == "SCRIPT":
+        return _read_script(SCRIPT_PATH)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def store_memory(keyword: str, normalized_input: str) -> None:
+    """Store a memory for the input in the default session."""
+    get_default_session().store_memory(keyword, Turn.from_normalized(normalized_input))
+
+
+def recall_memory() -> Optional[str]:
+    """Recall a stored memory from the default session."""
+    return get_default_session().recall_memory()
+
+
+def eliza_response(
+    user_input: str, _history: Optional[List[Tuple[str, str]]] = None
+) -> str:
+    """
+    Generate an ELIZA-style response to user input.
+
+    This continues the conversation held by the default session; use an
+    ElizaSession directly to run several conversations side by side.
+
+    Args:
+        user_input: The user's input text
+        history: Optional list of (user_input, eliza_response) tuples representing
+                conversation history. Used for context-aware responses.
 
-    final_words = []
-    for word in reflected_words:
-        if word in safe_substitutions:
-            final_words.append(safe_substitutions[word])
+    Returns:
+        ELIZA's response as an uppercase string
+    """
+    return get_default_session().respond(user_input)
+
+
+def eliza_respond_batch(items: Iterable[Tuple[ElizaSession, str]]) -> List[str]:
+    """
+    Generate responses for many (session, user input) pairs in one call.
+
+    The result is exactly what calling ``session.respond(user_input)`` for each
+    pair in order would return, rotation and memory updates included, so a
+    session may appear more than once. The stateless work is shared across the
+    batch: identical inputs are normalized once, and inputs are grouped by the
+    keyword they try first so each keyword's rules are matched once per distinct
+    input before the responses are assembled in order.
+
+    Args:
+        items: (session, user input) pairs
+
+    Returns:
+        ELIZA's responses, in input order
+    """
+    items = list(items)
+    prepared: Dict[Tuple[CompiledScript, str], Turn] = {}
+    groups: Dict[Tuple[CompiledScript, KeywordRule], Dict[str, Turn]] = {}
+    caches: Dict[CompiledScript, MatchCache] = {}
+    turns = []
+
+    for session, user_input in items:
+        script = session.script
+        turn = prepared.get((script, user_input))
+        if turn is None:
+            turn = prepared[(script, user_input)] = script.prepare(user_input)
+            keywords = turn.keywords
+            keyword_rule = script.resolve_keyword(keywords[0]) if keywords else None
+            if keyword_rule is not None:
+                group = groups.setdefault((script, keyword_rule), {})
+                group.setdefault(turn.normalized, turn)
+        turns.append(turn)
+
+    # Match each keyword's rules across every input in its group
+    for (script, keyword_rule), group in groups.items():
+        cache = caches.setdefault(script, {})
+        keyword = keyword_rule.keyword
+        match = keyword_rule.match
+        for normalized_input, turn in group.items():
+            cache[(keyword, normalized_input)] = match(
+                script.transform_input(keyword_rule, turn)
+            )
+
+    responses = []
+    for (session, user_input), turn in zip(items, turns):
+        cache = caches.setdefault(session.script, {})
+        if session.tracer is None:
+            response = session.respond_prepared(turn, cache)
         else:
-            final_words.append(word)
-    return " ".join(final_words)
+            response = session.traced_respond(user_input, turn, cache)
+        responses.append(response)
+    return responses
 
 
-def generate_response(template: str, captures: tuple) -> str:
-    """Generate response from template by substituting numbered references with captures."""
-    if not isinstance(template, str):
-        return str(template)
+def apply_pre_substitutions(words: List[str]) -> List[str]:
+    """Apply pre-substitutions to words."""
+    return get_default_session().script.apply_pre_substitutions(words)
 
-    response = template
 
-    for i, capture in enumerate(captures, 1):
-        # Apply pronoun reflection to the captured text
-        reflected_capture = reflect_pronouns(capture.strip())
-        response = re.sub(r"\b" + str(i) + r"\b", reflected_capture, response)
+def truncate_on_delimiters(words: List[str]) -> List[str]:
+    """Apply ELIZA's delimiter rule using the default script."""
+    return get_default_session().script.truncate_on_delimiters(words)
+
+
+def find_keywords(words: List[str]) -> List[Tuple[str, int]]:
+    """Find all keywords present in the input words, return with their ranks."""
+    return get_default_session().script.find_keywords(words)
+
+
+def try_keyword(keyword: str, normalized_input: str) -> Optional[str]:
+    """Try to match patterns for a keyword in the default session."""
+    return get_default_session().try_keyword(
+        keyword, Turn.from_normalized(normalized_input)
+    )
+
+
+def reflect_pronouns(text: str) -> str:
+    """Apply pronoun reflection and safe keyword substitutions to text."""
+    return get_default_session().script.reflect_pronouns(text)
 
-    return response.strip()
+
+def generate_response(template: str, captures: tuple) -> str:
+    """Generate response from template by substituting numbered references with captures."""
+    return get_default_session().script.generate_response(template, captures)
 
 
 class ElizaCmd(cmd.Cmd):
     """Interactive command-line interface for ELIZA chatbot."""
 
-    intro = SCRIPT.get("greeting", "HOW DO YOU DO. PLEASE TELL ME YOUR PROBLEM")
     prompt = "> "
 
+    def __init__(self, session: Optional[ElizaSession] = None) -> None:
+        super().__init__()
+        self.session = session if session is not None else get_default_session()
+        self.intro = self.session.script.greeting
+
     def default(self, line: str) -> None:
         """Handle user input by generating ELIZA response."""
         if line.strip():
-            response = eliza_response(line)
+            response = self.session.respond(line)
             print(response)
 
     def do_quit(self, _arg: str) -> bool:
@@ -374,5 +2838,192 @@ class ElizaCmd(cmd.Cmd):
         return self.do_quit(arg)
 
 
+# Input lines answered per eliza_respond_batch call in batch mode
+BATCH_CHUNK_LINES = 4096
+BATCH_BUFFER_SIZE = 1 << 20
+
+
+def run_batch(
+    lines: Iterable[str],
+    output: IO[str],
+    session: Optional[ElizaSession] = None,
+    output_format: str = "text",
+    line_numbers: bool = False,
+    timings: bool = False,
+) -> int:
+    """
+    Answer every input line as one conversation and write one reply each.
+
+    Unlike ElizaCmd, every line is user input (no commands, no greeting),
+    and a blank line gets a blank reply without taking a turn, so the
+    output lines up with the input. Lines are answered in chunks with
+    eliza_respond_batch and written in one write per chunk.
+
+    Args:
+        lines: The user inputs, with or without line endings
+        output: Where to write the replies
+        session: The conversation (defaults to a new one with the default
+            script)
+        output_format: "text" for one reply per line, or "jsonl" for
+            {"text": ..., "reply": ...} objects
+        line_numbers: Include the 1-based input line number ("line" in
+            jsonl, a tab-separated first column in text)
+        timings: Include each reply's time in microseconds ("us" in jsonl,
+            a tab-separated last column in text); answers line by line
+
+    Returns:
+        Number of lines answered
+    """
+    if output_format not in ("text", "jsonl"):
+        raise ValueError(f"unknown output format: {output_format!r}")
+    if session is None:
+        session = ElizaSession(get_default_session().script)
+    jsonl = output_format == "jsonl"
+    number = 0
+    lines = iter(lines)
+    while True:
+        chunk = [
+            line.rstrip("\r\n") for line in itertools.islice(lines, BATCH_CHUNK_LINES)
+        ]
+        if not chunk:
+            return number
+        texts = [text for text in chunk if text.strip()]
+        micros: List[float] = []
+        if timings:
+            replies = []
+            for text in texts:
+                start = time.perf_counter()
+                replies.append(session.respond(text))
+                micros.append((time.perf_counter() - start) * 1e6)
+        else:
+            replies = eliza_respond_batch([(session, text) for text in texts])
+        answers = iter(zip(replies, micros if timings else itertools.repeat(0.0)))
+
+        rows = []
+        for text in chunk:
+            number += 1
+            reply, elapsed = next(answers) if text.strip() else ("", 0.0)
+            if jsonl:
+                record: Dict[str, Any] = {"text": text, "reply": reply}
+                if line_numbers:
+                    record["line"] = number
+                if timings:
+                    record["us"] = round(elapsed, 1)
+                rows.append(json.dumps(record, ensure_ascii=False))
+            else:
+                columns = [reply]
+                if line_numbers:
+                    columns.insert(0, str(number))
+                if timings:
+                    columns.append(f"{elapsed:.1f}")
+                rows.append("\t".join(columns))
+        rows.append("")
+        output.write("\n".join(rows))
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Run the interactive chat, batch mode with --batch, or a server with --serve."""
+    # Imported here so library users don't pay for it at import time
+    import argparse  # pylint: disable=import-outside-toplevel
+
+    parser = argparse.ArgumentParser(description="ELIZA chatbot")
+    parser.add_argument(
+        "--serve",
+        action="store_true",
+        help="serve newline-delimited JSON conversations over the network",
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="TCP address to bind")
+    parser.add_argument("--port", type=int, default=8023, help="TCP port to bind")
+    parser.add_argument("--unix", metavar="PATH", help="serve on a Unix socket")
+    parser.add_argument(
+        "--max-connections",
+        type=int,
+        default=20000,
+        help="refuse connections beyond this many",
+    )
+    parser.add_argument(
+        "--idle-timeout",
+        type=float,
+        default=300.0,
+        help="close connections idle for this many seconds (0 to disable)",
+    )
+    parser.add_argument(
+        "--store",
+        metavar="PATH",
+        help='keep conversations named by a request\'s "session" in this SQLite file',
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="answer in this many worker processes, sharded by session",
+    )
+    parser.add_argument(
+        "--reload-interval",
+        type=float,
+        default=0.0,
+        metavar="SECONDS",
+        help="reload the script when its file changes, checking this often",
+    )
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="answer each line of stdin as one conversation, one reply per line",
+    )
+    parser.add_argument(
+        "--format",
+        choices=["text", "jsonl"],
+        default="text",
+        help="batch output format",
+    )
+    parser.add_argument(
+        "--line-numbers", action="store_true", help="number batch output lines"
+    )
+    parser.add_argument(
+        "--timings", action="store_true", help="add each reply's time in microseconds"
+    )
+    args = parser.parse_args(argv)
+
+    if args.batch:
+        # Larger buffers than sys.stdin and sys.stdout have, and no flush
+        # per line when stdout is a terminal
+        stdin = open(  # pylint: disable=consider-using-with
+            sys.stdin.fileno(),
+            encoding="utf-8",
+            errors="replace",
+            buffering=BATCH_BUFFER_SIZE,
+            closefd=False,
+        )
+        stdout = open(  # pylint: disable=consider-using-with
+            sys.stdout.fileno(),
+            "w",
+            encoding="utf-8",
+            buffering=BATCH_BUFFER_SIZE,
+            closefd=False,
+        )
+        try:
+            run_batch(stdin, stdout, None, args.format, args.line_numbers, args.timings)
+            stdout.flush()
+        except BrokenPipeError:
+            # The reader went away (| head); stop quietly
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+    elif args.serve:
+        # Imported here so the interactive chat doesn't pay for asyncio
+        from eliza_server import run_server  # pylint: disable=import-outside-toplevel
+
+        run_server(
+            host=args.host,
+            port=args.port,
+            unix_path=args.unix,
+            max_connections=args.max_connections,
+            idle_timeout=args.idle_timeout or None,
+            store_path=args.store,
+            workers=args.workers,
+            reload_interval=args.reload_interval or None,
+        )
+    else:
+        ElizaCmd().cmdloop()
+
+
 if __name__ == "__main__":
-    ElizaCmd().cmdloop()
+    main()
@@ -0,0 +1,131 @@
+"""
+Find script patterns that input can make backtrack catastrophically.
+
+A decomposition pattern such as ``YOU(.*?)I.*`` is searched for anywhere in
+the input, and each wildcard followed by more text is retried at every
+position, so a long input that never completes the match ("YOU YOU YOU
+...") takes time quadratic, cubic or worse in its length. This tool scores
+every keyword and memory pattern with eliza.backtracking_degree and shows
+what eliza.harden_pattern would make of it:
+
+    python eliza_backtrack.py
+    python eliza_backtrack.py my_script.json --all
+
+Scripts compiled with harden=True (or loaded with ELIZA_HARDEN=1) use the
+hardened patterns.
+"""
+
+import argparse
+import re
+import sys
+from typing import Iterator, List, NamedTuple, Optional
+
+import eliza
+
+
+class PatternReport(NamedTuple):
+    """The backtracking analysis of one pattern."""
+
+    keyword: str
+    # "decomposition" or "memory"
+    kind: str
+    pattern: str
+    degree: float
+    hardened: str
+    hardened_degree: float
+    # Longest input the hardened pattern matches, or None if uncapped
+    max_input: Optional[int]
+
+
+_CAP_REGEX = re.compile(r"\\A\(\?=\(\?s:\.\)\{0,(\d+)\}\\Z\)")
+
+
+def analyze(script: eliza.CompiledScript) -> Iterator[PatternReport]:
+    """
+    Analyze every decomposition and memory pattern of a script, in order.
+
+    The patterns are taken as written in the script, so a hardened script
+    reports the same as the plain one.
+    """
+    for keyword_rule in script.keywords.values():
+        for rule in keyword_rule.rules:
+            yield _report(
+                keyword_rule.keyword,
+                "decomposition",
+                rule.pattern,
+                script.expand_pattern(rule.pattern),
+            )
+    for keyword, memory_rules in script.memory_rules.items():
+        for memory_rule in memory_rules:
+            yield _report(
+                keyword,
+                "memory",
+                memory_rule.pattern,
+                script.expand_pattern(memory_rule.pattern),
+            )
+
+
+def _report(keyword: str, kind: str, pattern: str, source: str) -> PatternReport:
+    hardened = eliza.harden_pattern(source)
+    cap = _CAP_REGEX.match(hardened)
+    return PatternReport(
+        keyword,
+        kind,
+        pattern,
+        eliza.backtracking_degree(source),
+        hardened,
+        eliza.backtracking_degree(hardened),
+        int(cap.group(1)) if cap else None,
+    )
+
+
+def format_degree(degree: float) -> str:
+    """n, n^2, ... for a degree, or 2^n for an exponential one."""
+    if degree == float("inf"):
+        return "2^n"
+    if degree <= 0:
+        return "1"
+    return "n" if degree == 1 else f"n^{degree:g}"
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Print the analysis of a script from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "script", nargs="?", help="JSON script (default the bundled one)"
+    )
+    parser.add_argument("--all", action="store_true", help="list linear patterns too")
+    parser.add_argument(
+        "--fail-above",
+        type=float,
+        help="exit with status 1 if a hardened pattern is worse than this degree",
+    )
+    args = parser.parse_args(argv)
+
+    script = eliza.load_script(args.script, harden=False)
+    reports = list(analyze(script))
+    print(f"{'keyword':<12}{'kind':<15}{'before':>8}{'after':>8}{'cap':>8}  pattern")
+    for report in reports:
+        if report.degree <= 1 and not args.all:
+            continue
+        cap = "-" if report.max_input is None else str(report.max_input)
+        print(
+            f"{report.keyword:<12}{report.kind:<15}"
+            f"{format_degree(report.degree):>8}"
+            f"{format_degree(report.hardened_degree):>8}{cap:>8}  {report.pattern}"
+        )
+    superlinear = sum(report.degree > 1 for report in reports)
+    print(
+        f"{len(reports)} patterns, {superlinear} superlinear, "
+        f"{sum(report.max_input is not None for report in reports)} capped "
+        "when hardened",
+        file=sys.stderr,
+    )
+    if args.fail_above is not None and any(
+        report.hardened_degree > args.fail_above for report in reports
+    ):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
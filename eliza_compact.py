@@ -0,0 +1,515 @@
+"""
+An ELIZA script packed into flat arrays, for very large scripts.
+
+A CompiledScript is a graph of small objects: a KeywordRule per keyword, a
+DecompositionRule per pattern, a ResponseTemplate or Directive per
+response and a str for every keyword, pattern and template, each with its
+object header and a pointer from its parent. With 100,000 keywords those
+headers and pointers are most of the script's memory.
+
+A CompactScript holds the same script as a SymbolTable, every distinct
+string stored once in one long string and known by an integer id, and a
+few flat ``array`` tables of ids, ranks, redirects and offsets. It stands
+in for the CompiledScript it was built from, so ElizaSession and the
+module-level eliza_response run on it unchanged (set ELIZA_COMPACT=1 for
+the default session):
+
+    compact = CompactScript(eliza.load_script())
+    session = eliza.ElizaSession(compact)
+
+Its ``keywords``, ``dispatch``, ``rules`` and ``memory_rules`` are
+read-only views that decode a keyword's rules into the usual objects when
+a turn reaches it, keeping the last DECODED_KEYWORDS decoded, so only the
+keywords in use take the space of objects.
+"""
+
+import bisect
+import functools
+import json
+from array import array
+from collections import abc
+from typing import Any, Dict, FrozenSet, Iterator, List, Optional, Union
+
+import eliza
+from eliza import (
+    CompiledScript,
+    DecompositionRule,
+    Directive,
+    KeywordRule,
+    MemoryRule,
+    ResponseTemplate,
+    WordSet,
+)
+
+# Keyword rules (and keywords' MEMORY rules) each CompactScript keeps decoded
+DECODED_KEYWORDS = 1024
+
+# An absent symbol or keyword in the "i" tables
+NONE = -1
+
+
+class SymbolTable:
+    """
+    Strings known by consecutive integer ids, stored end to end in one str.
+
+    Adding a string that is already there returns its id, so each distinct
+    string is kept once. The dictionary that finds them is only needed
+    while adding, and freeze() drops it; strings can be read only after.
+
+    Attributes:
+        text: Every string, joined
+        offsets: Where each string starts in text, and where the last ends
+    """
+
+    __slots__ = ("text", "offsets", "_ids", "_parts")
+
+    def __init__(self) -> None:
+        self.text = ""
+        self.offsets = array("I", [0])
+        self._ids: Optional[Dict[str, int]] = {}
+        self._parts: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, symbol: int) -> str:
+        return self.text[self.offsets[symbol] : self.offsets[symbol + 1]]
+
+    def add(self, text: str) -> int:
+        """The id of a string, added if it is new."""
+        ids = self._ids
+        if ids is None:
+            raise ValueError("add() on a frozen SymbolTable")
+        symbol = ids.get(text)
+        if symbol is None:
+            symbol = ids[text] = len(self)
+            self._parts.append(text)
+            self.offsets.append(self.offsets[-1] + len(text))
+        return symbol
+
+    def freeze(self) -> None:
+        """Join the strings and drop the dictionary; nothing can be added."""
+        self.text = "".join(self._parts)
+        self._ids = None
+        self._parts = []
+
+
+class CompactScript(CompiledScript):
+    """
+    A CompiledScript's keywords, rules and templates in flat arrays.
+
+    Every keyword, pattern, literal, word and template segment is a symbol
+    of ``symbols``. The tables are indexed by keyword (in script order),
+    decomposition rule (by rule_id), response, template and MEMORY rule. A
+    ``*_start`` table has one entry more than there are items: item i owns
+    entries start[i] to start[i + 1] of the table named after it.
+    Identical templates are stored once.
+
+    Nothing is written after construction, and CompiledScript's own
+    methods run on the decoded rules, so every reply is the one the
+    compiled script gives. Unlike a CompiledScript it doesn't pickle its
+    decoded rules, nor anything but the tables.
+
+    Attributes:
+        decoded: How many keywords' rules are kept decoded
+        symbols: Every string of the script
+        keyword_ids: Keyword -> its index
+        keyword_symbol, keyword_rank, keyword_substitution: Each keyword's
+            name, rank and substitution (or NONE)
+        keyword_target: The keyword that answers for each keyword after
+            static redirects (its own index, or NONE; see link_keywords)
+        keyword_rule_start: Each keyword's decomposition rules, which are
+            consecutive since rule ids follow script order
+        rule_pattern, rule_source: Each rule's pattern as written and as
+            compiled (word lists expanded, hardened)
+        rule_engine: Index of each rule's engine in eliza.ENGINES
+        rule_word_sets: 1 for rules that look words up in word_sets
+        rule_groups: Capture groups of each rule's pattern
+        rule_literal_start, literals: The literals of each rule
+        rule_response_start, responses: Each rule's responses: a template
+            index, or ~symbol of a directive's spec as JSON
+        template_start, segments: Each template's literal text (symbols)
+            and slots (negated group numbers), as ResponseTemplate.split
+        memory_keyword, memory_start: MEMORY keywords and their rules
+        memory_pattern, memory_source, memory_engine, memory_word_sets,
+            memory_groups, memory_template: Each MEMORY rule, like the
+            decomposition rule tables
+        word_list_name, word_list_start, word_list_words: The word lists
+    """
+
+    def __init__(self, script: CompiledScript, decoded: int = DECODED_KEYWORDS) -> None:
+        """
+        Pack a compiled script.
+
+        Args:
+            script: The script to pack; it is not modified
+            decoded: How many keywords to keep decoded; a turn that reaches
+                any other decodes it again, which takes far longer than
+                matching its rules
+        """
+        # CompiledScript.__init__ isn't called: what it builds as objects is
+        # packed from the compiled script instead
+        # pylint: disable=super-init-not-called
+        self.harden = script.harden
+        self.engine = script.engine
+        self.greeting = script.greeting
+        self.pre_substitutions = script.pre_substitutions
+        self.reflections = script.reflections
+        self.problems = script.problems
+        self.decoded = decoded
+        symbols = self.symbols = SymbolTable()
+        add = symbols.add
+        templates: Dict[tuple, int] = {}
+
+        def template_index(template: ResponseTemplate) -> int:
+            key = tuple(
+                add(segment) if isinstance(segment, str) else -segment
+                for segment in ResponseTemplate.split(template.text, template.groups)
+            )
+            index = templates.get(key)
+            if index is None:
+                index = templates[key] = len(self.template_start) - 1
+                self.segments.extend(key)
+                self.template_start.append(len(self.segments))
+            return index
+
+        self.template_start = array("I", [0])
+        self.segments = array("i")
+
+        keyword_rules = list(script.keywords.values())
+        self.keyword_symbol = array("I", [add(rule.keyword) for rule in keyword_rules])
+        self.keyword_rank = array("i", [rule.rank for rule in keyword_rules])
+        self.keyword_substitution = array(
+            "i",
+            [
+                NONE if rule.substitution is None else add(rule.substitution)
+                for rule in keyword_rules
+            ],
+        )
+        positions = {keyword: index for index, keyword in enumerate(script.keywords)}
+        self.keyword_target = array(
+            "i",
+            [
+                (
+                    positions[script.dispatch[keyword].keyword]
+                    if keyword in script.dispatch
+                    else NONE
+                )
+                for keyword in script.keywords
+            ],
+        )
+
+        self.keyword_rule_start = array("I", [0])
+        self.rule_pattern = array("I")
+        self.rule_source = array("I")
+        self.rule_engine = array("B")
+        self.rule_word_sets = array("B")
+        self.rule_groups = array("H")
+        self.rule_literal_start = array("I", [0])
+        self.literals = array("I")
+        self.rule_response_start = array("I", [0])
+        self.responses = array("i")
+        for keyword_rule in keyword_rules:
+            for rule in keyword_rule.rules:
+                self.rule_pattern.append(add(rule.pattern))
+                self.rule_source.append(add(rule.source))
+                self.rule_engine.append(eliza.ENGINES.index(rule.engine))
+                self.rule_word_sets.append(rule.word_sets is not None)
+                self.rule_groups.append(_groups(rule))
+                self.literals.extend(map(add, rule.literals))
+                self.rule_literal_start.append(len(self.literals))
+                self.responses.extend(
+                    (
+                        template_index(response)
+                        if isinstance(response, ResponseTemplate)
+                        else ~add(json.dumps(response.spec))
+                    )
+                    for response in rule.responses
+                )
+                self.rule_response_start.append(len(self.responses))
+            self.keyword_rule_start.append(len(self.rule_pattern))
+
+        self.memory_keyword = array("I", map(add, script.memory_rules))
+        self.memory_start = array("I", [0])
+        self.memory_pattern = array("I")
+        self.memory_source = array("I")
+        self.memory_engine = array("B")
+        self.memory_word_sets = array("B")
+        self.memory_groups = array("H")
+        self.memory_template = array("I")
+        for memory_rules in script.memory_rules.values():
+            for memory_rule in memory_rules:
+                assert memory_rule.response is not None
+                self.memory_pattern.append(add(memory_rule.pattern))
+                self.memory_source.append(add(memory_rule.source))
+                self.memory_engine.append(eliza.ENGINES.index(memory_rule.engine))
+                self.memory_word_sets.append(memory_rule.word_sets is not None)
+                self.memory_groups.append(memory_rule.response.groups)
+                self.memory_template.append(template_index(memory_rule.response))
+            self.memory_start.append(len(self.memory_pattern))
+
+        self.word_list_name = array("I", map(add, script.word_lists))
+        self.word_list_start = array("I", [0])
+        self.word_list_words = array("I")
+        for words in script.word_lists.values():
+            self.word_list_words.extend(map(add, words))
+            self.word_list_start.append(len(self.word_list_words))
+
+        symbols.freeze()
+        self._attach()
+
+    def _attach(self) -> None:
+        """Build the lookups, views and caches that aren't pickled."""
+        symbols = self.symbols
+        self.keyword_ids: Dict[str, int] = {
+            symbols[symbol]: index for index, symbol in enumerate(self.keyword_symbol)
+        }
+        self.memory_ids: Dict[str, int] = {
+            symbols[symbol]: index for index, symbol in enumerate(self.memory_keyword)
+        }
+        self._word_sets: Optional[Dict[str, FrozenSet[str]]] = None
+        self.keyword_rule = functools.lru_cache(maxsize=self.decoded)(
+            self._decode_keyword
+        )
+        self._memory_rules = functools.lru_cache(maxsize=self.decoded)(
+            self._decode_memory_rules
+        )
+        self.keywords = KeywordView(self, redirects=False)
+        self.dispatch = KeywordView(self, redirects=True)
+        self.rules = RuleView(self)
+        self.memory_rules = MemoryView(self)
+
+    _ATTACHED = (
+        "keyword_ids",
+        "memory_ids",
+        "_word_sets",
+        "keyword_rule",
+        "_memory_rules",
+        "keywords",
+        "dispatch",
+        "rules",
+        "memory_rules",
+    )
+
+    def __getstate__(self) -> Dict[str, Any]:
+        return {
+            name: value
+            for name, value in self.__dict__.items()
+            if name not in self._ATTACHED
+        }
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._attach()
+
+    @property
+    def word_lists(self) -> Dict[str, List[str]]:  # type: ignore[override]
+        """The script's word lists, decoded on every call."""
+        symbols, start = self.symbols, self.word_list_start
+        return {
+            symbols[name]: [
+                symbols[word]
+                for word in self.word_list_words[start[index] : start[index + 1]]
+            ]
+            for index, name in enumerate(self.word_list_name)
+        }
+
+    @property
+    def word_sets(self) -> Dict[str, FrozenSet[str]]:  # type: ignore[override]
+        """Uppercased words of each list, as CompiledScript.word_sets."""
+        if self._word_sets is None:
+            self._word_sets = {
+                name: WordSet.from_words(words)
+                for name, words in self.word_lists.items()
+            }
+        return self._word_sets
+
+    def rank(self, keyword: str) -> int:
+        return self.keyword_rank[self.keyword_ids[keyword]]
+
+    def template_text(self, template: int) -> str:
+        """A template's text as written in the script."""
+        symbols = self.symbols
+        return "".join(
+            symbols[segment] if segment >= 0 else str(-segment)
+            for segment in self.segments[
+                self.template_start[template] : self.template_start[template + 1]
+            ]
+        )
+
+    def _decode_keyword(self, index: int) -> KeywordRule:
+        symbols = self.symbols
+        start = self.keyword_rule_start
+        substitution = self.keyword_substitution[index]
+        return KeywordRule(
+            symbols[self.keyword_symbol[index]],
+            self.keyword_rank[index],
+            None if substitution == NONE else symbols[substitution],
+            [
+                self._decode_rule(rule_id)
+                for rule_id in range(start[index], start[index + 1])
+            ],
+        )
+
+    def _decode_rule(self, rule_id: int) -> DecompositionRule:
+        symbols = self.symbols
+        # Built field by field: the constructor would work out the
+        # literals again
+        rule = DecompositionRule.__new__(DecompositionRule)
+        rule.rule_id = rule_id
+        rule.pattern = symbols[self.rule_pattern[rule_id]]
+        rule.source = symbols[self.rule_source[rule_id]]
+        self._decode_engine(
+            rule, self.rule_engine[rule_id], self.rule_word_sets[rule_id]
+        )
+        start = self.rule_literal_start
+        rule.literals = tuple(
+            symbols[symbol]
+            for symbol in self.literals[start[rule_id] : start[rule_id + 1]]
+        )
+        groups = self.rule_groups[rule_id]
+        start = self.rule_response_start
+        rule.responses = tuple(
+            (
+                ResponseTemplate(self.template_text(response), groups)
+                if response >= 0
+                else _Directive(self, json.loads(symbols[~response]), groups)
+            )
+            for response in self.responses[start[rule_id] : start[rule_id + 1]]
+        )
+        return rule
+
+    def _decode_memory_rules(self, index: int) -> List[MemoryRule]:
+        symbols = self.symbols
+        memory_rules = []
+        for rule in range(self.memory_start[index], self.memory_start[index + 1]):
+            template = self.template_text(self.memory_template[rule])
+            memory_rule = MemoryRule(
+                symbols[self.memory_pattern[rule]],
+                symbols[self.memory_source[rule]],
+                template,
+            )
+            self._decode_engine(
+                memory_rule, self.memory_engine[rule], self.memory_word_sets[rule]
+            )
+            memory_rule.response = ResponseTemplate(template, self.memory_groups[rule])
+            memory_rules.append(memory_rule)
+        return memory_rules
+
+    def _decode_engine(
+        self, rule: Union[DecompositionRule, MemoryRule], engine: int, word_sets: int
+    ) -> None:
+        # Unset slots read as the defaults, "re" and no word sets
+        if engine:
+            rule.engine = eliza.ENGINES[engine]
+        if word_sets:
+            rule.word_sets = self.word_sets
+
+
+def _groups(rule: DecompositionRule) -> int:
+    """A rule's capture groups, without compiling its pattern if possible."""
+    for response in rule.responses:
+        if isinstance(response, ResponseTemplate):
+            return response.groups
+    return rule.regex.groups
+
+
+class _Directive(Directive):
+    """A Directive whose target is decoded when it is first followed."""
+
+    __slots__ = ("script",)
+
+    def __init__(self, script: CompactScript, spec: dict, groups: int) -> None:
+        super().__init__(spec, groups)
+        self.script = script
+        # Decoding it now could recurse forever, as PRE may lead back here
+        del self.target
+
+    def __getattr__(self, name: str) -> Any:
+        # Only called while the slot is still empty
+        if name != "target":
+            raise AttributeError(name)
+        self.target = self.script.dispatch.get(self.keyword) if self.keyword else None
+        return self.target
+
+
+class KeywordView(abc.Mapping):
+    """
+    A CompactScript's keyword -> KeywordRule mapping, decoded on access.
+
+    With redirects=True it is the script's ``dispatch``: keywords that only
+    redirect map to the rule that answers for them, and keywords whose
+    redirects lead nowhere are left out.
+    """
+
+    __slots__ = ("script", "redirects")
+
+    def __init__(self, script: CompactScript, redirects: bool) -> None:
+        self.script = script
+        self.redirects = redirects
+
+    def _index(self, keyword: str) -> int:
+        index = self.script.keyword_ids.get(keyword, NONE)
+        if index != NONE and self.redirects:
+            index = self.script.keyword_target[index]
+        return index
+
+    def __getitem__(self, keyword: str) -> KeywordRule:
+        index = self._index(keyword)
+        if index == NONE:
+            raise KeyError(keyword)
+        return self.script.keyword_rule(index)
+
+    def __contains__(self, keyword: object) -> bool:
+        return self._index(keyword) != NONE  # type: ignore[arg-type]
+
+    def __iter__(self) -> Iterator[str]:
+        return (keyword for keyword in self.script.keyword_ids if keyword in self)
+
+    def __len__(self) -> int:
+        if not self.redirects:
+            return len(self.script.keyword_ids)
+        return len(self.script.keyword_target) - self.script.keyword_target.count(NONE)
+
+
+class RuleView(abc.Sequence):
+    """A CompactScript's decomposition rules by rule_id, decoded on access."""
+
+    __slots__ = ("script",)
+
+    def __init__(self, script: CompactScript) -> None:
+        self.script = script
+
+    def __len__(self) -> int:
+        return len(self.script.rule_pattern)
+
+    def __getitem__(self, rule_id: int) -> DecompositionRule:  # type: ignore[override]
+        rule_id = range(len(self))[rule_id]
+        start = self.script.keyword_rule_start
+        # The last keyword whose rules start at or before it; any before
+        # that with the same start have no rules
+        index = bisect.bisect_right(start, rule_id) - 1
+        return self.script.keyword_rule(index).rules[rule_id - start[index]]
+
+
+class MemoryView(abc.Mapping):
+    """A CompactScript's keyword -> MEMORY rules, decoded on access."""
+
+    __slots__ = ("script",)
+
+    def __init__(self, script: CompactScript) -> None:
+        self.script = script
+
+    def __getitem__(self, keyword: str) -> List[MemoryRule]:
+        return self.script._memory_rules(  # pylint: disable=protected-access
+            self.script.memory_ids[keyword]
+        )
+
+    def __contains__(self, keyword: object) -> bool:
+        return keyword in self.script.memory_ids
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.script.memory_ids)
+
+    def __len__(self) -> int:
+        return len(self.script.memory_ids)
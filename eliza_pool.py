@@ -0,0 +1,377 @@
+"""
+Multi-process worker pool for ELIZA.
+
+One Python process answers on one core. A WorkerPool runs N worker
+processes and routes every turn of a conversation to the same worker, by a
+stable hash of its session id, so each session's rotation cursors and
+memories live in exactly one process and never need to be shared.
+
+The pool is driven from an asyncio event loop:
+
+    pool = WorkerPool(4)
+    await pool.start()
+    reply = await pool.respond("alice", "Men are all alike.")
+    await pool.close()
+
+Requests for a worker are queued and sent once per event loop pass, and the
+worker answers everything it has received with eliza_respond_batch, so a
+busy pool sends few, large messages. Each worker accepts at most
+max_pending requests at a time; respond() waits for room beyond that, which
+holds back the clients of a worker that falls behind (backpressure). A
+worker that dies is restarted; the requests it had in flight fail with
+WorkerCrashed, and its sessions start over unless they are kept in a
+SQLite store. A turn whose state that store fails to save fails with its
+sqlite3.Error, and the worker goes on.
+"""
+
+import asyncio
+import itertools
+import multiprocessing
+import signal
+import sqlite3
+import threading
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+import eliza
+from eliza_store import MemorySessionStore, SessionManager, SQLiteSessionStore
+
+DEFAULT_MAX_PENDING = 256
+
+
+class WorkerCrashed(RuntimeError):
+    """A worker process died while answering a request."""
+
+
+def shard_for(session_id: str, workers: int) -> int:
+    """
+    The worker index for a session.
+
+    Uses crc32 rather than hash(), which is salted differently in every
+    process, so the mapping is the same across restarts.
+    """
+    return zlib.crc32(session_id.encode("utf-8")) % workers
+
+
+def worker_main(
+    connection: Any, script_path: Optional[str], store_path: Optional[str]
+) -> None:
+    """
+    Answer requests from a WorkerPool until it sends None or goes away.
+
+    The pool sends lists of messages:
+
+        ("respond", request_id, session_id, text, named)
+        ("release", session_id)
+        ("reload",)
+
+    Named sessions go through a SessionManager, so with store_path they are
+    saved to SQLite and survive a worker restart. Other sessions belong to
+    one client connection and are dropped on "release". The worker replies
+    with a list of (request_id, response) pairs per batch, the response
+    being the store's error instead when a named session wasn't saved. On
+    "reload" it loads script_path again; its sessions move to the new
+    version on their next turn.
+    """
+    # Ctrl-C reaches the whole process group; the dispatcher decides when
+    # workers stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    script = eliza.load_script(script_path)
+    if store_path:
+        store: Any = SQLiteSessionStore(store_path)
+    else:
+        store = MemorySessionStore()
+    manager = SessionManager(script, store)
+    anonymous: Dict[str, eliza.ElizaSession] = {}
+
+    running = True
+    try:
+        while running:
+            try:
+                messages = connection.recv()
+            except EOFError:
+                break
+            if messages is None:
+                break
+            # Take everything else already waiting, for one bigger batch
+            while connection.poll():
+                more = connection.recv()
+                if more is None:
+                    running = False
+                    break
+                messages.extend(more)
+
+            request_ids: List[int] = []
+            items: List[Tuple[eliza.ElizaSession, str]] = []
+            named: Dict[str, eliza.ElizaSession] = {}
+            released = []
+            for message in messages:
+                if message[0] == "respond":
+                    _, request_id, session_id, text, is_named = message
+                    if is_named:
+                        session = named[session_id] = manager.get(session_id)
+                    elif session_id in anonymous:
+                        session = anonymous[session_id]
+                        if session.script is not script:
+                            session.rebind(script)
+                    else:
+                        session = anonymous[session_id] = eliza.ElizaSession(script)
+                    request_ids.append(request_id)
+                    items.append((session, text))
+                elif message[0] == "release":
+                    released.append(message[1])
+                else:
+                    # Requests sent before the reload get the old version
+                    if items:
+                        _answer(connection, manager, request_ids, items, named)
+                    try:
+                        script = eliza.load_script(script_path)
+                    except Exception:  # pylint: disable=broad-except
+                        # The pool checked it; keep the old version if the
+                        # file changed again since
+                        continue
+                    manager.script = script
+
+            _answer(connection, manager, request_ids, items, named)
+            for session_id in released:
+                anonymous.pop(session_id, None)
+    finally:
+        manager.close()
+
+
+def _answer(
+    connection: Any,
+    manager: SessionManager,
+    request_ids: List[int],
+    items: List[Tuple[eliza.ElizaSession, str]],
+    named: Dict[str, eliza.ElizaSession],
+) -> None:
+    """Answer the requests collected so far, save named sessions, and reset."""
+    responses: List[Any] = eliza.eliza_respond_batch(items)
+    # The sessions themselves: the manager may have dropped some since
+    unsaved: Dict[int, sqlite3.Error] = {}
+    for session_id, session in named.items():
+        try:
+            manager.store.save(session_id, session.get_state())
+        except sqlite3.Error as error:
+            unsaved[id(session)] = error
+    if unsaved:
+        responses = [
+            unsaved.get(id(session), response)
+            for (session, _), response in zip(items, responses)
+        ]
+    connection.send(list(zip(request_ids, responses)))
+    request_ids.clear()
+    items.clear()
+    named.clear()
+
+
+class _Worker:
+    """The dispatcher's side of one worker process."""
+
+    def __init__(self, index: int, max_pending: int) -> None:
+        self.index = index
+        self.process: Any = None
+        self.connection: Any = None
+        self.generation = 0
+        self.outbox: List[tuple] = []
+        self.in_flight: Dict[int, "asyncio.Future[str]"] = {}
+        self.slots = asyncio.Semaphore(max_pending)
+
+
+class WorkerPool:
+    """
+    Conversations spread over worker processes by session id.
+
+    Attributes:
+        workers: Number of worker processes
+        restarts: Workers restarted after dying
+        turns: Requests answered
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        script_path: Optional[str] = None,
+        store_path: Optional[str] = None,
+        max_pending: int = DEFAULT_MAX_PENDING,
+    ) -> None:
+        """
+        Args:
+            workers: Number of worker processes
+            script_path: Script each worker loads (defaults to SCRIPT_PATH)
+            store_path: SQLite file for named sessions, shared by the workers
+            max_pending: Requests a worker may have in flight before
+                respond() waits
+        """
+        if workers < 1:
+            raise ValueError(f"a pool needs at least one worker, got {workers}")
+        self.workers = workers
+        self.script_path = script_path
+        self.store_path = store_path
+        self.max_pending = max_pending
+        self.restarts = 0
+        self.turns = 0
+        # Workers are spawned rather than forked, so they don't inherit the
+        # event loop or the dispatcher's threads
+        self._context = multiprocessing.get_context("spawn")
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._workers: List[_Worker] = []
+        self._request_ids = itertools.count()
+        self._closing = False
+
+    async def start(self) -> None:
+        """Start the worker processes."""
+        self._loop = asyncio.get_running_loop()
+        self._workers = [
+            _Worker(index, self.max_pending) for index in range(self.workers)
+        ]
+        for worker in self._workers:
+            self._spawn(worker)
+
+    def _spawn(self, worker: _Worker) -> None:
+        parent, child = self._context.Pipe()
+        worker.process = self._context.Process(
+            target=worker_main,
+            args=(child, self.script_path, self.store_path),
+            name=f"eliza-worker-{worker.index}",
+            daemon=True,
+        )
+        worker.process.start()
+        child.close()
+        worker.connection = parent
+        worker.generation += 1
+        threading.Thread(
+            target=self._receive,
+            args=(worker, parent, worker.generation),
+            name=f"eliza-worker-{worker.index}-replies",
+            daemon=True,
+        ).start()
+
+    def _receive(self, worker: _Worker, connection: Any, generation: int) -> None:
+        """Pass a worker's replies to the event loop; runs in its own thread."""
+        loop = self._loop
+        assert loop is not None
+        while True:
+            try:
+                replies = connection.recv()
+            except (EOFError, OSError):
+                break
+            loop.call_soon_threadsafe(self._deliver, worker, replies)
+        try:
+            loop.call_soon_threadsafe(self._worker_died, worker, generation)
+        except RuntimeError:
+            pass  # The event loop has already closed
+
+    def _deliver(self, worker: _Worker, replies: List[Tuple[int, Any]]) -> None:
+        for request_id, response in replies:
+            future = worker.in_flight.pop(request_id, None)
+            if future is not None:
+                worker.slots.release()
+                if isinstance(response, sqlite3.Error):
+                    if not future.done():
+                        future.set_exception(response)
+                    continue
+                self.turns += 1
+                if not future.done():
+                    future.set_result(response)
+
+    def _worker_died(self, worker: _Worker, generation: int) -> None:
+        if generation != worker.generation:
+            return
+        worker.process.join(timeout=1)
+        worker.connection.close()
+        # Requests still queued fail with the ones the worker had; sending
+        # them to its replacement would answer turns already reported lost
+        worker.outbox = []
+        in_flight, worker.in_flight = worker.in_flight, {}
+        for future in in_flight.values():
+            worker.slots.release()
+            if not future.done():
+                future.set_exception(WorkerCrashed(f"worker {worker.index} died"))
+        if not self._closing:
+            self.restarts += 1
+            self._spawn(worker)
+
+    def _send(self, worker: _Worker, message: tuple) -> None:
+        """Queue a message; the queue is sent once per event loop pass."""
+        if not worker.outbox:
+            assert self._loop is not None
+            self._loop.call_soon(self._flush, worker)
+        worker.outbox.append(message)
+
+    def _flush(self, worker: _Worker) -> None:
+        messages, worker.outbox = worker.outbox, []
+        if not messages:
+            return  # Dropped when the worker died
+        try:
+            worker.connection.send(messages)
+        except (OSError, ValueError):
+            # The worker is gone; _worker_died fails its requests
+            pass
+
+    async def respond(self, session_id: str, text: str, named: bool = True) -> str:
+        """
+        Answer one turn of a conversation in its worker.
+
+        Args:
+            session_id: The conversation; all its turns go to one worker
+            text: The user input
+            named: False for a conversation tied to one client connection,
+                which release() should drop when the client leaves
+
+        Raises:
+            WorkerCrashed: If the worker died before answering
+            sqlite3.Error: If the worker's store failed to save a named
+                session's new state
+        """
+        if self._closing:
+            raise RuntimeError("respond() on a closed WorkerPool")
+        worker = self._workers[shard_for(session_id, self.workers)]
+        await worker.slots.acquire()
+        assert self._loop is not None
+        future = self._loop.create_future()
+        request_id = next(self._request_ids)
+        worker.in_flight[request_id] = future
+        self._send(worker, ("respond", request_id, session_id, text, named))
+        return await future
+
+    def release(self, session_id: str) -> None:
+        """Drop a connection's conversation (one sent with named=False)."""
+        if self._workers and not self._closing:
+            worker = self._workers[shard_for(session_id, self.workers)]
+            self._send(worker, ("release", session_id))
+
+    def reload(self) -> None:
+        """
+        Have every worker load script_path again.
+
+        Requests sent before this are answered with the old version. Check
+        the new script first (ScriptReloader does): a worker that can't
+        load it keeps the old one.
+        """
+        if self._closing:
+            return
+        for worker in self._workers:
+            self._send(worker, ("reload",))
+
+    def worker_pids(self) -> List[int]:
+        """Process ids of the current workers, in shard order."""
+        return [worker.process.pid for worker in self._workers]
+
+    async def close(self, timeout: float = 5.0) -> None:
+        """Let the workers finish what they have, then stop them."""
+        self._closing = True
+        for worker in self._workers:
+            if worker.outbox:
+                self._flush(worker)
+            try:
+                worker.connection.send(None)
+            except (OSError, ValueError):
+                pass
+        loop = asyncio.get_running_loop()
+        for worker in self._workers:
+            await loop.run_in_executor(None, worker.process.join, timeout)
+            if worker.process.is_alive():
+                worker.process.terminate()
+                await loop.run_in_executor(None, worker.process.join)
@@ -0,0 +1,314 @@
+"""
+Many named ELIZA scripts in one process, sharing what they have in common.
+
+Script variants (translations, customer rules, A/B candidates) are mostly
+the same rules. A ScriptRegistry compiles each one as usual, then swaps
+every immutable part for a canonical copy held by its Interner: strings,
+compiled regexes, parsed response templates, required literals, word lists
+and their sets, MEMORY rules, and whole decomposition and keyword rules that
+match another script's. Identical parts are then stored once however many
+scripts use them, and an extra tenant costs little more than its own rules.
+
+Sessions keep their mutable state (rotation cursors, memories) to
+themselves, as always, so one compiled script serves every conversation
+of its tenant:
+
+    registry = ScriptRegistry()
+    registry.load("en", "eliza_script.json")
+    registry.load("en-b", "candidate.json")
+    session = registry.session("en-b")
+
+Nothing in a compiled script may be modified once it is registered, since
+its parts may belong to other scripts too.
+"""
+
+import json
+import threading
+from typing import Any, Dict, FrozenSet, Hashable, List, Optional, Tuple
+
+import eliza
+
+
+class Interner:
+    """
+    Canonical copies of immutable script parts.
+
+    Attributes:
+        shared: Parts handed out again instead of being kept twice
+    """
+
+    def __init__(self) -> None:
+        self._strings: Dict[str, str] = {}
+        self._objects: Dict[Hashable, Any] = {}
+        # id of a word set -> (the set, its ranks as a hashable key)
+        self._ranks: Dict[int, Tuple[FrozenSet[str], Hashable]] = {}
+        self.shared = 0
+
+    def __len__(self) -> int:
+        return len(self._strings) + len(self._objects)
+
+    def string(self, text: str) -> str:
+        canonical = self._strings.setdefault(text, text)
+        if canonical is not text:
+            self.shared += 1
+        return canonical
+
+    def strings(self, texts: Tuple[str, ...]) -> Tuple[str, ...]:
+        return self._share(("strings", texts), lambda: tuple(map(self.string, texts)))
+
+    def regex(
+        self,
+        source: str,
+        engine: str = "re",
+        word_sets: Optional[Dict[str, FrozenSet[str]]] = None,
+    ) -> Any:
+        """A pattern compiled the way LazyPattern compiles it."""
+        key = ("regex", engine, source, self._word_sets_key(word_sets))
+        return self._share(key, lambda: eliza.compile_source(source, engine, word_sets))
+
+    def template(self, template: eliza.ResponseTemplate) -> eliza.ResponseTemplate:
+        key = ("template", template.text, template.groups)
+        canonical = self._share(key, lambda: template)
+        if canonical is template:
+            template.text = self.string(template.text)
+            template.format_string = self.string(template.format_string)
+        return canonical
+
+    def _share(self, key: Hashable, make: Any) -> Any:
+        canonical = self._objects.get(key)
+        if canonical is None:
+            canonical = self._objects[key] = make()
+        else:
+            self.shared += 1
+        return canonical
+
+    def intern_script(self, script: eliza.CompiledScript) -> eliza.CompiledScript:
+        """
+        Replace the immutable parts of a compiled script with shared copies.
+
+        Every pattern is compiled here, once per distinct pattern across all
+        scripts interned so far, rather than on first use.
+
+        Returns:
+            The same script
+        """
+        string = self.string
+        script.greeting = string(script.greeting)
+        script.word_lists = {
+            string(name): list(self.strings(tuple(words)))
+            for name, words in script.word_lists.items()
+        }
+        script.word_sets = {
+            string(name): self._share(
+                ("word_set", words, self._rank_key(words)), lambda words=words: words
+            )
+            for name, words in script.word_sets.items()
+        }
+        script.pre_substitutions = {
+            string(word): string(substitute)
+            for word, substitute in script.pre_substitutions.items()
+        }
+        script.reflections = {
+            string(word): string(reflection)
+            for word, reflection in script.reflections.items()
+        }
+
+        shared_rules: Dict[int, eliza.DecompositionRule] = {}
+        rules = list(script.rules)
+        for position, rule in enumerate(rules):
+            rule.pattern = string(rule.pattern)
+            rule.source = string(rule.source)
+            rule.literals = self.strings(rule.literals)
+            if rule.word_sets is not None:
+                rule.word_sets = script.word_sets
+            rule.regex = self.regex(rule.source, rule.engine, rule.word_sets)
+            rule.responses = tuple(
+                (
+                    self.template(response)
+                    if isinstance(response, eliza.ResponseTemplate)
+                    else self._directive(response)
+                )
+                for response in rule.responses
+            )
+            # A rule is shared whole when another script has the same one at
+            # the same rule_id, which session cursors are keyed by; rules
+            # with directives stay per script, as directives point at their
+            # own script's keywords
+            if not any(isinstance(item, eliza.Directive) for item in rule.responses):
+                rule_key = (
+                    "rule",
+                    rule.rule_id,
+                    rule.pattern,
+                    rule.source,
+                    rule.engine,
+                    self._word_sets_key(rule.word_sets),
+                    rule.responses,
+                )
+                shared = self._share(rule_key, lambda rule=rule: rule)
+                rules[position] = shared_rules[id(rule)] = shared
+        script.rules = rules
+
+        keywords = {}
+        for keyword, keyword_rule in script.keywords.items():
+            shareable = all(id(rule) in shared_rules for rule in keyword_rule.rules)
+            keyword_rule.rules = [
+                shared_rules.get(id(rule), rule) for rule in keyword_rule.rules
+            ]
+            keyword_rule.keyword = string(keyword_rule.keyword)
+            if keyword_rule.substitution:
+                keyword_rule.substitution = string(keyword_rule.substitution)
+                keyword_rule.substitution_regex = self._share(
+                    ("substitution", keyword_rule.keyword),
+                    lambda rule=keyword_rule: rule.substitution_regex,
+                )
+            if shareable:
+                key = (
+                    "keyword",
+                    keyword_rule.keyword,
+                    keyword_rule.rank,
+                    keyword_rule.substitution,
+                    tuple(keyword_rule.rules),
+                )
+                keyword_rule = self._share(key, lambda rule=keyword_rule: rule)
+            keywords[string(keyword)] = keyword_rule
+        script.keywords = keywords
+        # Point the dispatch table and directives at the shared keyword rules
+        script.dispatch = script.link_keywords()
+
+        script.memory_rules = {
+            string(keyword): [self._memory_rule(rule, script) for rule in rules]
+            for keyword, rules in script.memory_rules.items()
+        }
+        return script
+
+    def _directive(self, directive: eliza.Directive) -> eliza.Directive:
+        # Directives point at their own script's rules, so they stay per
+        # script; their text is shared
+        if directive.keyword is not None:
+            directive.keyword = self.string(directive.keyword)
+        directive.transformation = tuple(
+            self.string(item) if isinstance(item, str) else item
+            for item in directive.transformation
+        )
+        return directive
+
+    def _memory_rule(
+        self, rule: eliza.MemoryRule, script: eliza.CompiledScript
+    ) -> eliza.MemoryRule:
+        if rule.word_sets is not None:
+            rule.word_sets = script.word_sets
+
+        def adopt() -> eliza.MemoryRule:
+            rule.pattern = self.string(rule.pattern)
+            rule.source = self.string(rule.source)
+            rule.template = self.string(rule.template)
+            rule.regex = self.regex(rule.source, rule.engine, rule.word_sets)
+            if rule.response is not None:
+                rule.response = self.template(rule.response)
+            return rule
+
+        key = (
+            "memory",
+            rule.pattern,
+            rule.source,
+            rule.engine,
+            self._word_sets_key(rule.word_sets),
+            rule.template,
+        )
+        return self._share(key, adopt)
+
+    def _word_sets_key(
+        self, word_sets: Optional[Dict[str, FrozenSet[str]]]
+    ) -> Optional[FrozenSet[Tuple[str, FrozenSet[str], Hashable]]]:
+        """A patterns' word lists as part of a sharing key."""
+        if word_sets is None:
+            return None
+        return frozenset(
+            (name, words, self._rank_key(words)) for name, words in word_sets.items()
+        )
+
+    def _rank_key(self, words: FrozenSet[str]) -> Hashable:
+        """
+        The ranks of a word set (see eliza.WordSet) as part of a sharing key.
+
+        Equal sets from lists in another order may match differently. The
+        key is made once per set and kept with it, so that its hash is too.
+        """
+        held = self._ranks.get(id(words))
+        if held is None or held[0] is not words:
+            ranks = frozenset(getattr(words, "ranks", {}).items())
+            held = self._ranks[id(words)] = (words, ranks)
+        return held[1]
+
+
+class ScriptRegistry:
+    """
+    Compiled scripts by name, sharing their common parts.
+
+    Attributes:
+        interner: Where the shared parts are kept; they stay as long as the
+            registry does, even after the scripts using them are unloaded
+    """
+
+    def __init__(self, interner: Optional[Interner] = None) -> None:
+        self.interner = interner if interner is not None else Interner()
+        self._scripts: Dict[str, eliza.CompiledScript] = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._scripts
+
+    def __len__(self) -> int:
+        return len(self._scripts)
+
+    def names(self) -> List[str]:
+        return list(self._scripts)
+
+    def load(
+        self,
+        name: str,
+        path: Optional[str] = None,
+        script: Optional[dict] = None,
+        strict: bool = False,
+    ) -> eliza.CompiledScript:
+        """
+        Compile a script and register it, replacing any script of that name.
+
+        Args:
+            name: The tenant's name for the script
+            path: JSON script file to load
+            script: An already parsed JSON script, instead of path
+            strict: Raise ScriptError for validation problems
+
+        Returns:
+            The registered script
+        """
+        if script is None:
+            if path is None:
+                raise ValueError("load() needs a path or a script")
+            with open(path, "r", encoding="utf-8") as script_file:
+                script = json.load(script_file)
+        return self.add(
+            name, eliza.CompiledScript(script, strict, eliza.HARDEN, eliza.ENGINE)
+        )
+
+    def add(self, name: str, compiled: eliza.CompiledScript) -> eliza.CompiledScript:
+        """Register an already compiled script, such as one from load_script."""
+        with self._lock:
+            self._scripts[name] = self.interner.intern_script(compiled)
+        return compiled
+
+    def get(self, name: str) -> eliza.CompiledScript:
+        try:
+            return self._scripts[name]
+        except KeyError:
+            raise KeyError(f"no script named {name!r}") from None
+
+    def unload(self, name: str) -> None:
+        """Forget a script; sessions still using it keep working."""
+        with self._lock:
+            self._scripts.pop(name, None)
+
+    def session(self, name: str, tracer: Any = None) -> eliza.ElizaSession:
+        """Start a conversation with a registered script."""
+        return eliza.ElizaSession(self.get(name), tracer)
@@ -0,0 +1,198 @@
+"""
+Reload a script file while conversations are running.
+
+A ScriptReloader holds the current version of a script. reload() compiles
+the file again, checks the new version and, only if it passes, swaps it in
+with a single assignment; a script that fails to load or validate leaves
+the current one in place. Turns already running finish with the version
+they started with, since each session keeps a reference to its script.
+
+Sessions move to the new version at the start of their next turn, with
+ElizaSession.rebind: memories carry over and rotation cursors follow their
+rules by keyword and pattern. The server does this for every connection
+and named session.
+
+Reloads can be triggered by calling reload() or reload_async(), by watch(),
+which polls the file's modification time, or, in the server, by SIGHUP.
+
+    reloader = ScriptReloader("eliza_script.json")
+    server = ElizaServer(reloader=reloader)
+    asyncio.create_task(reloader.watch(interval=1.0))
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+from typing import Callable, List, Optional
+
+import eliza
+
+# Turn run through every new version before it is swapped in
+PROBE_INPUT = "HELLO"
+
+
+class ScriptReloader:
+    """
+    The current version of a script file.
+
+    Attributes:
+        path: The script file
+        strict: Reject scripts with validation problems, not only ones
+            that fail to compile
+        script: The current compiled script
+        version: Number of the current version, starting at 1
+        reloads: Successful reloads
+        failures: Reloads rejected because the new script was invalid
+        last_error: Why the last rejected reload failed
+        compile_seconds: Time the last reload spent compiling and checking
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        script: Optional[eliza.CompiledScript] = None,
+        strict: bool = False,
+    ) -> None:
+        """
+        Args:
+            path: The script file (defaults to SCRIPT_PATH)
+            script: The current version, if already loaded from path
+            strict: Reject scripts with validation problems
+        """
+        self.path = path or eliza.SCRIPT_PATH
+        self.strict = strict
+        self._mtime = self._modified()
+        self.script = script if script is not None else self.compile()
+        self.version = 1
+        self.reloads = 0
+        self.failures = 0
+        self.last_error: Optional[Exception] = None
+        self.compile_seconds = 0.0
+        self._listeners: List[Callable[[eliza.CompiledScript], None]] = []
+        self._lock = threading.Lock()
+
+    def _modified(self) -> Optional[float]:
+        try:
+            return os.stat(self.path).st_mtime
+        except OSError:
+            return None
+
+    def add_listener(self, listener: Callable[[eliza.CompiledScript], None]) -> None:
+        """Call listener with every new version, right after it is swapped in."""
+        self._listeners.append(listener)
+
+    def compile(self) -> eliza.CompiledScript:
+        """
+        Load the script file and check it, without swapping it in.
+
+        Every pattern is compiled and a probe turn is answered, so neither
+        happens for the first time on a request.
+
+        Raises:
+            OSError: If the file can't be read
+            ValueError: If the file isn't valid JSON, or ScriptError if it
+                isn't a working script (or, when strict, has problems)
+        """
+        try:
+            script = eliza.load_script(self.path)
+            if self.strict and script.problems:
+                raise eliza.ScriptError("\n".join(script.problems))
+            for rule in script.rules:
+                _ = rule.regex
+            for keyword_rule in script.keywords.values():
+                _ = keyword_rule.substitution_regex
+            for memory_rules in script.memory_rules.values():
+                for memory_rule in memory_rules:
+                    _ = memory_rule.regex
+            eliza.ElizaSession(script).respond(PROBE_INPUT)
+        except (OSError, ValueError):
+            raise
+        except Exception as error:  # pylint: disable=broad-except
+            # A missing section, a bad regex, a rule that fails on use
+            raise eliza.ScriptError(f"{self.path}: {error!r}") from error
+        return script
+
+    def swap(self, script: eliza.CompiledScript) -> None:
+        """Make script the current version and tell the listeners."""
+        self.script = script
+        self.version += 1
+        self.reloads += 1
+        for listener in self._listeners:
+            listener(script)
+
+    def reload(self) -> eliza.CompiledScript:
+        """
+        Compile the script file again and swap it in if it is valid.
+
+        Returns:
+            The new current script
+
+        Raises:
+            OSError, ValueError: If the new version was rejected; the
+                current one stays in place
+        """
+        with self._lock:
+            script = self._compile_checked()
+            self.swap(script)
+            return script
+
+    async def reload_async(self) -> eliza.CompiledScript:
+        """
+        Like reload(), but compile in a thread so the event loop keeps
+        answering turns meanwhile; the swap happens on the event loop.
+        """
+        loop = asyncio.get_running_loop()
+        script = await loop.run_in_executor(None, self._compile_locked)
+        self.swap(script)
+        return script
+
+    def _compile_locked(self) -> eliza.CompiledScript:
+        with self._lock:
+            return self._compile_checked()
+
+    def _compile_checked(self) -> eliza.CompiledScript:
+        start = time.perf_counter()
+        mtime = self._modified()
+        try:
+            script = self.compile()
+        except (OSError, ValueError) as error:
+            self.failures += 1
+            self.last_error = error
+            # Don't retry the same broken file on every poll
+            self._mtime = mtime
+            raise
+        finally:
+            self.compile_seconds = time.perf_counter() - start
+        self._mtime = mtime
+        self.last_error = None
+        return script
+
+    def changed(self) -> bool:
+        """Whether the file was modified since it was last loaded."""
+        return self._modified() != self._mtime
+
+    async def watch(self, interval: float = 1.0) -> None:
+        """Reload whenever the file changes, checking every interval seconds."""
+        while True:
+            await asyncio.sleep(interval)
+            if self.changed():
+                await self.reload_logged()
+
+    async def reload_logged(self) -> bool:
+        """Reload, reporting the outcome on stderr instead of raising."""
+        try:
+            await self.reload_async()
+        except (OSError, ValueError) as error:
+            print(
+                f"script reload failed, keeping version {self.version}: {error}",
+                file=sys.stderr,
+            )
+            return False
+        print(
+            f"script reloaded as version {self.version}"
+            f" in {self.compile_seconds * 1000:.1f} ms",
+            file=sys.stderr,
+        )
+        return True
@@ -0,0 +1,334 @@
+"""
+Replay logged conversations through a script and write the replies.
+
+Reads a JSONL log with one user turn per line, such as
+
+    {"conversation": "c1", "text": "Men are all alike."}
+
+and writes each record back with a "reply" field added. Each conversation
+gets its own session, so rotation and memory carry over between its turns
+and never leak into another conversation. The turns of a conversation must
+be on consecutive lines; a conversation id that shows up again later is
+replayed as a new conversation, and counted and warned about. With --sort,
+each conversation's turns are gathered from the whole log first instead,
+which holds the log in memory and writes it out conversation by
+conversation.
+
+The log is streamed through a generator pipeline (lines -> records ->
+conversations -> batches), and with --workers the batches are answered in
+that many processes, with a bounded number in flight. Memory use therefore
+depends on the batch size and the longest conversation, not on the size of
+the log (plus the set of conversation ids seen). Output is in input order.
+
+    python eliza_replay.py turns.jsonl -o replies.jsonl --workers 4
+    zcat turns.jsonl.gz | python eliza_replay.py - --script new_script.json
+"""
+
+import argparse
+import itertools
+import json
+import multiprocessing
+import sys
+import threading
+import time
+from typing import (
+    IO,
+    Any,
+    Dict,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+
+import eliza
+
+DEFAULT_BATCH_TURNS = 1000
+# Batches each worker may have queued or in progress
+BATCHES_PER_WORKER = 4
+
+Record = Dict[str, Any]
+Conversation = List[Record]
+
+# The script a worker replays with, loaded by init_worker
+_script: Optional[eliza.CompiledScript] = None
+
+
+class ReplayStats:
+    """
+    Counters for a replay.
+
+    Attributes:
+        turns: Turns replayed
+        conversations: Conversations replayed
+        skipped: Lines that weren't a JSON object with a text string
+        reappeared: Conversations whose id showed up again after other
+            conversations' turns, and so were replayed as new ones
+        seconds: Wall time of the replay
+    """
+
+    def __init__(self) -> None:
+        self.turns = 0
+        self.conversations = 0
+        self.skipped = 0
+        self.reappeared = 0
+        self.seconds = 0.0
+
+    def report(self) -> str:
+        rate = self.turns / self.seconds if self.seconds else 0.0
+        report = (
+            f"replayed {self.turns} turns in {self.conversations} conversations"
+            f" in {self.seconds:.2f} s ({rate:.0f} turns/sec),"
+            f" skipped {self.skipped} lines"
+        )
+        if self.reappeared:
+            report += f", {self.reappeared} conversations reappeared"
+        return report
+
+
+def read_records(lines: Iterable[str], text_key: str, stats: ReplayStats):
+    """Yield the turn records of a JSONL log, skipping unusable lines."""
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            stats.skipped += 1
+            continue
+        if not isinstance(record, dict) or not isinstance(record.get(text_key), str):
+            stats.skipped += 1
+            continue
+        yield record
+
+
+def _id_key(conversation_id: Any) -> Hashable:
+    """A conversation id as a dict key; JSON arrays and objects aren't."""
+    if isinstance(conversation_id, (list, dict)):
+        return json.dumps(conversation_id, sort_keys=True)
+    return conversation_id
+
+
+def group_conversations(
+    records: Iterable[Record],
+    conversation_key: str,
+    stats: Optional[ReplayStats] = None,
+) -> Iterator[Conversation]:
+    """
+    Group consecutive records with the same conversation id.
+
+    An id seen before, with other conversations' turns in between, starts a
+    new conversation all the same; it is counted in stats.reappeared.
+    """
+    seen: Set[Hashable] = set()
+    for conversation_id, turns in itertools.groupby(
+        records, key=lambda record: record.get(conversation_key)
+    ):
+        key = _id_key(conversation_id)
+        if key in seen:
+            if stats is not None:
+                stats.reappeared += 1
+        else:
+            seen.add(key)
+        yield list(turns)
+
+
+def gather_conversations(
+    records: Iterable[Record], conversation_key: str
+) -> Iterator[Conversation]:
+    """
+    Group all records with the same conversation id, wherever they are.
+
+    Reads every record first; conversations come out in the order their
+    ids first appear, each with its turns in log order.
+    """
+    conversations: Dict[Hashable, Conversation] = {}
+    for record in records:
+        key = _id_key(record.get(conversation_key))
+        conversations.setdefault(key, []).append(record)
+    yield from conversations.values()
+
+
+def batch_conversations(
+    conversations: Iterable[Conversation], batch_turns: int
+) -> Iterator[List[Conversation]]:
+    """Pack whole conversations into batches of about batch_turns turns."""
+    batch: List[Conversation] = []
+    size = 0
+    for conversation in conversations:
+        batch.append(conversation)
+        size += len(conversation)
+        if size >= batch_turns:
+            yield batch
+            batch = []
+            size = 0
+    if batch:
+        yield batch
+
+
+def init_worker(script_path: Optional[str]) -> None:
+    """Load the script once per process."""
+    global _script  # pylint: disable=global-statement
+    _script = eliza.load_script(script_path)
+
+
+def replay_batch(
+    batch: List[Conversation], text_key: str, reply_key: str
+) -> Tuple[str, int, int]:
+    """
+    Replay a batch of conversations, each in a fresh session.
+
+    Returns:
+        (output JSONL, turns, conversations); the output is encoded here so
+        the work is spread across processes too
+    """
+    assert _script is not None
+    items: List[Tuple[eliza.ElizaSession, str]] = []
+    for conversation in batch:
+        session = eliza.ElizaSession(_script)
+        items.extend((session, record[text_key]) for record in conversation)
+    replies = iter(eliza.eliza_respond_batch(items))
+    lines = []
+    for conversation in batch:
+        for record in conversation:
+            record[reply_key] = next(replies)
+            lines.append(json.dumps(record, ensure_ascii=False))
+    lines.append("")
+    return "\n".join(lines), len(items), len(batch)
+
+
+def replay(
+    lines: Iterable[str],
+    output: IO[str],
+    script_path: Optional[str] = None,
+    workers: int = 1,
+    batch_turns: int = DEFAULT_BATCH_TURNS,
+    conversation_key: str = "conversation",
+    text_key: str = "text",
+    reply_key: str = "reply",
+    sort: bool = False,
+) -> ReplayStats:
+    """
+    Replay a JSONL log and write the records with their replies.
+
+    Args:
+        lines: The log, one JSON record per line
+        output: Where to write the JSONL result
+        script_path: Script to replay with (defaults to SCRIPT_PATH)
+        workers: Processes to replay in; 1 replays in this process
+        batch_turns: Turns per unit of work sent to a worker
+        conversation_key: Record field holding the conversation id
+        text_key: Record field holding the user input
+        reply_key: Record field to write the reply to
+        sort: Gather each conversation's turns from the whole log, holding
+            it in memory, rather than only consecutive ones
+
+    Returns:
+        The replay's counters
+    """
+    stats = ReplayStats()
+    start = time.perf_counter()
+    records = read_records(lines, text_key, stats)
+    if sort:
+        conversations = gather_conversations(records, conversation_key)
+    else:
+        conversations = group_conversations(records, conversation_key, stats)
+    batches = batch_conversations(conversations, batch_turns)
+
+    def write(result: Tuple[str, int, int]) -> None:
+        text, turns, conversations = result
+        output.write(text)
+        stats.turns += turns
+        stats.conversations += conversations
+
+    if workers <= 1:
+        init_worker(script_path)
+        for batch in batches:
+            write(replay_batch(batch, text_key, reply_key))
+    else:
+        # Pool.imap reads its input as fast as it can, so hold it back to a
+        # fixed number of batches in flight to keep memory constant
+        window = threading.BoundedSemaphore(workers * BATCHES_PER_WORKER)
+
+        def throttled() -> Iterator[List[Conversation]]:
+            for batch in batches:
+                window.acquire()  # pylint: disable=consider-using-with
+                yield batch
+
+        with multiprocessing.Pool(
+            workers, initializer=init_worker, initargs=(script_path,)
+        ) as pool:
+            results = pool.imap(
+                _replay_batch_args,
+                ((batch, text_key, reply_key) for batch in throttled()),
+            )
+            for result in results:
+                window.release()
+                write(result)
+
+    stats.seconds = time.perf_counter() - start
+    return stats
+
+
+def _replay_batch_args(args: Tuple[List[Conversation], str, str]):
+    return replay_batch(*args)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Replay a log from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("log", help="JSONL log to replay, or - for stdin")
+    parser.add_argument("-o", "--output", help="write replies here (default stdout)")
+    parser.add_argument("--script", help="JSON script to replay with")
+    parser.add_argument(
+        "--workers", type=int, default=1, help="processes to replay in (default 1)"
+    )
+    parser.add_argument(
+        "--batch-turns",
+        type=int,
+        default=DEFAULT_BATCH_TURNS,
+        help=f"turns per unit of work (default {DEFAULT_BATCH_TURNS})",
+    )
+    parser.add_argument("--conversation-key", default="conversation")
+    parser.add_argument("--text-key", default="text")
+    parser.add_argument("--reply-key", default="reply")
+    parser.add_argument(
+        "--sort",
+        action="store_true",
+        help="gather each conversation's turns from the whole log (in memory)",
+    )
+    args = parser.parse_args(argv)
+
+    options = {
+        "script_path": args.script,
+        "workers": args.workers,
+        "batch_turns": args.batch_turns,
+        "conversation_key": args.conversation_key,
+        "text_key": args.text_key,
+        "reply_key": args.reply_key,
+        "sort": args.sort,
+    }
+    log = sys.stdin if args.log == "-" else open(args.log, "r", encoding="utf-8")
+    output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        stats = replay(log, output, **options)
+    finally:
+        if log is not sys.stdin:
+            log.close()
+        if output is not sys.stdout:
+            output.close()
+    print(stats.report(), file=sys.stderr)
+    if stats.reappeared:
+        print(
+            f"warning: {stats.reappeared} conversations continued after other"
+            " conversations' turns and were replayed from a fresh session;"
+            " use --sort to replay each as one conversation",
+            file=sys.stderr,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,418 @@
+"""
+Asyncio network server for ELIZA.
+
+Each connection is its own conversation with its own ElizaSession, and all
+connections share one compiled script. The protocol is newline-delimited
+JSON over TCP or a Unix socket:
+
+    <- {"greeting": "HOW DO YOU DO. PLEASE TELL ME YOUR PROBLEM"}
+    -> {"text": "Men are all alike.", "id": 1}
+    <- {"reply": "IN WHAT WAY", "id": 1}
+
+The "id" field is optional and echoed back unchanged. When the server has a
+SessionManager or a WorkerPool, a request with a "session" string belongs
+to that named conversation instead of the connection's, so it can continue
+across connections and, with a durable store, across restarts. With a
+WorkerPool, every conversation is answered in a worker process chosen by its
+session (or connection) id. Malformed requests, and turns whose state the
+store could not save, get an {"error": ...} reply and the connection stays
+open. The server closes a connection with a final {"error": ...} line when
+it is over the connection limit, idle for too long, or shutting down.
+
+With a ScriptReloader, a new version of the script takes over without
+dropping connections: each conversation moves to it at its next turn (see
+eliza_reload), and SIGHUP triggers a reload.
+"""
+
+import asyncio
+import itertools
+import json
+import signal
+import sqlite3
+from typing import Optional, Set, Tuple
+
+import eliza
+from eliza_pool import WorkerCrashed, WorkerPool
+from eliza_reload import ScriptReloader
+from eliza_store import SessionManager, SQLiteSessionStore
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8023
+DEFAULT_MAX_CONNECTIONS = 20000
+DEFAULT_IDLE_TIMEOUT = 300.0
+DEFAULT_MAX_LINE_LENGTH = 64 * 1024
+DEFAULT_SHUTDOWN_GRACE = 5.0
+
+# The reply to a turn whose session the store failed to save; once a
+# SQLiteSessionStore has given up (see its failed attribute), every save fails
+STORE_FAILED = {"error": "session store failed; turn not saved"}
+
+
+def encode_message(message: dict) -> bytes:
+    """Encode one protocol message as a JSON line."""
+    return json.dumps(message, separators=(",", ":")).encode("utf-8") + b"\n"
+
+
+def parse_request(line: bytes) -> Tuple[Optional[dict], Optional[dict]]:
+    """
+    Decode a request line.
+
+    Returns:
+        (request, None) for a valid request, else (request or None, error
+        reply), with the request kept when it can still supply an "id"
+    """
+    try:
+        request = json.loads(line)
+    except ValueError:
+        return None, {"error": "invalid JSON"}
+    if not isinstance(request, dict):
+        return None, {"error": 'expected an object with a "text" string'}
+    if not isinstance(request.get("text"), str):
+        return request, {"error": 'expected an object with a "text" string'}
+    return request, None
+
+
+class ElizaServer:
+    """Serve ELIZA conversations to many concurrent network clients."""
+
+    def __init__(
+        self,
+        script: Optional[eliza.CompiledScript] = None,
+        max_connections: int = DEFAULT_MAX_CONNECTIONS,
+        idle_timeout: Optional[float] = DEFAULT_IDLE_TIMEOUT,
+        max_line_length: int = DEFAULT_MAX_LINE_LENGTH,
+        sessions: Optional[SessionManager] = None,
+        pool: Optional[WorkerPool] = None,
+        reloader: Optional[ScriptReloader] = None,
+    ) -> None:
+        """
+        Args:
+            script: Compiled script shared by every connection
+                (defaults to eliza.COMPILED, or the script of sessions)
+            max_connections: Connections beyond this are refused
+            idle_timeout: Seconds without a request before a connection is
+                closed, or None to wait forever
+            max_line_length: Longest request line accepted, in bytes
+            sessions: Named conversations, for requests with a "session"
+            pool: Started worker pool to answer every request in, instead
+                of this process
+            reloader: Source of new versions of the script, which replace
+                script as they are loaded
+        """
+        if script is None:
+            if reloader is not None:
+                script = reloader.script
+            elif sessions is not None:
+                script = sessions.script
+            else:
+                script = eliza.COMPILED
+        self.script = script
+        self.sessions = sessions
+        self.pool = pool
+        self.reloader = reloader
+        if reloader is not None:
+            reloader.add_listener(self.set_script)
+        self._connection_ids = itertools.count()
+        self.max_connections = max_connections
+        self.idle_timeout = idle_timeout
+        self.max_line_length = max_line_length
+
+        self.turns = 0
+        self._server: Optional[asyncio.Server] = None
+        self._handlers: Set["asyncio.Task[None]"] = set()
+        self._idle_writers: Set[asyncio.StreamWriter] = set()
+        self._shutting_down = False
+
+    def set_script(self, script: eliza.CompiledScript) -> None:
+        """
+        Answer every turn from now on with a new version of the script.
+
+        Turns already running finish with the old version; conversations
+        move to the new one on their next turn.
+        """
+        self.script = script
+        if self.sessions is not None:
+            self.sessions.script = script
+        if self.pool is not None:
+            self.pool.reload()
+
+    @property
+    def connection_count(self) -> int:
+        """Number of currently open connections."""
+        return len(self._handlers)
+
+    async def start_tcp(
+        self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT
+    ) -> asyncio.Server:
+        """Start accepting TCP connections."""
+        self._server = await asyncio.start_server(
+            self._handle_connection, host, port, limit=self.max_line_length
+        )
+        return self._server
+
+    async def start_unix(self, path: str) -> asyncio.Server:
+        """Start accepting connections on a Unix socket."""
+        self._server = await asyncio.start_unix_server(
+            self._handle_connection, path, limit=self.max_line_length
+        )
+        return self._server
+
+    async def shutdown(self, grace: float = DEFAULT_SHUTDOWN_GRACE) -> None:
+        """
+        Stop accepting connections and close the open ones.
+
+        Idle connections are told the server is shutting down and closed
+        right away. Connections in the middle of a turn get up to ``grace``
+        seconds to send their reply before they are cancelled.
+        """
+        self._shutting_down = True
+        if self._server is not None:
+            self._server.close()
+
+        for writer in list(self._idle_writers):
+            self._close_writer(writer, {"error": "server shutting down"})
+
+        if self._handlers:
+            _, pending = await asyncio.wait(set(self._handlers), timeout=grace)
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.wait(pending)
+
+        if self._server is not None:
+            await self._server.wait_closed()
+
+    def _close_writer(
+        self, writer: asyncio.StreamWriter, message: Optional[dict] = None
+    ) -> None:
+        """Close a connection, optionally sending a final message first."""
+        self._idle_writers.discard(writer)
+        if not writer.is_closing():
+            if message is not None:
+                writer.write(encode_message(message))
+            writer.close()
+
+    async def _handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        task = asyncio.current_task()
+        assert task is not None
+        if self._shutting_down or len(self._handlers) >= self.max_connections:
+            self._close_writer(writer, {"error": "too many connections"})
+            return
+
+        self._handlers.add(task)
+        try:
+            await self._converse(reader, writer)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._handlers.discard(task)
+            self._close_writer(writer)
+
+    async def _converse(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """Run one conversation until the client disconnects."""
+        session = eliza.ElizaSession(self.script)
+        connection_id = f"connection-{next(self._connection_ids)}"
+        writer.write(encode_message({"greeting": self.script.greeting}))
+        try:
+            await self._converse_lines(reader, writer, session, connection_id)
+        finally:
+            if self.pool is not None:
+                self.pool.release(connection_id)
+
+    async def _converse_lines(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        session: eliza.ElizaSession,
+        connection_id: str,
+    ) -> None:
+        while not self._shutting_down:
+            self._idle_writers.add(writer)
+            try:
+                line = await asyncio.wait_for(reader.readline(), self.idle_timeout)
+            except asyncio.TimeoutError:
+                self._close_writer(writer, {"error": "idle timeout"})
+                return
+            except ValueError:
+                # The stream limit was exceeded before a newline arrived
+                self._close_writer(writer, {"error": "line too long"})
+                return
+            finally:
+                self._idle_writers.discard(writer)
+
+            if not line:
+                return
+            if not line.strip():
+                continue
+
+            if self.pool is None:
+                reply = self.handle_request(session, line)
+            else:
+                reply = await self.handle_pool_request(connection_id, line)
+            writer.write(encode_message(reply))
+            await writer.drain()
+
+    def handle_request(self, session: eliza.ElizaSession, line: bytes) -> dict:
+        """Answer a single request line for a session."""
+        request, reply = parse_request(line)
+        if reply is None:
+            assert request is not None
+            try:
+                reply = {"reply": self._respond(session, request)}
+            except sqlite3.Error:
+                reply = dict(STORE_FAILED)
+            else:
+                self.turns += 1
+        if request is not None and "id" in request:
+            reply["id"] = request["id"]
+        return reply
+
+    def _respond(self, session: eliza.ElizaSession, request: dict) -> str:
+        """Answer a valid request in its named session or the connection's."""
+        if self.sessions is not None and isinstance(request.get("session"), str):
+            return self.sessions.respond(request["session"], request["text"])
+        if session.script is not self.script:
+            session.rebind(self.script)
+        return session.respond(request["text"])
+
+    async def handle_pool_request(self, connection_id: str, line: bytes) -> dict:
+        """Answer a single request line in the worker pool."""
+        assert self.pool is not None
+        request, reply = parse_request(line)
+        if reply is None:
+            assert request is not None
+            named = isinstance(request.get("session"), str)
+            session_id = request["session"] if named else connection_id
+            try:
+                response = await self.pool.respond(session_id, request["text"], named)
+            except WorkerCrashed:
+                reply = {"error": "worker crashed; conversation restarted"}
+            except sqlite3.Error:
+                reply = dict(STORE_FAILED)
+            else:
+                reply = {"reply": response}
+                self.turns += 1
+        if request is not None and "id" in request:
+            reply["id"] = request["id"]
+        return reply
+
+
+async def serve(
+    server: ElizaServer,
+    host: str = DEFAULT_HOST,
+    port: int = DEFAULT_PORT,
+    unix_path: Optional[str] = None,
+    reload_interval: Optional[float] = None,
+) -> None:
+    """
+    Run a server until SIGINT or SIGTERM, then shut it down gracefully.
+
+    If the server has a reloader, SIGHUP reloads the script, and so does a
+    change to the script file when reload_interval (seconds) is given.
+    """
+    if unix_path:
+        listener = await server.start_unix(unix_path)
+    else:
+        listener = await server.start_tcp(host, port)
+    for sock in listener.sockets:
+        print(f"ELIZA listening on {sock.getsockname()}", flush=True)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+
+    reloader = server.reloader
+    watcher = None
+    if reloader is not None:
+        loop.add_signal_handler(
+            signal.SIGHUP, lambda: asyncio.ensure_future(reloader.reload_logged())
+        )
+        if reload_interval:
+            watcher = asyncio.ensure_future(reloader.watch(reload_interval))
+
+    await stop.wait()
+    if watcher is not None:
+        watcher.cancel()
+    await server.shutdown()
+
+
+def run_server(
+    host: str = DEFAULT_HOST,
+    port: int = DEFAULT_PORT,
+    unix_path: Optional[str] = None,
+    max_connections: int = DEFAULT_MAX_CONNECTIONS,
+    idle_timeout: Optional[float] = DEFAULT_IDLE_TIMEOUT,
+    store_path: Optional[str] = None,
+    workers: int = 0,
+    reload_interval: Optional[float] = None,
+) -> None:
+    """
+    Serve ELIZA on a TCP port or Unix socket until interrupted.
+
+    With store_path, named conversations are kept in that SQLite database.
+    With workers, conversations are answered in that many worker processes.
+    SIGHUP reloads the script, as does a change to its file when
+    reload_interval is given.
+    """
+    reloader = ScriptReloader(eliza.SCRIPT_PATH, eliza.COMPILED)
+    if workers:
+        asyncio.run(
+            serve_with_pool(
+                workers,
+                host,
+                port,
+                unix_path,
+                max_connections,
+                idle_timeout,
+                store_path,
+                reloader,
+                reload_interval,
+            )
+        )
+        return
+
+    sessions = None
+    if store_path:
+        sessions = SessionManager(store=SQLiteSessionStore(store_path))
+    server = ElizaServer(
+        max_connections=max_connections,
+        idle_timeout=idle_timeout,
+        sessions=sessions,
+        reloader=reloader,
+    )
+    try:
+        asyncio.run(serve(server, host, port, unix_path, reload_interval))
+    finally:
+        if sessions is not None:
+            sessions.close()
+
+
+async def serve_with_pool(
+    workers: int,
+    host: str,
+    port: int,
+    unix_path: Optional[str],
+    max_connections: int,
+    idle_timeout: Optional[float],
+    store_path: Optional[str],
+    reloader: Optional[ScriptReloader] = None,
+    reload_interval: Optional[float] = None,
+) -> None:
+    """Run a server backed by a worker pool until SIGINT or SIGTERM."""
+    pool = WorkerPool(workers, store_path=store_path)
+    await pool.start()
+    server = ElizaServer(
+        max_connections=max_connections,
+        idle_timeout=idle_timeout,
+        pool=pool,
+        reloader=reloader,
+    )
+    try:
+        await serve(server, host, port, unix_path, reload_interval)
+    finally:
+        await pool.close()
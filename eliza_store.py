@@ -0,0 +1,337 @@
+"""
+Durable conversation state for ELIZA.
+
+A SessionManager hands out ElizaSessions by id. It loads each one from a
+SessionStore the first time that id sends a message and saves its state
+after every turn. Two stores are provided:
+
+- MemorySessionStore keeps states in a dict, for tests and for servers
+  that don't need to survive a restart.
+- SQLiteSessionStore writes states to a SQLite database from a background
+  thread. Saves only queue the state; the thread commits everything queued
+  since its last commit in one transaction (write-behind with group
+  commit), so a turn never waits on the disk. A session saved several
+  times between commits is written once, with its latest state. A failed
+  commit is retried on a new connection.
+
+    manager = SessionManager(store=SQLiteSessionStore("sessions.db"))
+    manager.respond("alice", "Men are all alike.")
+    manager.close()  # commits whatever is still queued
+"""
+
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import eliza
+
+DEFAULT_FLUSH_INTERVAL = 0.05
+DEFAULT_BATCH_SIZE = 512
+DEFAULT_RETRIES = 5
+DEFAULT_MAX_SESSIONS = 10000
+
+State = Dict[str, Any]
+
+
+class SessionStore:
+    """Where a SessionManager keeps session states between turns."""
+
+    def load(self, session_id: str) -> Optional[State]:
+        """Return the last state saved for a session, or None."""
+        raise NotImplementedError
+
+    def save(self, session_id: str, state: State) -> None:
+        """Save a session's state; it may be written later."""
+        raise NotImplementedError
+
+    def flush(self) -> None:
+        """Wait until every state saved so far is durable."""
+
+    def close(self) -> None:
+        """Flush and release the store."""
+        self.flush()
+
+
+class MemorySessionStore(SessionStore):
+    """Session states in a dict, lost when the process exits."""
+
+    def __init__(self) -> None:
+        self.states: Dict[str, State] = {}
+
+    def load(self, session_id: str) -> Optional[State]:
+        return self.states.get(session_id)
+
+    def save(self, session_id: str, state: State) -> None:
+        self.states[session_id] = state
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Session states in a SQLite database, written behind by a thread.
+
+    Attributes:
+        path: The database file
+        commits: Transactions committed by the writer thread
+        rows_written: Session states written by those transactions
+        error: The last error the writer thread hit, raised by flush()
+        failed: The error the writer thread gave up on; save() raises it
+    """
+
+    def __init__(
+        self,
+        path: str,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        retries: int = DEFAULT_RETRIES,
+    ) -> None:
+        """
+        Args:
+            path: Database file, created if missing
+            flush_interval: How long a saved state waits before its commit,
+                in seconds, unless the batch fills or flush() is called
+            batch_size: Commit early once this many sessions are queued
+            retries: Failed commits in a row, each on a new connection after
+                a longer pause, before the writer thread gives up
+        """
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.retries = retries
+        self.commits = 0
+        self.rows_written = 0
+        self.error: Optional[BaseException] = None
+        self.failed: Optional[BaseException] = None
+
+        # Saved but not yet picked up, and picked up but not yet committed;
+        # load() checks both before the database so it sees its own writes
+        self._pending: Dict[str, State] = {}
+        self._writing: Dict[str, State] = {}
+        self._closing = False
+        self._flushing = 0
+        self._condition = threading.Condition()
+
+        self._reader = self._connect()
+        self._reader.execute(
+            "CREATE TABLE IF NOT EXISTS sessions"
+            " (id TEXT PRIMARY KEY, state TEXT NOT NULL)"
+        )
+        self._reader.commit()
+        self._reader_lock = threading.Lock()
+        self._thread = threading.Thread(
+            target=self._write_loop, name="eliza-session-writer", daemon=True
+        )
+        self._thread.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, check_same_thread=False)
+        # WAL lets load() read while the writer commits; NORMAL syncs at
+        # checkpoints rather than on every commit
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def load(self, session_id: str) -> Optional[State]:
+        with self._condition:
+            state = self._pending.get(session_id) or self._writing.get(session_id)
+        if state is not None:
+            return state
+        with self._reader_lock:
+            row = self._reader.execute(
+                "SELECT state FROM sessions WHERE id = ?", (session_id,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save(self, session_id: str, state: State) -> None:
+        with self._condition:
+            if self._closing:
+                raise ValueError("save() on a closed SQLiteSessionStore")
+            if self.failed is not None:
+                # Nothing queued now would ever be written
+                raise self.failed
+            self._pending[session_id] = state
+            # The first save starts the writer's interval; a full batch ends it
+            if len(self._pending) in (1, self.batch_size):
+                self._condition.notify_all()
+
+    def flush(self) -> None:
+        with self._condition:
+            self._flushing += 1
+            self._condition.notify_all()
+            try:
+                self._condition.wait_for(
+                    lambda: not (self._pending or self._writing)
+                    or self.error is not None
+                    or not self._thread.is_alive()
+                )
+            finally:
+                self._flushing -= 1
+            error, self.error = self.error, None
+        if error is None:
+            error = self.failed
+        if error is not None:
+            raise error
+
+    def close(self) -> None:
+        with self._condition:
+            self._closing = True
+            self._condition.notify_all()
+        self._thread.join()
+        self._reader.close()
+        error, self.error = self.error, None
+        if error is None:
+            error = self.failed
+        if error is not None:
+            raise error
+
+    def _write_loop(self) -> None:
+        connection: Optional[sqlite3.Connection] = None
+        failures = 0
+        try:
+            while True:
+                with self._condition:
+                    # Wait for a first save, then let the batch gather for
+                    # the whole interval so one commit covers it
+                    self._condition.wait_for(lambda: self._pending or self._closing)
+                    self._condition.wait_for(self._commit_due, self.flush_interval)
+                    if not self._pending:
+                        return
+                    self._writing, self._pending = self._pending, {}
+                    batch = self._writing
+
+                try:
+                    if connection is None:
+                        connection = self._connect()
+                    with connection:
+                        connection.executemany(
+                            "INSERT OR REPLACE INTO sessions (id, state)"
+                            " VALUES (?, ?)",
+                            [
+                                (session_id, json.dumps(state, separators=(",", ":")))
+                                for session_id, state in batch.items()
+                            ],
+                        )
+                except sqlite3.Error as error:
+                    if connection is not None:
+                        connection.close()
+                        connection = None
+                    failures += 1
+                    with self._condition:
+                        # Requeue what wasn't overwritten since, and let
+                        # flush() report the error
+                        for session_id, state in batch.items():
+                            self._pending.setdefault(session_id, state)
+                        self._writing = {}
+                        self.error = error
+                        if failures > self.retries:
+                            self.failed = error
+                            return
+                        self._condition.notify_all()
+                        # Back off before trying again on a new connection
+                        self._condition.wait_for(
+                            lambda: self._closing,
+                            self.flush_interval * 2**failures,
+                        )
+                    continue
+
+                failures = 0
+                with self._condition:
+                    self._writing = {}
+                    self.commits += 1
+                    self.rows_written += len(batch)
+                    self._condition.notify_all()
+        finally:
+            if connection is not None:
+                connection.close()
+            with self._condition:
+                self._condition.notify_all()
+
+    def _commit_due(self) -> bool:
+        """Whether the writer should commit before its interval is up."""
+        return (
+            self._closing or self._flushing > 0 or len(self._pending) >= self.batch_size
+        )
+
+
+class SessionManager:
+    """
+    Conversations by id, loaded from a store on first use.
+
+    Sessions stay in memory once loaded, until release() or until more than
+    max_sessions are loaded, when the least recently used ones are dropped;
+    respond() has saved their state, so they resume from the store. Turns
+    of one conversation must not run concurrently.
+
+    Attributes:
+        script: The compiled script every session uses; a stored state only
+            makes sense with the script it was saved under. Sessions in
+            memory move to a new script assigned here on their next turn
+        store: Where session states are saved
+        loaded: Sessions resumed from the store
+        created: Sessions started fresh
+    """
+
+    def __init__(
+        self,
+        script: Optional[eliza.CompiledScript] = None,
+        store: Optional[SessionStore] = None,
+        tracer: Any = None,
+        max_sessions: Optional[int] = DEFAULT_MAX_SESSIONS,
+    ) -> None:
+        """
+        Args:
+            script: The compiled script (defaults to eliza.COMPILED)
+            store: Where states are saved (defaults to a MemorySessionStore)
+            tracer: Passed to every session
+            max_sessions: Most sessions kept in memory, or None for no limit
+        """
+        self.script = script if script is not None else eliza.COMPILED
+        self.store = store if store is not None else MemorySessionStore()
+        self.tracer = tracer
+        self.max_sessions = max_sessions
+        self.loaded = 0
+        self.created = 0
+        # Least recently used first
+        self._sessions: "OrderedDict[str, eliza.ElizaSession]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def get(self, session_id: str) -> eliza.ElizaSession:
+        """The session for an id, resumed from the store the first time."""
+        session = self._sessions.get(session_id)
+        if session is None:
+            state = self.store.load(session_id)
+            if state is None:
+                session = eliza.ElizaSession(self.script, self.tracer)
+                self.created += 1
+            else:
+                session = eliza.ElizaSession.from_state(self.script, state, self.tracer)
+                self.loaded += 1
+            self._sessions[session_id] = session
+            if self.max_sessions is not None:
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+        else:
+            self._sessions.move_to_end(session_id)
+            if session.script is not self.script:
+                # The script was reloaded since this session's last turn
+                session.rebind(self.script)
+        return session
+
+    def respond(self, session_id: str, user_input: str) -> str:
+        """Answer one turn of a conversation and save its new state."""
+        session = self.get(session_id)
+        response = session.respond(user_input)
+        self.store.save(session_id, session.get_state())
+        return response
+
+    def release(self, session_id: str) -> None:
+        """Drop a session from memory; its saved state stays in the store."""
+        self._sessions.pop(session_id, None)
+
+    def close(self) -> None:
+        """Release every session and close the store."""
+        self._sessions.clear()
+        self.store.close()
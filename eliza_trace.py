@@ -0,0 +1,198 @@
+"""
+Tracing hooks for ELIZA sessions.
+
+Attach a tracer to a session to see which path each reply took:
+
+    collector = TraceCollector(slow_turn_seconds=0.001)
+    session = ElizaSession(COMPILED, tracer=collector)
+    session.respond("My mother takes care of me.")
+    print(collector.report())
+
+A tracer is any object with an ``emit(event)`` method that accepts a
+TraceEvent (defined in eliza). Sessions without a tracer skip all of this.
+"""
+
+import heapq
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from eliza import TraceEvent
+
+
+class Tracer:
+    """Base class for tracers; ignores every event."""
+
+    def emit(self, event: TraceEvent) -> None:
+        """Receive one trace event."""
+
+
+class TraceRecorder(Tracer):
+    """Keep every event, in order."""
+
+    def __init__(self) -> None:
+        self.events: List[TraceEvent] = []
+
+    def emit(self, event: TraceEvent) -> None:
+        self.events.append(event)
+
+    def path(self) -> List[str]:
+        """Describe the recorded events one line each, for debugging."""
+        lines = []
+        for event in self.events:
+            parts = [event.kind]
+            if event.keyword is not None:
+                parts.append(event.keyword)
+            if event.pattern is not None:
+                parts.append(repr(event.pattern))
+            parts.append(repr(event.detail))
+            lines.append(" ".join(parts))
+        return lines
+
+
+class TraceCollector(Tracer):
+    """
+    Aggregate trace events into hot rules and slow turns.
+
+    Counts how often each keyword and decomposition pattern is tried and
+    matched, how long pattern tests take in total, and which directives are
+    followed. Turns that take at least ``slow_turn_seconds`` are kept, with
+    the events that make up their path, up to ``max_slow_turns`` of the
+    slowest.
+    """
+
+    def __init__(
+        self, slow_turn_seconds: float = 0.001, max_slow_turns: int = 20
+    ) -> None:
+        self.slow_turn_seconds = slow_turn_seconds
+        self.max_slow_turns = max_slow_turns
+
+        self.turns = 0
+        self.turn_seconds = 0.0
+        self.keyword_tries: Counter = Counter()
+        self.keyword_seconds: Dict[str, float] = defaultdict(float)
+        self.rule_tests: Counter = Counter()
+        self.rule_matches: Counter = Counter()
+        self.rule_seconds: Dict[Tuple[str, str], float] = defaultdict(float)
+        self.directives: Counter = Counter()
+        self.memories_stored = 0
+        self.memories_recalled = 0
+        self.memories_evicted = 0
+        self.fallbacks = 0
+
+        # Min-heap of (elapsed, turn number, user input, response, events)
+        self._slow_turns: list = []
+        self._current: List[TraceEvent] = []
+
+    def emit(self, event: TraceEvent) -> None:
+        kind = event.kind
+        if kind == "turn":
+            self._finish_turn(event)
+            return
+
+        self._current.append(event)
+        if kind == "pattern":
+            assert event.keyword is not None and event.pattern is not None
+            key = (event.keyword, event.pattern)
+            self.rule_tests[key] += 1
+            self.rule_seconds[key] += event.elapsed
+            if event.detail:
+                self.rule_matches[key] += 1
+        elif kind == "keyword":
+            assert event.keyword is not None
+            self.keyword_tries[event.keyword] += 1
+            self.keyword_seconds[event.keyword] += event.elapsed
+        elif kind == "directive":
+            self.directives[(event.keyword, event.detail.get("type"))] += 1
+        elif kind == "memory_store":
+            self.memories_stored += 1
+        elif kind == "memory_recall":
+            self.memories_recalled += 1
+        elif kind == "memory_evict":
+            self.memories_evicted += 1
+        elif kind == "fallback":
+            self.fallbacks += 1
+
+    def _finish_turn(self, event: TraceEvent) -> None:
+        self.turns += 1
+        self.turn_seconds += event.elapsed
+        events, self._current = self._current, []
+        if event.elapsed < self.slow_turn_seconds:
+            return
+
+        user_input, response = event.detail
+        entry = (event.elapsed, self.turns, user_input, response, events)
+        if len(self._slow_turns) < self.max_slow_turns:
+            heapq.heappush(self._slow_turns, entry)
+        else:
+            heapq.heappushpop(self._slow_turns, entry)
+
+    def hot_rules(self, count: int = 10) -> List[Tuple[str, str, int, int, float]]:
+        """
+        The decomposition patterns with the most total test time.
+
+        Returns:
+            (keyword, pattern, tests, matches, seconds) tuples, hottest first
+        """
+        ranked = sorted(self.rule_seconds.items(), key=lambda item: -item[1])
+        hot = []
+        for (keyword, pattern), seconds in ranked[:count]:
+            key = (keyword, pattern)
+            hot.append(
+                (
+                    keyword,
+                    pattern,
+                    self.rule_tests[key],
+                    self.rule_matches[key],
+                    seconds,
+                )
+            )
+        return hot
+
+    def slow_turns(
+        self, count: Optional[int] = None
+    ) -> List[Tuple[float, str, str, List[TraceEvent]]]:
+        """
+        The slowest turns seen, slowest first.
+
+        Returns:
+            (seconds, user input, response, events) tuples
+        """
+        ranked = sorted(self._slow_turns, key=lambda entry: -entry[0])
+        return [
+            (elapsed, user_input, response, events)
+            for elapsed, _, user_input, response, events in ranked[:count]
+        ]
+
+    def report(self, count: int = 10) -> str:
+        """Summarize the collected statistics as text."""
+        lines = [
+            f"turns: {self.turns}, total {self.turn_seconds * 1000:.2f} ms",
+            f"memories stored: {self.memories_stored}, "
+            f"recalled: {self.memories_recalled}, "
+            f"evicted: {self.memories_evicted}, fallbacks: {self.fallbacks}",
+            "",
+            "hot rules (keyword, pattern, tests, matches, ms):",
+        ]
+        for keyword, pattern, tests, matches, seconds in self.hot_rules(count):
+            lines.append(
+                f"  {keyword:<12} {pattern!r:<40} {tests:>7} {matches:>7}"
+                f" {seconds * 1000:>9.3f}"
+            )
+        if self.directives:
+            lines.append("")
+            lines.append("directives followed (keyword, type, count):")
+            for (keyword, kind), total in self.directives.most_common(count):
+                lines.append(f"  {keyword:<12} {kind:<8} {total:>7}")
+        slow = self.slow_turns(count)
+        if slow:
+            lines.append("")
+            lines.append(f"slow turns (>= {self.slow_turn_seconds * 1000:g} ms):")
+            for elapsed, user_input, response, events in slow:
+                path = " > ".join(
+                    event.keyword or "" for event in events if event.kind == "keyword"
+                )
+                lines.append(
+                    f"  {elapsed * 1000:8.3f} ms {user_input!r} -> {response!r}"
+                    f" via {path or 'no keywords'}"
+                )
+        return "\n".join(lines)
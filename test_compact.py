@@ -0,0 +1,79 @@
+"""
+Tests for the array-backed compact script.
+"""
+
+import copy
+import pickle
+
+import pytest
+
+import eliza
+from dialog import ASIDES, DIALOG
+from eliza import COMPILED, SCRIPT, CompiledScript, ElizaSession
+from eliza_compact import CompactScript
+
+
+@pytest.mark.parametrize(
+    "options",
+    [{}, {"harden": True}, {"engine": "tokens"}],
+    ids=["re", "hardened", "tokens"],
+)
+def test_compact_sessions_match_compiled_sessions(options):
+    compiled = CompiledScript(SCRIPT, **options)
+    compact = CompactScript(compiled)
+    plain, packed = ElizaSession(compiled), ElizaSession(compact)
+    for _ in range(3):
+        for text in DIALOG + ASIDES:
+            assert packed.respond(text) == plain.respond(text)
+    assert packed.get_state() == plain.get_state()
+
+
+def test_compact_views_read_like_the_compiled_script():
+    compact = CompactScript(COMPILED)
+    assert list(compact.keywords) == list(COMPILED.keywords)
+    assert list(compact.dispatch) == list(COMPILED.dispatch)
+    assert list(compact.memory_rules) == list(COMPILED.memory_rules)
+    assert compact.word_lists == COMPILED.word_lists
+    assert len(compact.rules) == len(COMPILED.rules)
+    for rule, expected in zip(compact.rules, COMPILED.rules):
+        assert (rule.rule_id, rule.pattern, rule.source, rule.literals) == (
+            expected.rule_id,
+            expected.pattern,
+            expected.source,
+            expected.literals,
+        )
+        assert [getattr(response, "text", None) for response in rule.responses] == [
+            getattr(response, "text", None) for response in expected.responses
+        ]
+    # Decoded rules are kept, and the symbols are stored once
+    assert compact.keywords["COMPUTER"] is compact.keywords["COMPUTER"]
+    assert compact.dispatch["MACHINE"] is compact.keywords["COMPUTER"]
+    assert len(compact.symbols) < sum(1 for _ in compact.symbols.text.split())
+    assert "PLUGH" not in compact.keywords and compact.keywords.get("PLUGH") is None
+    with pytest.raises(TypeError):
+        compact.keywords["PLUGH"] = None
+
+
+def test_compact_script_pickles_its_tables_only():
+    script = copy.deepcopy(SCRIPT)
+    script["keywords"]["LOOP"] = {
+        "responses": {
+            "(.*)": [{"type": "pre", "transformation": ["1"], "target": ["LOOP"]}]
+        }
+    }
+    compiled = CompiledScript(script)
+    compact = CompactScript(compiled)
+    # A PRE that leads back to its own keyword decodes without recursing
+    expected = ElizaSession(compiled).respond("loop again")
+    assert ElizaSession(compact).respond("loop again") == expected
+    restored = pickle.loads(pickle.dumps(compact))
+    assert restored.keyword_rule.cache_info().currsize == 0
+    assert ElizaSession(restored).respond("loop again") == expected
+    assert restored.rank("COMPUTER") == COMPILED.keywords["COMPUTER"].rank
+
+
+def test_default_session_can_run_compact(monkeypatch):
+    monkeypatch.setattr(eliza, "COMPACT", True)
+    monkeypatch.setattr(eliza, "_default_session", None)
+    assert isinstance(eliza.get_default_session().script, CompactScript)
+    assert eliza.eliza_response("Men are all alike.") == "IN WHAT WAY"
@@ -2,8 +2,36 @@
 Test suite for ELIZA chatbot implementation.
 """
 
+import copy
+import io
+import json
+import os
+import pickle
+import re
+import shutil
+import subprocess
+import sys
+
 import pytest
-from eliza import eliza_response, MEMORY
+from eliza import (
+    COMPILED,
+    SCRIPT,
+    SCRIPT_PATH,
+    CompiledScript,
+    ElizaSession,
+    ResponseTemplate,
+    ScriptError,
+    TokenPattern,
+    WordListRegex,
+    backtracking_degree,
+    eliza_respond_batch,
+    eliza_response,
+    harden_pattern,
+    load_script,
+    required_literals,
+    run_batch,
+    MemoryStore,
+)
 
 
 def test_exchange_1():
@@ -99,3 +127,354 @@ def test_exchange_15():
         response
         == "DOES THAT HAVE ANYTHING TO DO WITH THE FACT THAT YOUR BOYFRIEND MADE YOU COME HERE"
     )
+
+
+def test_sessions_are_independent():
+    """Sessions sharing one script keep their own rotation and memory."""
+    first = ElizaSession(COMPILED)
+    second = ElizaSession(COMPILED)
+    assert first.respond("Men are all alike.") == "IN WHAT WAY"
+    assert first.respond("Men are all alike.") == "WHAT RESEMBLANCE DO YOU SEE"
+    assert second.respond("Men are all alike.") == "IN WHAT WAY"
+
+    first.respond("Well, my boyfriend made me come here.")
+    assert first.memory and not second.memory
+
+
+def test_batch_matches_sequential_calls():
+    """A batch gives the same replies and side effects as calls in order."""
+    dialog = [
+        "Men are all alike.",
+        "Well, my boyfriend made me come here.",
+        "Men are all alike.",
+        "Bullies.",
+    ]
+    sequential = ElizaSession(COMPILED)
+    expected = [sequential.respond(text) for text in dialog]
+
+    batched = ElizaSession(COMPILED)
+    other = ElizaSession(COMPILED)
+    items = [(batched, text) for text in dialog] + [(other, dialog[0])]
+    assert eliza_respond_batch(items) == expected + ["IN WHAT WAY"]
+    assert batched.cursors == sequential.cursors
+    assert batched.memory == sequential.memory
+
+
+def test_load_script_cache(tmp_path, monkeypatch):
+    """A cached script is written once and answers like a freshly compiled one."""
+    path = tmp_path / "script.json"
+    shutil.copy(SCRIPT_PATH, path)
+    monkeypatch.setattr("eliza.CACHE_DIR", str(tmp_path / "cache"))
+
+    cold = load_script(str(path))
+    assert len(os.listdir(tmp_path / "cache")) == 1
+    warm = load_script(str(path))
+    assert warm is not cold
+
+    dialog = ["Men are all alike.", "I remember my mother.", "You are afraid of me."]
+    cold_session, warm_session = ElizaSession(cold), ElizaSession(warm)
+    for text in dialog:
+        assert warm_session.respond(text) == cold_session.respond(text)
+
+    # Editing the script selects a new cache entry
+    path.write_text(path.read_text().replace("IN WHAT WAY", "HOW SO"))
+    assert ElizaSession(load_script(str(path))).respond(dialog[0]) == "HOW SO"
+
+
+def test_prepare_tokenizes_once():
+    """A turn keeps the span chosen by the delimiter rule and ranked keywords."""
+    turn = COMPILED.prepare("Well, I remember my mother. And then?")
+    assert turn.tokens == ["I", "REMEMBER", "MY", "MOTHER"]
+    assert (turn.start, turn.end) == (1, 5)
+    assert turn.delimiters == [0, 4]
+    assert turn.normalized == "I REMEMBER MY MOTHER"
+    assert turn.keywords == ["REMEMBER", "MY", "I"]
+
+
+def test_response_templates_are_parsed_once():
+    """Templates become format strings over the groups they use."""
+    template = ResponseTemplate("REALLY, 2 {1} AND 10", 1)
+    assert template.slots == (1,)
+    assert template.format_string == "REALLY, 2 {{{0}}} AND 10"
+    assert template.unknown_groups() == [2, 10]
+    # Captured text is reflected and inserted as is
+    assert COMPILED.generate_response(template, ("  C:\\1 ME  ",)) == (
+        "REALLY, 2 {C:\\1 YOU} AND 10"
+    )
+
+
+def test_script_validation():
+    """References to missing groups are reported, and fatal when strict."""
+    assert COMPILED.problems == [
+        "IF 'IF(.*)': 'REALLY, 2 1' refers to group 2, but the pattern has 1",
+        "MY 'YOUR(.*)': 'IS IT IMPORTANT TO YOU THAT 2 1' refers to group 2,"
+        " but the pattern has 1",
+    ]
+    with pytest.raises(ScriptError, match="REALLY, 2 1"):
+        CompiledScript(SCRIPT, strict=True)
+
+
+def test_redirect_cycles_are_rejected():
+    """Loops through substitutions or gotos fail at compile time."""
+    script = copy.deepcopy(SCRIPT)
+    script["keywords"]["XA"] = {"rank": 0, "responses": {}, "substitution": "XB"}
+    script["keywords"]["XB"] = {
+        "rank": 0,
+        "responses": {"(.*)": [{"type": "goto", "keyword": "XA"}]},
+    }
+    with pytest.raises(ScriptError, match="XA -> XB -> XA|XB -> XA -> XB"):
+        CompiledScript(script)
+
+
+def test_pre_depth_is_bounded():
+    """A PRE directive that rewrites to itself gives up instead of recursing."""
+    script = copy.deepcopy(SCRIPT)
+    script["keywords"]["LOOP"] = {
+        "rank": 50,
+        "responses": {
+            "(.*)": [{"type": "pre", "transformation": ["1"], "target": ["=LOOP"]}]
+        },
+    }
+    compiled = CompiledScript(script)
+    assert compiled.dispatch["HOW"] is compiled.keywords["WHAT"]
+    session = ElizaSession(compiled)
+    assert session.respond("LOOP") in script["keywords"]["NONE"]["responses"][""]
+
+
+def test_memory_store_policies():
+    """Full stores evict per their policy; ttl expires old memories."""
+    oldest = MemoryStore(capacity=2)
+    for name in "ABC":
+        oldest.store([name])
+    assert oldest == [["B"], ["C"]]
+    assert oldest.recall() == "B" and len(oldest) == 1
+
+    newest = MemoryStore(capacity=2, policy="drop_newest")
+    assert [newest.store([name]) for name in "ABC"] == [True, True, False]
+    assert newest == [["A"], ["B"]]
+
+    ttl = MemoryStore(capacity=4, policy="ttl", ttl=2)
+    ttl.store(["A"])
+    ttl.advance()
+    ttl.store(["B"])
+    ttl.advance()
+    ttl.advance()
+    assert ttl == [["B"]] and ttl.last_evicted == [["A"]]
+    assert ttl.stats()["expirations"] == 1
+
+    with pytest.raises(ValueError):
+        MemoryStore(policy="ttl")
+
+
+def test_session_memory_is_bounded():
+    """A long conversation keeps at most capacity memories."""
+    session = ElizaSession(COMPILED, memory=MemoryStore(capacity=3))
+    for _ in range(10):
+        session.respond("My mother is kind")
+    assert len(session.memory) == 3
+    assert session.memory.stats()["evictions"] == 7
+
+
+def test_literal_prefilter_matches_regex_search():
+    """Skipping rules by their literals never changes which rule matches."""
+    assert required_literals("YOU (?:WANT|NEED)(.*)") == ("YOU ",)
+    assert required_literals("i(.*)you") == ("I", "YOU")
+    assert required_literals("(?:AM|IS).*?LIKE.*") == ("LIKE",)
+    keyword_rule = COMPILED.keywords["I"]
+    for text in (
+        "YOU WANT A DOG",
+        "YOU ARE VERY SAD TODAY",
+        "YOU THINK I AM RIGHT",
+        "you feel fine",
+        "YOU FEEL KIND",
+        # Non-ASCII; IGNORECASE matches the Kelvin sign to K
+        "YOU WAS \u212aIND",
+        "NOTHING HERE",
+    ):
+        expected = None
+        for rule in keyword_rule.rules:
+            match = rule.regex.search(text)
+            if match:
+                expected = (rule, match.groups())
+                break
+        found = keyword_rule.match(text)
+        assert (found and (found[0], found[1].groups())) == expected
+
+
+def test_hardened_patterns():
+    """Hardening makes every pattern linear without changing any match."""
+    assert backtracking_degree("I(.*)") == 1
+    assert backtracking_degree("YOU(.*?)I.*") == 2
+    assert backtracking_degree("YOU.*?(?:FEEL|THINK).*?I.*") == 3
+    assert backtracking_degree("(?:A+)*B") == float("inf")
+    assert harden_pattern("I(.*)") == "I(.*)"
+    assert harden_pattern("YOU(.*?)I.*") == r"\A(?>(?s:.*?)YOU)(?>(.*?)I).*"
+    # Nested repeats can't be rewritten, so they are capped instead
+    capped = harden_pattern("(?:A+)*B")
+    assert re.search(capped, "A" * 10 + "B") and not re.search(capped, "A" * 99)
+
+    hardened = CompiledScript(SCRIPT, harden=True)
+    for plain_rule, rule in zip(COMPILED.rules, hardened.rules):
+        assert rule.literals == plain_rule.literals
+        assert backtracking_degree(rule.source) <= 1
+        for text in (
+            "YOU ARE SO SAD",
+            "I KNOW YOU HATE ME",
+            "YOU THINK I AM WRONG",
+            "YOU YOU FEEL THAT I AM",
+            "MY DOG IS LIKE A CAT",
+        ):
+            expected = plain_rule.regex.search(text)
+            match = rule.regex.search(text)
+            assert (match and match.groups()) == (expected and expected.groups())
+
+    # Quadratic for the plain script: minutes instead of milliseconds
+    text = "I " + "YOU ARE " * 10000
+    assert ElizaSession(hardened).respond(text).startswith("IS IT BECAUSE YOU ARE")
+
+
+def test_token_engine():
+    """Word matching makes the regex's choices, on whole words only."""
+    pattern = TokenPattern.parse("I(.*)YOU ((?:FEEL|THINK))(.*)")
+    assert pattern.groups == 3
+    match = pattern.search("WHY I SAY YOU THINK YOU FEEL SO")
+    assert match.groups() == ("SAY YOU THINK", "FEEL", "SO")
+    assert match.group(2) == "FEEL"
+    assert pattern.search("I SAY YOU KNOW") is None
+    lazy = TokenPattern.parse("YOU(.*?)I.*")
+    assert lazy.search("YOU SAID I AM I").groups() == ("SAID",)
+    # The regex also matches the I inside THINK
+    assert lazy.search("YOU THINK SO") is None
+    assert TokenPattern.parse("YOU(?:R|RS)? .*") is None
+
+    tokens = CompiledScript(SCRIPT, engine="tokens")
+    for plain_rule, rule in zip(COMPILED.rules, tokens.rules):
+        assert isinstance(rule.regex, TokenPattern)
+        assert rule.regex.groups == plain_rule.regex.groups
+    session = ElizaSession(tokens)
+    assert session.respond("Men are all alike.") == "IN WHAT WAY"
+    assert session.respond("Well, my boyfriend made me come here.") == (
+        "YOUR BOYFRIEND MADE YOU COME HERE"
+    )
+    with pytest.raises(ValueError, match="unknown engine"):
+        CompiledScript(SCRIPT, engine="glob")
+
+
+def test_word_list_sets():
+    """The tokens engine looks word list words up in a shared set."""
+    script = copy.deepcopy(SCRIPT)
+    script["word_lists"]["FAMILY"] += [f"RELATIVE{number}" for number in range(100000)]
+    compiled = CompiledScript(script, engine="tokens")
+    family = next(rule for rule in compiled.rules if "/FAMILY" in rule.pattern)
+    assert isinstance(family.regex, TokenPattern)
+    assert family.regex.word_lists == ("FAMILY",)
+    assert family.regex.search("YOUR RELATIVE99999 IS HERE").groups() == (
+        "RELATIVE99999",
+        "IS HERE",
+    )
+    # A list word inside another word is no list word
+    assert family.regex.search("YOUR MOTHERBOARD IS HERE") is None
+    session = ElizaSession(compiled)
+    assert session.respond("My relative42 takes care of me.") == (
+        "TELL ME MORE ABOUT YOUR FAMILY"
+    )
+    # Lists are shared, and an unknown list leaves the pattern to the regex
+    assert compiled.rules[0].word_sets in (None, compiled.word_sets)
+    assert compiled.pattern_source("YOUR (/PETS)(.*)")[1] is None
+
+    # The regex engine expands lists and matches characters, as it always has
+    family = next(rule for rule in COMPILED.rules if "/FAMILY" in rule.pattern)
+    assert not isinstance(family.regex, TokenPattern)
+    assert ElizaSession(COMPILED).respond("My sisters hate me.") == (
+        "TELL ME MORE ABOUT YOUR FAMILY"
+    )
+
+
+def test_word_list_regex():
+    """Long lists are looked up in sets under the regex engine, same matches."""
+    script = copy.deepcopy(SCRIPT)
+    family = script["word_lists"]["FAMILY"]
+    # An alternation tries its words in order: MOM before MOMMY, SISTERS
+    # after SISTER
+    family += [f"RELATIVE{number}" for number in range(1000)] + ["MOMMY", "SISTERS"]
+    compiled = CompiledScript(script)
+    rule = next(rule for rule in compiled.rules if "/FAMILY" in rule.pattern)
+    assert isinstance(rule.regex, WordListRegex)
+    expanded = re.compile(compiled.expand_pattern(rule.pattern), re.IGNORECASE)
+    for text in (
+        "YOUR RELATIVE999 IS HERE",
+        "YOUR RELATIVE12 AND RELATIVE1 ARE HERE",
+        "YOUR MOMMY AND YOUR SISTERS",
+        "your relative7x",
+        "YOUR \u017fISTER",
+        "YOUR FRIEND",
+    ):
+        match = rule.regex.search(text)
+        expected = expanded.search(text)
+        assert (match and match.groups()) == (expected and expected.groups()), text
+    assert rule.regex.search("YOUR MOMMY").group(1) == "MOM"
+
+    session = ElizaSession(compiled)
+    assert session.respond("My relative42 takes care of me.") == (
+        "TELL ME MORE ABOUT YOUR FAMILY"
+    )
+    # Hardening needs the alternation spelled out
+    hardened = CompiledScript(script, harden=True)
+    assert not isinstance(hardened.rules[rule.rule_id].regex, WordListRegex)
+    loaded = pickle.loads(pickle.dumps(compiled))
+    assert loaded.word_sets["FAMILY"].ranks == compiled.word_sets["FAMILY"].ranks
+    assert loaded.rules[rule.rule_id].regex.search("YOUR MOMMY").group(1) == "MOM"
+
+
+def test_rotation_cursors():
+    """Rotation lives in the session's cursor array, never in the script."""
+    script = CompiledScript(SCRIPT)
+    before = pickle.dumps(script)
+    rule = script.keywords["SORRY"].rules[0]
+    session = ElizaSession(script)
+    replies = [session.respond("sorry") for _ in range(len(rule.responses) + 1)]
+    assert replies[:-1] == [response.text for response in rule.responses]
+    assert replies[-1] == replies[0]
+    assert len(session.cursors) == rule.rule_id + 1
+    assert session.cursors[rule.rule_id] == 1
+
+    snapshot = session.snapshot_cursors()
+    after_snapshot = [session.respond("sorry") for _ in range(3)]
+    session.restore_cursors(snapshot)
+    assert [session.respond("sorry") for _ in range(3)] == after_snapshot
+    assert snapshot[rule.rule_id] == 1
+    assert pickle.dumps(script) == before
+
+    resumed = ElizaSession.from_state(script, session.get_state())
+    assert resumed.get_state() == session.get_state()
+    assert ElizaSession(script).get_state()["cursors"] == []
+
+
+def test_batch_mode():
+    """Batch mode answers line by line, keeping blank lines aligned."""
+    lines = ["Men are all alike.\n", "\n", "My mother takes care of me.\n"]
+    session = ElizaSession(COMPILED)
+    expected = [session.respond(lines[0]), "", session.respond(lines[2])]
+
+    output = io.StringIO()
+    assert run_batch(lines, output, ElizaSession(COMPILED)) == 3
+    assert output.getvalue().splitlines() == expected
+
+    output = io.StringIO()
+    run_batch(lines, output, ElizaSession(COMPILED), "jsonl", True, True)
+    records = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert [record["reply"] for record in records] == expected
+    assert [record["line"] for record in records] == [1, 2, 3]
+    assert records[0]["text"] == "Men are all alike." and records[0]["us"] > 0
+
+    result = subprocess.run(
+        [sys.executable, "eliza.py", "--batch", "--line-numbers"],
+        input="".join(lines),
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    assert result.stdout.splitlines() == [
+        f"{number}\t{reply}" for number, reply in enumerate(expected, 1)
+    ]
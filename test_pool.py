@@ -0,0 +1,135 @@
+"""
+Tests for the multi-process worker pool.
+"""
+
+import asyncio
+import json
+import multiprocessing
+import os
+import signal
+import sqlite3
+import threading
+import time
+
+import pytest
+from dialog import DIALOG
+from eliza import COMPILED, SCRIPT_PATH, ElizaSession
+from eliza_pool import WorkerCrashed, WorkerPool, _answer, shard_for
+from eliza_store import MemorySessionStore, SessionManager
+
+
+def test_shards_are_stable():
+    """The same session always maps to the same worker."""
+    assert shard_for("alice", 4) == shard_for("alice", 4)
+    assert {shard_for(f"user{n}", 4) for n in range(100)} == {0, 1, 2, 3}
+
+
+def test_pool_matches_sessions_and_restarts_workers():
+    """Interleaved conversations answer as their own sessions would."""
+
+    async def scenario():
+        pool = WorkerPool(2, max_pending=4)
+        await pool.start()
+        names = [f"user{n}" for n in range(6)]
+        reference = {name: ElizaSession(COMPILED) for name in names}
+        for text in DIALOG:
+            replies = await asyncio.gather(
+                *(pool.respond(name, text) for name in names)
+            )
+            assert replies == [reference[name].respond(text) for name in names]
+
+        # Kill a worker mid-request: that request fails, the worker restarts
+        # and its sessions start over
+        victim = pool.worker_pids()[shard_for("user0", 2)]
+        request = asyncio.ensure_future(pool.respond("user0", DIALOG[0]))
+        await asyncio.sleep(0)
+        os.kill(victim, signal.SIGKILL)
+        try:
+            await request
+        except WorkerCrashed:
+            pass
+        while pool.restarts == 0:
+            await asyncio.sleep(0.01)
+        assert await pool.respond("user0", DIALOG[0]) == "IN WHAT WAY"
+        assert pool.worker_pids()[shard_for("user0", 2)] != victim
+        await pool.close()
+
+    asyncio.run(scenario())
+
+
+def test_pool_drops_queued_requests_of_a_dead_worker():
+    """Requests failed with a dead worker never reach its replacement."""
+
+    async def scenario():
+        pool = WorkerPool(1)
+        await pool.start()
+        assert await pool.respond("alice", "sorry") == "PLEASE DON'T APOLIGIZE"
+        victim = pool.worker_pids()[0]
+        requests = [
+            asyncio.ensure_future(pool.respond("alice", "sorry")) for _ in range(3)
+        ]
+        os.kill(victim, signal.SIGKILL)
+        # Block until the reply thread has reported the death, so the pool
+        # hears of it after the requests are queued but before they are sent
+        while any(
+            thread.name == "eliza-worker-0-replies" for thread in threading.enumerate()
+        ):
+            time.sleep(0.01)
+        for request in requests:
+            with pytest.raises(WorkerCrashed):
+                await request
+        # The new worker's "alice" starts over rather than three turns in
+        assert await pool.respond("alice", "sorry") == "PLEASE DON'T APOLIGIZE"
+        assert pool.restarts == 1 and pool.turns == 2
+        await pool.close()
+
+    asyncio.run(scenario())
+
+
+def test_pool_reload_keeps_sessions(tmp_path):
+    """Workers answer queued turns, then load the new script in place."""
+    path = str(tmp_path / "script.json")
+    with open(SCRIPT_PATH, "r", encoding="utf-8") as script_file:
+        script = json.load(script_file)
+    with open(path, "w", encoding="utf-8") as script_file:
+        json.dump(script, script_file)
+
+    async def scenario():
+        pool = WorkerPool(1, script_path=path)
+        await pool.start()
+        assert await pool.respond("alice", "sorry") == "PLEASE DON'T APOLIGIZE"
+        script["keywords"]["SORRY"]["responses"][""][1] = "NO APOLOGY NEEDED"
+        with open(path, "w", encoding="utf-8") as script_file:
+            json.dump(script, script_file)
+        before = asyncio.ensure_future(pool.respond("bob", "sorry"))
+        await asyncio.sleep(0)
+        pool.reload()
+        assert await before == "PLEASE DON'T APOLIGIZE"
+        assert await pool.respond("alice", "sorry") == "NO APOLOGY NEEDED"
+        await pool.close()
+
+    asyncio.run(scenario())
+
+
+def test_worker_answers_past_a_store_failure():
+    """An unsaved named session gets the store's error; the rest still answer."""
+
+    class FailingStore(MemorySessionStore):
+        """A store that has given up, as a SQLiteSessionStore does."""
+
+        def save(self, session_id, state):
+            raise sqlite3.OperationalError("disk I/O error")
+
+    manager = SessionManager(COMPILED, FailingStore())
+    alice = manager.get("alice")
+    items = [(alice, DIALOG[0]), (ElizaSession(COMPILED), DIALOG[0])]
+    ours, theirs = multiprocessing.Pipe()
+    _answer(theirs, manager, [1, 2], items, {"alice": alice})
+    (first, error), second = ours.recv()
+    assert first == 1 and isinstance(error, sqlite3.OperationalError)
+    assert second == (2, "IN WHAT WAY")
+
+
+def test_pool_needs_a_worker():
+    with pytest.raises(ValueError):
+        WorkerPool(0)
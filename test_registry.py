@@ -0,0 +1,71 @@
+"""
+Tests for the multi-tenant script registry.
+"""
+
+import copy
+
+import pytest
+
+from dialog import ASIDES, DIALOG
+from eliza import COMPILED, SCRIPT, SCRIPT_PATH, ElizaSession
+from eliza_registry import ScriptRegistry
+
+
+def test_variants_share_compiled_parts():
+    base = copy.deepcopy(SCRIPT)
+    variant = copy.deepcopy(base)
+    variant["greeting"] = "HOLA"
+    variant["keywords"]["SORRY"]["responses"][""][0] = "NO NEED TO APOLOGIZE"
+
+    registry = ScriptRegistry()
+    first = registry.load("base", script=base)
+    second = registry.load("variant", script=variant)
+    assert registry.names() == ["base", "variant"] and "variant" in registry
+
+    assert all(a.regex is b.regex for a, b in zip(first.rules, second.rules))
+    assert first.keywords["COMPUTER"] is second.keywords["COMPUTER"]
+    assert first.keywords["SORRY"] is not second.keywords["SORRY"]
+    assert (
+        first.keywords["SORRY"].rules[0].responses[1]
+        is second.keywords["SORRY"].rules[0].responses[1]
+    )
+    assert first.memory_rules["MY"][0] is second.memory_rules["MY"][0]
+    assert second.greeting == "HOLA"
+
+
+def test_registry_sessions_match_plain_sessions():
+    """Sharing parts changes no response, and sessions stay separate."""
+    registry = ScriptRegistry()
+    registry.load("a", SCRIPT_PATH)
+    registry.load("b", script=copy.deepcopy(SCRIPT))
+    plain = ElizaSession(COMPILED)
+    turns = DIALOG + ASIDES
+    expected = [plain.respond(text) for text in turns]
+
+    first, second = registry.session("a"), registry.session("b")
+    assert [first.respond(text) for text in turns] == expected
+    assert [second.respond(text) for text in turns] == expected
+
+    registry.unload("a")
+    assert len(registry) == 1
+    with pytest.raises(KeyError, match="no script named 'a'"):
+        registry.get("a")
+
+
+def test_word_lists_in_another_order_are_not_shared():
+    """An alternation tries its words in order, so list order is kept apart."""
+    base = copy.deepcopy(SCRIPT)
+    base["word_lists"]["FAMILY"] += [f"RELATIVE{number}" for number in range(100)]
+    base["word_lists"]["FAMILY"].append("MOMMY")
+    variant = copy.deepcopy(base)
+    variant["word_lists"]["FAMILY"].remove("MOM")
+    variant["word_lists"]["FAMILY"].append("MOM")
+
+    registry = ScriptRegistry()
+    first = registry.load("base", script=base)
+    second = registry.load("variant", script=variant)
+    assert first.word_sets["FAMILY"] is not second.word_sets["FAMILY"]
+    rule = next(rule for rule in first.rules if "/FAMILY" in rule.pattern)
+    assert rule.regex.search("YOUR MOMMY").group(1) == "MOM"
+    rule = second.rules[rule.rule_id]
+    assert rule.regex.search("YOUR MOMMY").group(1) == "MOMMY"
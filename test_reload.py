@@ -0,0 +1,109 @@
+"""
+Tests for reloading the script while conversations go on.
+"""
+
+import copy
+import gc
+import json
+import os
+import weakref
+
+import pytest
+
+from eliza import SCRIPT, CompiledScript, ElizaSession, ScriptError, rule_id_map
+from eliza_reload import ScriptReloader
+from eliza_server import ElizaServer
+from eliza_store import SessionManager
+
+
+def write_script(path, script):
+    with open(path, "w", encoding="utf-8") as script_file:
+        json.dump(script, script_file)
+    # Make sure the change is seen even within the file system's timestamp
+    # resolution
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+
+def ask(server, session, text, name=None):
+    request = {"text": text}
+    if name is not None:
+        request["session"] = name
+    return server.handle_request(session, json.dumps(request).encode())["reply"]
+
+
+def test_reload_keeps_conversations(tmp_path):
+    """Sessions move to the new version with their cursors and memories."""
+    path = str(tmp_path / "script.json")
+    script = copy.deepcopy(SCRIPT)
+    write_script(path, script)
+    reloader = ScriptReloader(path)
+    server = ElizaServer(reloader=reloader, sessions=SessionManager(reloader.script))
+    session = ElizaSession(server.script)
+
+    for name in (None, "alice"):
+        assert ask(server, session, "sorry", name) == "PLEASE DON'T APOLIGIZE"
+        assert ask(server, session, "sorry", name) == "APOLOGIES ARE NOT NECESSARY"
+    ask(server, session, "My mother takes care of me.")
+    assert len(session.memory) == 1
+
+    # A new first keyword shifts every rule_id; cursors follow their rules
+    script["keywords"] = {
+        "WIDGET": {"rank": 0, "responses": {"": ["TELL ME ABOUT WIDGETS"]}},
+        **script["keywords"],
+    }
+    script["keywords"]["SORRY"]["responses"][""][2] = "NO APOLOGY NEEDED"
+    write_script(path, script)
+    assert reloader.changed()
+    old = server.script
+    new = reloader.reload()
+    assert server.script is new is not old and reloader.version == 2
+    assert not reloader.changed()
+
+    for name in (None, "alice"):
+        assert ask(server, session, "sorry", name) == "NO APOLOGY NEEDED"
+    assert session.script is new and len(session.memory) == 1
+    assert ask(server, session, "widget") == "TELL ME ABOUT WIDGETS"
+
+
+@pytest.mark.parametrize(
+    "broken, error",
+    [
+        ("{not json", ValueError),
+        ({"keywords": {"X": {"responses": {"(": ["OOPS"]}}}}, ScriptError),
+        ({"greeting": "HI"}, ScriptError),
+    ],
+)
+def test_invalid_script_is_not_swapped_in(tmp_path, broken, error):
+    path = str(tmp_path / "script.json")
+    write_script(path, copy.deepcopy(SCRIPT))
+    reloader = ScriptReloader(path)
+    current = reloader.script
+
+    if isinstance(broken, str):
+        with open(path, "w", encoding="utf-8") as script_file:
+            script_file.write(broken)
+    else:
+        write_script(path, broken)
+    with pytest.raises(error):
+        reloader.reload()
+    assert reloader.script is current
+    assert (reloader.version, reloader.failures) == (1, 1)
+    assert isinstance(reloader.last_error, error)
+    # The broken version isn't retried until the file changes again
+    assert not reloader.changed()
+
+
+def test_rebinding_does_not_keep_the_old_script():
+    """The cached rule map goes away with the script sessions left behind."""
+    old, new = CompiledScript(SCRIPT), CompiledScript(SCRIPT)
+    session = ElizaSession(old)
+    session.respond("Men are all alike.")
+    session.rebind(new)
+    assert rule_id_map(old, new) is rule_id_map(old, new)
+
+    replaced = weakref.ref(old)
+    del old
+    gc.collect()
+    assert replaced() is None
+    assert session.respond("Men are all alike.") == "WHAT RESEMBLANCE DO YOU SEE"
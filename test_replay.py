@@ -0,0 +1,71 @@
+"""
+Tests for the transcript replay tool.
+"""
+
+import io
+import json
+
+from dialog import DIALOG
+from eliza import COMPILED, ElizaSession
+from eliza_replay import replay
+
+
+def make_log(conversations):
+    lines = []
+    for conversation in range(conversations):
+        for turn, text in enumerate(DIALOG):
+            record = {"conversation": f"c{conversation}", "turn": turn, "text": text}
+            lines.append(json.dumps(record) + "\n")
+    return lines
+
+
+def expected_replies():
+    session = ElizaSession(COMPILED)
+    return [session.respond(text) for text in DIALOG]
+
+
+def test_replay_in_process():
+    """Each conversation gets its own session; bad lines are skipped."""
+    lines = make_log(3) + ["not json\n", '{"conversation": "c9"}\n', "\n"]
+    output = io.StringIO()
+    stats = replay(lines, output, batch_turns=7)
+    records = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert [record["reply"] for record in records] == expected_replies() * 3
+    assert records[0] == {
+        "conversation": "c0",
+        "turn": 0,
+        "text": DIALOG[0],
+        "reply": "IN WHAT WAY",
+    }
+    assert (stats.turns, stats.conversations, stats.skipped) == (3 * len(DIALOG), 3, 2)
+
+
+def test_replay_in_workers():
+    """Worker processes give the same output, in input order."""
+    lines = make_log(20)
+    serial = io.StringIO()
+    replay(lines, serial, batch_turns=10)
+    parallel = io.StringIO()
+    stats = replay(lines, parallel, workers=2, batch_turns=10)
+    assert parallel.getvalue() == serial.getvalue()
+    assert stats.turns == 20 * len(DIALOG)
+
+
+def test_replay_counts_conversations_that_reappear():
+    """Interleaved turns are split unless the log is sorted first."""
+    lines = make_log(2)
+    # Move c0's last turn after c1's turns
+    lines.append(lines.pop(len(DIALOG) - 1))
+    output = io.StringIO()
+    stats = replay(lines, output)
+    assert (stats.conversations, stats.reappeared) == (3, 1)
+    assert "1 conversations reappeared" in stats.report()
+
+    output = io.StringIO()
+    stats = replay(lines, output, sort=True)
+    records = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert [record["reply"] for record in records] == expected_replies() * 2
+    assert [record["conversation"] for record in records[: len(DIALOG)]] == [
+        "c0"
+    ] * len(DIALOG)
+    assert (stats.conversations, stats.reappeared) == (2, 0)
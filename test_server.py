@@ -0,0 +1,136 @@
+"""
+Tests for the asyncio ELIZA server, using local clients only.
+"""
+
+import asyncio
+import json
+import sqlite3
+
+from eliza_pool import WorkerPool
+from eliza_server import STORE_FAILED, ElizaServer
+from eliza_store import SessionManager, SQLiteSessionStore
+
+
+async def open_client(port):
+    """Connect to the server and consume the greeting."""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    greeting = json.loads(await reader.readline())
+    assert "greeting" in greeting
+    return reader, writer
+
+
+async def ask(reader, writer, request):
+    """Send one request and return the decoded reply."""
+    writer.write(json.dumps(request).encode() + b"\n")
+    await writer.drain()
+    return json.loads(await reader.readline())
+
+
+async def start(**kwargs):
+    server = ElizaServer(**kwargs)
+    listener = await server.start_tcp("127.0.0.1", 0)
+    return server, listener.sockets[0].getsockname()[1]
+
+
+def test_each_connection_has_its_own_conversation():
+    async def scenario():
+        server, port = await start()
+        first = await open_client(port)
+        second = await open_client(port)
+
+        reply = await ask(*first, {"text": "Men are all alike.", "id": 7})
+        assert reply == {"reply": "IN WHAT WAY", "id": 7}
+        reply = await ask(*first, {"text": "Men are all alike."})
+        assert reply == {"reply": "WHAT RESEMBLANCE DO YOU SEE"}
+        reply = await ask(*second, {"text": "Men are all alike."})
+        assert reply == {"reply": "IN WHAT WAY"}
+
+        assert "error" in await ask(*first, ["not", "an", "object"])
+        await server.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_connection_limit():
+    async def scenario():
+        server, port = await start(max_connections=1)
+        await open_client(port)
+        reader, _ = await asyncio.open_connection("127.0.0.1", port)
+        assert json.loads(await reader.readline()) == {"error": "too many connections"}
+        await server.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_idle_timeout_and_shutdown():
+    async def scenario():
+        server, port = await start(idle_timeout=0.05)
+        reader, _ = await open_client(port)
+        assert json.loads(await reader.readline()) == {"error": "idle timeout"}
+        assert await reader.readline() == b""
+
+        server.idle_timeout = None
+        reader, _ = await open_client(port)
+        await server.shutdown()
+        assert json.loads(await reader.readline()) == {"error": "server shutting down"}
+        assert server.connection_count == 0
+
+    asyncio.run(scenario())
+
+
+def test_named_sessions_continue_across_connections():
+    async def scenario():
+        server, port = await start(sessions=SessionManager())
+        first = await open_client(port)
+        request = {"text": "Men are all alike.", "session": "alice"}
+        assert await ask(*first, request) == {"reply": "IN WHAT WAY"}
+        first[1].close()
+
+        second = await open_client(port)
+        reply = await ask(*second, request)
+        assert reply == {"reply": "WHAT RESEMBLANCE DO YOU SEE"}
+        await server.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_worker_pool_server():
+    async def scenario():
+        pool = WorkerPool(2)
+        await pool.start()
+        server, port = await start(pool=pool)
+        first = await open_client(port)
+        second = await open_client(port)
+        for expected in ("IN WHAT WAY", "WHAT RESEMBLANCE DO YOU SEE"):
+            reply = await ask(*first, {"text": "Men are all alike.", "id": 1})
+            assert reply == {"reply": expected, "id": 1}
+        reply = await ask(*second, {"text": "Men are all alike."})
+        assert reply == {"reply": "IN WHAT WAY"}
+        assert "error" in await ask(*second, {"id": 2})
+        await server.shutdown()
+        await pool.close()
+
+    asyncio.run(scenario())
+
+
+def test_store_failure_is_an_error_reply(tmp_path):
+    """Once the store gives up, named turns fail but the connection stays."""
+    path = str(tmp_path / "sessions.db")
+    store = SQLiteSessionStore(path, flush_interval=0.001, retries=0)
+    with sqlite3.connect(path) as other:
+        other.execute("DROP TABLE sessions")
+    store.save("bob", {})
+    store._thread.join()  # pylint: disable=protected-access
+    assert store.failed is not None
+
+    async def scenario():
+        server, port = await start(sessions=SessionManager(store=store))
+        client = await open_client(port)
+        request = {"text": "Men are all alike.", "session": "alice", "id": 1}
+        assert await ask(*client, request) == {**STORE_FAILED, "id": 1}
+        reply = await ask(*client, {"text": "Men are all alike."})
+        assert reply == {"reply": "IN WHAT WAY"}
+        assert server.turns == 1
+        await server.shutdown()
+
+    asyncio.run(scenario())
@@ -0,0 +1,111 @@
+"""
+Tests for session persistence.
+"""
+
+import sqlite3
+
+import pytest
+
+from dialog import DIALOG
+from eliza import COMPILED, ElizaSession, MemoryStore
+from eliza_store import MemorySessionStore, SessionManager, SQLiteSessionStore
+
+
+def test_session_state_round_trip():
+    """A session resumed from its state answers as the original would."""
+    original = ElizaSession(COMPILED, memory=MemoryStore(capacity=5))
+    for text in DIALOG[:8]:
+        original.respond(text)
+    resumed = ElizaSession.from_state(COMPILED, original.get_state())
+    assert resumed.memory == original.memory
+    assert resumed.memory.capacity == 5
+    for text in DIALOG[8:] + DIALOG:
+        assert resumed.respond(text) == original.respond(text)
+
+
+def test_memory_session_store():
+    """Sessions load lazily and continue where they left off."""
+    store = MemorySessionStore()
+    first = SessionManager(COMPILED, store)
+    reference = ElizaSession(COMPILED)
+    for text in DIALOG[:5]:
+        assert first.respond("alice", text) == reference.respond(text)
+    assert first.created == 1 and first.loaded == 0
+
+    second = SessionManager(COMPILED, store)
+    assert len(second) == 0
+    for text in DIALOG[5:]:
+        assert second.respond("alice", text) == reference.respond(text)
+    assert second.loaded == 1
+
+
+def test_sqlite_session_store_survives_restart(tmp_path):
+    """States written behind by the SQLite store are there after reopening."""
+    path = str(tmp_path / "sessions.db")
+    reference = {name: ElizaSession(COMPILED) for name in ("alice", "bob")}
+
+    first = SessionManager(COMPILED, SQLiteSessionStore(path, flush_interval=10))
+    for text in DIALOG[:6]:
+        for name, session in reference.items():
+            assert first.respond(name, text) == session.respond(text)
+    # Nothing committed yet: a released session reloads from the queue
+    first.release("alice")
+    assert first.respond("alice", DIALOG[6]) == reference["alice"].respond(DIALOG[6])
+    first.close()
+    assert first.store.commits == 1 and first.store.rows_written == 2
+
+    second = SessionManager(COMPILED, SQLiteSessionStore(path))
+    for text in DIALOG[7:]:
+        assert second.respond("alice", text) == reference["alice"].respond(text)
+    second.close()
+
+
+def test_sqlite_session_store_retries_after_an_error(tmp_path):
+    """A failed commit is reported by flush() and retried, not abandoned."""
+    path = str(tmp_path / "sessions.db")
+    store = SQLiteSessionStore(path, flush_interval=0.01)
+    with sqlite3.connect(path) as other:
+        other.execute("DROP TABLE sessions")
+    store.save("alice", {"turn": 1})
+    with pytest.raises(sqlite3.OperationalError):
+        store.flush()
+    with sqlite3.connect(path) as other:
+        other.execute(
+            "CREATE TABLE sessions (id TEXT PRIMARY KEY, state TEXT NOT NULL)"
+        )
+    store.flush()
+    store.close()
+    assert store.commits == 1
+    reopened = SQLiteSessionStore(path)
+    assert reopened.load("alice") == {"turn": 1}
+    reopened.close()
+
+
+def test_sqlite_session_store_gives_up_after_retries(tmp_path):
+    """Once the writer stops retrying, save() raises instead of queueing."""
+    path = str(tmp_path / "sessions.db")
+    store = SQLiteSessionStore(path, flush_interval=0.001, retries=2)
+    with sqlite3.connect(path) as other:
+        other.execute("DROP TABLE sessions")
+    store.save("alice", {"turn": 1})
+    store._thread.join()  # pylint: disable=protected-access
+    assert isinstance(store.failed, sqlite3.OperationalError)
+    with pytest.raises(sqlite3.OperationalError):
+        store.save("bob", {"turn": 1})
+    with pytest.raises(sqlite3.OperationalError):
+        store.close()
+
+
+def test_session_manager_evicts_least_recently_used():
+    """Past max_sessions, idle sessions leave memory and resume from the store."""
+    store = MemorySessionStore()
+    manager = SessionManager(COMPILED, store, max_sessions=2)
+    reference = {name: ElizaSession(COMPILED) for name in ("alice", "bob", "carol")}
+    for text in DIALOG[:4]:
+        for name in ("alice", "bob", "alice", "carol"):
+            assert manager.respond(name, text) == reference[name].respond(text)
+    assert len(manager) == 2
+    assert manager.created == 3 and manager.loaded > 0
+    for text in DIALOG[4:]:
+        for name, session in reference.items():
+            assert manager.respond(name, text) == session.respond(text)
@@ -0,0 +1,48 @@
+"""
+Tests for the LISP reader in to_json.
+"""
+
+import json
+import re
+
+import pytest
+from eliza import SCRIPT_PATH
+from to_json import LispSyntaxError, build_script, read_expressions
+
+
+def test_appendix_converts_to_the_shipped_script():
+    """The appendix still converts to eliza_script.json."""
+    with open(SCRIPT_PATH, "r", encoding="utf-8") as script_file:
+        assert build_script() == json.load(script_file)
+
+
+def test_reader_yields_nested_lists_and_lines():
+    """Data come out one at a time, with the line each starts on."""
+    text = "START\n(A (B (C)) D)\n(E\n F)\n"
+    assert list(read_expressions(text.splitlines())) == [
+        ("START", 1),
+        (["A", ["B", ["C"]], "D"], 2),
+        (["E", "F"], 3),
+    ]
+
+
+def test_reader_handles_deep_nesting():
+    """Nesting deeper than the recursion limit reads fine."""
+    depth = 20000
+    [(datum, _)] = read_expressions(["(" * depth + "X" + ")" * depth])
+    for _ in range(depth - 1):
+        datum = datum[0]
+    assert datum == ["X"]
+
+
+@pytest.mark.parametrize(
+    "text, message",
+    [
+        ("(A B)\n(C))", "line 2, column 4: unmatched ')'"),
+        ("(A B)\n  (C (D)\n", "line 2, column 3: unclosed '('"),
+    ],
+)
+def test_reader_reports_unbalanced_parentheses(text, message):
+    """Syntax errors carry the line and column of the bad parenthesis."""
+    with pytest.raises(LispSyntaxError, match=re.escape(message)):
+        list(read_expressions(text.splitlines()))
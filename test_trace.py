@@ -0,0 +1,42 @@
+"""
+Tests for the ELIZA tracing hooks.
+"""
+
+from eliza import COMPILED, ElizaSession
+from eliza_trace import TraceCollector, TraceRecorder
+
+
+def test_recorder_follows_redirects_and_directives():
+    recorder = TraceRecorder()
+    session = ElizaSession(COMPILED, tracer=recorder)
+    assert session.respond("I'm depressed.") == "I AM SORRY TO HEAR YOU ARE DEPRESSED"
+
+    kinds = [event.kind for event in recorder.events]
+    assert kinds[-1] == "turn"
+    directive = next(e for e in recorder.events if e.kind == "directive")
+    assert directive.keyword == "I'M" and directive.detail["type"] == "pre"
+    # The PRE directive hands the rewritten input to I, inside the I'M attempt
+    keywords = [e.keyword for e in recorder.events if e.kind == "keyword"]
+    assert keywords == ["I", "I'M"]
+
+
+def test_collector_aggregates_rules_memory_and_slow_turns():
+    collector = TraceCollector(slow_turn_seconds=0.0, max_slow_turns=2)
+    session = ElizaSession(COMPILED, tracer=collector)
+    session.respond("Well, my boyfriend made me come here.")
+    session.respond("Bullies.")
+    session.respond("Men are all alike.")
+
+    assert collector.turns == 3
+    assert collector.memories_stored == 1
+    assert collector.memories_recalled == 1
+    assert ("MY", "YOUR(.*)") in collector.rule_matches
+    assert len(collector.slow_turns()) == 2
+    assert "hot rules" in collector.report()
+
+
+def test_tracing_does_not_change_responses():
+    dialog = ["Men are all alike.", "You are afraid of me.", "Bullies.", "Hmm."]
+    plain = ElizaSession(COMPILED)
+    traced = ElizaSession(COMPILED, tracer=TraceCollector())
+    assert [plain.respond(t) for t in dialog] == [traced.respond(t) for t in dialog]
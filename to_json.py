@@ -1,15 +1,83 @@
+import argparse
 import json
+import os
 import re
-from typing import Any
+import sys
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
 
+APPENDIX_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "weizenbaum_1966_appendix.txt"
+)
 
-def parse_eliza_script():
-    """Parse the original ELIZA script from the appendix into a structured JSON format."""
+# A parsed LISP datum: an atom or a (possibly nested) list of data
+Expression = Union[str, List["Expression"]]
+
+# One token per match: a parenthesis or a run of other non-space characters
+TOKEN_REGEX = re.compile(r"[()]|[^\s()]+")
+
+
+class LispSyntaxError(ValueError):
+    """Unbalanced parentheses in a script, with the 1-based line and column."""
+
+    def __init__(self, message: str, line: int, column: int) -> None:
+        super().__init__(f"line {line}, column {column}: {message}")
+        self.line = line
+        self.column = column
+
+
+def read_expressions(
+    lines: Iterable[str],
+) -> Iterator[Tuple[Expression, int]]:
+    """
+    Read top-level LISP data from lines of text in a single pass.
+
+    Tokens are read line by line and lists are built on an explicit stack, so
+    the work is linear in the input size, nesting depth doesn't hit the
+    recursion limit, and a file object can be passed to stream a large
+    script. Each datum is yielded as soon as it is complete.
+
+    Args:
+        lines: The script text, one line at a time (e.g. an open file)
+
+    Yields:
+        (datum, line) pairs, where datum is an atom or a nested list of atoms
+        and line is the line the datum starts on
 
-    with open("weizenbaum_1966_appendix.txt", "r", encoding="utf-8") as f:
-        content = f.read()
+    Raises:
+        LispSyntaxError: On an unmatched ")" or a "(" left open at the end
+    """
+    # Lists being built, innermost last, with where each was opened
+    stack: List[Tuple[List[Expression], int, int]] = []
+    line_number = 0
+    for line_number, line in enumerate(lines, 1):
+        for token in TOKEN_REGEX.finditer(line):
+            text = token.group()
+            if text == "(":
+                stack.append(([], line_number, token.start() + 1))
+            elif text == ")":
+                if not stack:
+                    raise LispSyntaxError(
+                        "unmatched ')'", line_number, token.start() + 1
+                    )
+                datum, start_line, _ = stack.pop()
+                if stack:
+                    stack[-1][0].append(datum)
+                else:
+                    yield datum, start_line
+            elif stack:
+                stack[-1][0].append(text)
+            else:
+                yield text, line_number
 
-    result = {
+    if stack:
+        _, start_line, start_column = stack[-1]
+        raise LispSyntaxError("unclosed '('", start_line, start_column)
+
+
+def parse_eliza_script(path: str = APPENDIX_PATH) -> dict:
+    """Parse the original ELIZA script from the appendix into a structured JSON format."""
+
+    result: dict = {
         "greeting": "HOW DO YOU DO. PLEASE TELL ME YOUR PROBLEM",
         "keywords": {},
         "word_lists": {},
@@ -17,120 +85,57 @@ def parse_eliza_script():
         "memory_rules": {},
     }
 
-    # Split content into individual LISP expressions
-    expressions = []
-    depth = 0
-    start = 0
-
-    for i, char in enumerate(content):
-        if char == "(":
-            if depth == 0:
-                start = i
-            depth += 1
-        elif char == ")":
-            depth -= 1
-            if depth == 0:
-                expressions.append(content[start : i + 1])
-
-    # Process each expression
-    for expr in expressions:
-        expr = expr.strip()
-        if not expr:
-            continue
-
-        try:
-            parsed = parse_lisp_expression(expr)
-            if not parsed:
+    with open(path, "r", encoding="utf-8") as f:
+        for parsed, line in read_expressions(f):
+            # Top-level atoms, like the START marker, carry no rules
+            if not parsed or isinstance(parsed, str):
                 continue
+            try:
+                add_expression(result, parsed)
+            except (IndexError, TypeError, ValueError, AttributeError) as e:
+                raise ValueError(f"line {line}: cannot convert {parsed!r}: {e}") from e
 
-            # Extract greeting
-            if (
-                len(parsed) == 1
-                and isinstance(parsed[0], str)
-                and "HOW DO YOU DO" in parsed[0]
-            ):
-                result["greeting"] = parsed[0]
-                continue
+    return result
 
-            # Skip START marker
-            if parsed == ["START"]:
-                continue
 
-            # Handle simple substitutions like (DONT = DON'T)
-            if len(parsed) == 3 and parsed[1] == "=":
-                result["pre_substitutions"][parsed[0]] = parsed[2]
-                continue
+def add_expression(result: dict, parsed: List[Expression]) -> None:
+    """Add one top-level script expression to the result being built."""
+    # Extract greeting
+    if len(parsed) == 1 and isinstance(parsed[0], str) and "HOW DO YOU DO" in parsed[0]:
+        result["greeting"] = parsed[0]
+        return
 
-            # Handle MEMORY rules
-            if len(parsed) >= 1 and parsed[0] == "MEMORY":
-                memory_data = parse_memory_rule(parsed)
-                if memory_data:
-                    result["memory_rules"][memory_data["keyword"]] = memory_data[
-                        "templates"
-                    ]
-                continue
+    # Skip START marker
+    if parsed == ["START"]:
+        return
 
-            # Handle keyword definitions
-            if len(parsed) >= 1:
-                keyword = parsed[0]
-                keyword_data = parse_keyword_definition(parsed)
-                if keyword_data:
-                    result["keywords"][keyword] = keyword_data
+    # Handle simple substitutions like (DONT = DON'T)
+    if len(parsed) == 3 and parsed[1] == "=":
+        result["pre_substitutions"][parsed[0]] = parsed[2]
+        return
 
-        except Exception:
-            # Skip malformed expressions
-            continue
+    # Handle MEMORY rules
+    if parsed[0] == "MEMORY":
+        memory_data = parse_memory_rule(parsed)
+        if memory_data:
+            result["memory_rules"][memory_data["keyword"]] = memory_data["templates"]
+        return
 
-    return result
+    # Handle keyword definitions
+    keyword = parsed[0]
+    keyword_data = parse_keyword_definition(parsed)
+    if keyword_data:
+        result["keywords"][keyword] = keyword_data
 
 
-def parse_lisp_expression(expr):
+def parse_lisp_expression(expr: str) -> Optional[List[Expression]]:
     """Parse a single LISP expression into a nested list structure."""
     expr = expr.strip()
     if not expr.startswith("(") or not expr.endswith(")"):
         return None
-
-    # Remove outer parentheses
-    content = expr[1:-1].strip()
-    if not content:
-        return []
-
-    # Parse tokens
-    tokens = []
-    i = 0
-    while i < len(content):
-        if content[i] == " ":
-            i += 1
-            continue
-        if content[i] == "(":
-            # Find matching closing parenthesis
-            depth = 1
-            j = i + 1
-            while j < len(content) and depth > 0:
-                if content[j] == "(":
-                    depth += 1
-                elif content[j] == ")":
-                    depth -= 1
-                j += 1
-            if depth == 0:
-                # Recursively parse nested expression
-                nested = parse_lisp_expression(content[i:j])
-                if nested is not None:
-                    tokens.append(nested)
-                i = j
-            else:
-                i += 1
-        else:
-            # Find end of token
-            j = i
-            while j < len(content) and content[j] not in " ()":
-                j += 1
-            token = content[i:j]
-            if token:
-                tokens.append(token)
-            i = j
-
-    return tokens
+    for parsed, _ in read_expressions(expr.splitlines()):
+        return parsed  # type: ignore[return-value]
+    return None
 
 
 def find_referenced_positions(responses):
@@ -538,9 +543,9 @@ def parse_keyword_definition(parsed_expr):
     return keyword_data
 
 
-# Generate the JSON
-try:
-    result = parse_eliza_script()
+def build_script(path: str = APPENDIX_PATH) -> dict:
+    """Convert a script file to the JSON structure eliza.py loads."""
+    result = parse_eliza_script(path)
 
     # Post-process to organize word lists
     word_lists: dict[str, list[str]] = {}
@@ -584,29 +589,28 @@ try:
 
     # Don't expand word lists here - let eliza.py handle it at runtime
     # This keeps the JSON readable and separates data from implementation
+    return result
 
-    print(json.dumps(result, indent=2))
 
-except Exception as e:
-    print(f"Error: {e}")
-    # Fallback to simpler parsing if complex parsing fails
-    with open("weizenbaum_1966_appendix.txt", "r", encoding="utf-8") as f:
-        lines = f.readlines()
+def main(argv: Optional[List[str]] = None) -> None:
+    """Print the JSON form of a LISP script (the 1966 appendix by default)."""
+    parser = argparse.ArgumentParser(description="Convert an ELIZA script to JSON")
+    parser.add_argument("script", nargs="?", default=APPENDIX_PATH)
+    parser.add_argument("-o", "--output", help="write here instead of stdout")
+    args = parser.parse_args(argv)
 
-    simple_result: dict[str, Any] = {
-        "greeting": "HOW DO YOU DO. PLEASE TELL ME YOUR PROBLEM",
-        "keywords": {},
-        "word_lists": {},
-        "pre_substitutions": {},
-    }
+    try:
+        result = build_script(args.script)
+    except (OSError, ValueError) as e:
+        sys.exit(f"{args.script}: {e}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as out:
+            json.dump(result, out, indent=2)
+            out.write("\n")
+    else:
+        print(json.dumps(result, indent=2))
 
-    for line in lines:
-        line = line.strip()
-        if line and line.startswith("(") and line.endswith(")"):
-            content = line[1:-1]
-            if " = " in content and content.count("(") == 0:
-                parts = content.split(" = ")
-                if len(parts) == 2:
-                    simple_result["pre_substitutions"][parts[0]] = parts[1]
 
-    print(json.dumps(simple_result, indent=2))
+if __name__ == "__main__":
+    main()